@@ -0,0 +1,117 @@
+'''
+Contains the AIWorker class: computes a CPU's next shot in a background thread (or process) so
+that expensive strategies never stall the frame loop. The computation can start speculatively
+while the other user is still choosing their shot, since the CPU's planning only depends on its
+own shots.
+'''
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from copy import deepcopy
+from time import monotonic
+
+# Shared executors: {'thread' or 'process': executor}, created when first needed
+executors = {}
+
+class AIWorker():
+    '''Runs the choose_shot method of a CPU in the background
+
+    The worker plans on a copy of the CPU, so that the game can keep using (and drawing) the CPU
+    meanwhile; once the shot is collected, the attributes listed in the CPU's planning_attributes
+    are copied back from the worker's copy.
+
+    Attributes:
+        cpu             CPU instance (or of any subclass)
+        time_budget     Seconds the strategy has to answer; after that a random available square
+                        is used instead (None for no limit)
+        kind            'thread' or 'process'
+        future          Pending computation, None if there is none
+        started         Time at which the pending computation started
+        version         Number of tries of the CPU when the pending computation started
+        requested       Time at which the game first asked for the pending shot
+        latencies       Seconds from the request of each shot to its answer
+        fallbacks       Number of shots that exceeded the time budget
+
+    Methods:
+        start           Starts computing the next shot (no-op if it is already being computed)
+        ready           Checks if the shot (or the fallback) can be collected
+        collect         Returns the shot and updates the CPU's planning state
+        cancel          Forgets the pending computation
+    '''
+    def __init__(self, cpu, time_budget=None, kind='thread'):
+        if kind not in ('thread', 'process'):
+            raise ValueError(f"unknown worker kind: {kind}")
+        self.cpu = cpu
+        self.time_budget = time_budget
+        self.kind = kind
+        self.future = None
+        self.started = None
+        self.version = None
+        self.requested = None
+        self.latencies = []
+        self.fallbacks = 0
+    def start(self, now=None):
+        ''' Start computing the CPU's next shot on a copy of the CPU
+
+        Input: current time (default: monotonic())
+
+        Output: None
+        '''
+        if self.future is not None and self.version == self.cpu.num_of_tries:
+            return
+        self.cancel()
+        self.started = monotonic() if now is None else now
+        self.version = self.cpu.num_of_tries
+        self.future = executor(self.kind).submit(plan_shot, deepcopy(self.cpu))
+    def ready(self, now=None):
+        ''' Check if the next shot can be collected. The first call marks the moment the shot is
+        needed (for the latencies); a computation is started if there is none.
+
+        Input: current time (default: monotonic())
+
+        Output: boolean
+        '''
+        now = monotonic() if now is None else now
+        if self.requested is None:
+            self.requested = now
+        self.start(now)
+        if self.future.done():
+            return True
+        return self.time_budget is not None and now - self.started >= self.time_budget
+    def collect(self, now=None):
+        ''' Output: (row, col) of the shot; call once ready() is True '''
+        now = monotonic() if now is None else now
+        if self.future.done():
+            row, col, planning_state = self.future.result()
+            for name, value in planning_state.items():
+                setattr(self.cpu, name, value)
+        else:
+            # Out of time: a random available square (dropped from the CPU's planning state as
+            # well); the late answer is dropped
+            self.fallbacks += 1
+            row, col = self.cpu.random_shot()
+        self.latencies.append(now - (self.requested if self.requested is not None else now))
+        self.future = None
+        self.requested = None
+        return (row, col)
+    def cancel(self):
+        if self.future is not None:
+            self.future.cancel()
+        self.future = None
+
+# FUNCTIONS
+
+def plan_shot(cpu):
+    ''' Worker function: picks the shot of a copy of the CPU
+
+    Input: CPU instance (copy)
+
+    Output: (row, col, {attribute: value} of the planning state after choosing the shot)
+    '''
+    row, col = cpu.choose_shot()
+    return (row, col, {name: getattr(cpu, name) for name in cpu.planning_attributes})
+
+def executor(kind):
+    ''' Shared executor of the given kind; two workers, one per CPU of a CPU vs CPU game '''
+    if kind not in executors:
+        executors[kind] = ThreadPoolExecutor(2) if kind == 'thread' else ProcessPoolExecutor(2)
+    return executors[kind]
@@ -0,0 +1,63 @@
+'''
+Contains the AvailableSquares class
+'''
+
+import random
+
+class AvailableSquares():
+    '''Stores the squares where the CPU can still fire. Picking a random square, removing a square
+    and checking if a square is available all take constant time, whatever the size of the board.
+
+    Attributes:
+        squares         List of the available squares, in no particular order
+        positions       Index of each available square in the squares list
+
+    Methods:
+        add             Makes a square available
+        remove          Removes a square; raises ValueError if it is not available (as lists do)
+        discard         Removes a square if it is available
+        discard_many    Removes every available square out of the given ones
+        pop_random      Removes and returns a random available square
+    '''
+    def __init__(self, squares=()):
+        self.squares = []
+        self.positions = {}
+        for square in squares:
+            self.add(square)
+    def __len__(self):
+        return len(self.squares)
+    def __contains__(self, square):
+        return square in self.positions
+    def __iter__(self):
+        return iter(self.squares)
+    def add(self, square):
+        if square not in self.positions:
+            self.positions[square] = len(self.squares)
+            self.squares.append(square)
+    def remove(self, square):
+        try:
+            indx = self.positions.pop(square)
+        except KeyError:
+            raise ValueError(f"{square} is not an available square") from None
+        # Fill the gap with the last square so that the list never has to shift
+        last = self.squares.pop()
+        if indx < len(self.squares):
+            self.squares[indx] = last
+            self.positions[last] = indx
+    def discard(self, square):
+        if square in self.positions:
+            self.remove(square)
+    def discard_many(self, squares):
+        for square in squares:
+            if square in self.positions:
+                self.remove(square)
+    def pop_random(self, rng=random):
+        ''' Removes a random available square
+
+        Input: random number generator (random.Random instance or the random module)
+
+        Output: (row, col)
+        '''
+        square = self.squares[rng.randint(0, len(self.squares)-1)]
+        self.remove(square)
+        return square
@@ -0,0 +1,217 @@
+'''
+Batched lockstep engine: plays thousands of CPU vs CPU games at once with NumPy. The fleets,
+guess states and ships afloat of every game are arrays with a leading batch dimension, and every
+step fires one shot in each game that has not finished (the shots of all the games are applied
+together with array operations, and finished games are masked out), so the Python overhead is
+paid once per step instead of once per shot.
+
+The rules are the ones of engine.shot_outcome and Game.fire: a shot at a square already fired
+upon is ignored, every valid shot passes the turn, a ship is sunk once all its squares are hit
+(its squares are then marked 'S' and their surroundings are discarded), and a game ends when a
+fleet has been sunk. Shots are chosen by policies that see the whole batch (see random_shots and
+hunt_target_shots).
+'''
+
+import numpy as np
+
+from fleet_placement import default_fleet, fleet_ship_at, uniform_fleets
+
+# Codes of the guess states
+EMPTY, MISS, HIT, SUNK = 0, 1, 2, 3
+# Characters of the codes, as in BoardState.guess_state
+guess_marks = ' MXS'
+
+class BatchGames():
+    '''A batch of two-player games played in lockstep. Each game has two sides (0 and 1); side
+    arrays have a leading (games, 2) shape, and side s of a game is the user who fires at the
+    fleet of side 1-s.
+
+    Attributes:
+        games           Number of games
+        fleets          (games, 2, ships) placement indices of the fleets
+        ship_lengths    Lengths of the ships of each fleet
+        ship_at         (games, 2, 100) int8: number of the ship on each square of each side's
+                        own fleet, -1 for water
+        hits_left       (games, 2, ships) int8: blocks of each ship not hit yet
+        guess           (games, 2, 100) uint8: each side's guess state (EMPTY, MISS, HIT, SUNK)
+        discarded       (games, 2, 100) bool: squares each side knows hold no ship
+        remaining       (games, 2) int8: ships afloat in each side's own fleet
+        tries           (games, 2) int32: valid shots fired by each side
+        turn            (games,) int8: side whose turn it is
+        first_player    (games,) int8: side that fired first
+        num_of_turns    (games,) int32: valid shots fired in each game
+        winner          (games,) int8: side that sank the other fleet, -1 while playing
+        steps           Number of steps played
+
+    Methods:
+        active          Mask of the games that have not finished
+        fire            Applies one shot in every active game
+        play            Plays every game until the end with a shot policy
+    '''
+    def __init__(self, fleets, first_player, ship_lengths=default_fleet):
+        ''' Input: (games, 2, ships) array of placement indices (see fleet_placement), side that
+               fires first in each game, ship lengths
+        '''
+        self.games = len(fleets)
+        self.fleets = fleets
+        self.ship_lengths = np.array(ship_lengths, dtype=np.int8)
+        self.ship_at = fleet_ship_at(fleets.reshape(-1, len(ship_lengths)), ship_lengths).reshape(self.games, 2, 100)
+        self.hits_left = np.tile(self.ship_lengths, (self.games, 2, 1))
+        self.guess = np.zeros((self.games, 2, 100), dtype=np.uint8)
+        self.discarded = np.zeros((self.games, 2, 100), dtype=bool)
+        self.remaining = np.full((self.games, 2), len(ship_lengths), dtype=np.int8)
+        self.tries = np.zeros((self.games, 2), dtype=np.int32)
+        self.turn = np.array(first_player, dtype=np.int8)
+        self.first_player = self.turn.copy()
+        self.num_of_turns = np.zeros(self.games, dtype=np.int32)
+        self.winner = np.full(self.games, -1, dtype=np.int8)
+        self.steps = 0
+    @classmethod
+    def random(cls, games, ship_lengths=default_fleet, seed=None):
+        ''' Batch of games with uniform fleets and a random first player '''
+        generator = np.random.default_rng(seed)
+        fleets = uniform_fleets(2*games, ship_lengths, seed=generator.integers(1 << 63)).reshape(games, 2, -1)
+        return cls(fleets, generator.integers(0, 2, games), ship_lengths)
+    def active(self):
+        return self.winner < 0
+    def fire(self, squares):
+        ''' The side whose turn it is fires at the given square, in every active game
+
+        Input: (games,) array of squares (row*10 + col); ignored in finished games
+
+        Output: (games,) mask of the valid shots
+        '''
+        games = np.flatnonzero(self.active())
+        squares = np.asarray(squares)[games]
+        shooters = self.turn[games]
+        # A square already fired upon is ignored (the same side fires again)
+        valid = self.guess[games, shooters, squares] == EMPTY
+        games, squares, shooters = games[valid], squares[valid], shooters[valid]
+        valid_games = np.zeros(self.games, dtype=bool)
+        valid_games[games] = True
+        targets = 1 - shooters
+        self.tries[games, shooters] += 1
+        self.num_of_turns[games] += 1
+
+        ships = self.ship_at[games, targets, squares]
+        missed = ships < 0
+        self.guess[games[missed], shooters[missed], squares[missed]] = MISS
+        hit = ~missed
+        games, squares, shooters, targets, ships = games[hit], squares[hit], shooters[hit], targets[hit], ships[hit]
+        self.hits_left[games, targets, ships] -= 1
+        self.guess[games, shooters, squares] = HIT
+        sunk = self.hits_left[games, targets, ships] == 0
+        if sunk.any():
+            games, shooters, targets, ships = games[sunk], shooters[sunk], targets[sunk], ships[sunk]
+            # Every block of the sunk ship becomes 'S' and its surroundings are discarded
+            ship_cells = self.ship_at[games, targets] == ships[:, None]
+            self.guess[games, shooters] = np.where(ship_cells, SUNK, self.guess[games, shooters])
+            self.discarded[games, shooters] |= surroundings(ship_cells)
+            self.remaining[games, targets] -= 1
+            won = self.remaining[games, targets] == 0
+            self.winner[games[won]] = shooters[won]
+
+        # Every valid shot passes the turn, unless the game is over
+        passing = valid_games & self.active()
+        self.turn[passing] ^= 1
+        return valid_games
+    def play(self, policy, generator=None, record=False):
+        ''' Play every game until the end
+
+        Input: shot policy (function of the batch and a NumPy generator, returning the (games,)
+               array of the squares the sides to play fire at), NumPy generator, True to keep
+               every step's shots
+
+        Output: list of the (games,) shots of every step if record is True (-1 in finished games),
+                else None
+        '''
+        generator = np.random.default_rng() if generator is None else generator
+        history = [] if record else None
+        while self.active().any():
+            squares = policy(self, generator)
+            if record:
+                history.append(np.where(self.active(), squares, -1))
+            self.fire(squares)
+            self.steps += 1
+        return history
+
+def side_neighbours(squares):
+    ''' Squares sharing a side with some of the given squares, where the rest of a hit ship can be
+
+    Input: (n, 100) mask
+
+    Output: (n, 100) mask
+    '''
+    return _shift_rows(squares) | _shift_cols(squares)
+
+def surroundings(squares):
+    ''' Union of the surroundings of the given squares (as in BoardState.get_surroundings, which
+    leaves out the square itself unless it is next to another given square)
+
+    Input: (n, 100) mask
+
+    Output: (n, 100) mask
+    '''
+    above_below = _shift_rows(squares)
+    # Left and right of the squares and of the squares above and below them (the diagonals)
+    return above_below | _shift_cols(squares | above_below)
+
+# Squares that are not in the first / last column
+_not_first_col = np.arange(100) % 10 != 0
+_not_last_col = np.arange(100) % 10 != 9
+
+def _shift_rows(squares):
+    ''' Squares just above or below a square of a (n, 100) mask '''
+    shifted = np.zeros_like(squares)
+    shifted[:, 10:] |= squares[:, :-10]
+    shifted[:, :-10] |= squares[:, 10:]
+    return shifted
+
+def _shift_cols(squares):
+    ''' Squares just left or right of a square of a (n, 100) mask (rows do not wrap around) '''
+    shifted = np.zeros_like(squares)
+    shifted[:, 1:] |= squares[:, :-1] & _not_last_col[:-1]
+    shifted[:, :-1] |= squares[:, 1:] & _not_first_col[1:]
+    return shifted
+
+# SHOT POLICIES
+
+def open_squares(batch, games):
+    ''' Output: (len(games), 100) mask of the squares the side to play may still fire at '''
+    sides = batch.turn[games]
+    return (batch.guess[games, sides] == EMPTY) & ~batch.discarded[games, sides]
+
+def random_shots(batch, generator):
+    ''' Every side to play fires at a random square among the ones it may still fire at
+
+    Input: BatchGames instance, NumPy generator
+
+    Output: (games,) array of squares (0 in finished games)
+    '''
+    games = np.flatnonzero(batch.active())
+    squares = np.zeros(batch.games, dtype=np.int64)
+    squares[games] = _random_choice(open_squares(batch, games), generator)
+    return squares
+
+def hunt_target_shots(batch, generator):
+    ''' Same idea as the 'normal' CPU: fire at random until a ship is hit, then at random among
+    the squares next to its hit blocks until it is sunk
+
+    Input: BatchGames instance, NumPy generator
+
+    Output: (games,) array of squares (0 in finished games)
+    '''
+    games = np.flatnonzero(batch.active())
+    allowed = open_squares(batch, games)
+    targets = side_neighbours(batch.guess[games, batch.turn[games]] == HIT) & allowed
+    hunting = targets.any(axis=1)
+    squares = np.zeros(batch.games, dtype=np.int64)
+    squares[games] = _random_choice(np.where(hunting[:, None], targets, allowed), generator)
+    return squares
+
+def _random_choice(allowed, generator):
+    ''' Random True column of every row of a mask (0 for rows without any): the k-th allowed
+    square, with k drawn uniformly '''
+    counts = np.cumsum(allowed, axis=1, dtype=np.int8)
+    picks = (generator.random(len(allowed)) * counts[:, -1]).astype(np.int8)
+    return (counts > picks[:, None]).argmax(axis=1)
@@ -5,16 +5,21 @@ the other player's ships first wins (there is no draw).
 '''
 
 # EXTERNAL MODULES
-import os
 import pygame as game
-from random import randint, shuffle, sample
-from time import sleep
+from time import monotonic
+from weakref import WeakKeyDictionary
 
 # INTERNAL MODULES
-from board_class import Ship, BoardState
 from cpu_class import CPU
+from engine import Game
 from player_class import Player
 from player_places_ships import *
+from render_cache import BoardView, render_text
+from display_class import Display
+from scheduler_class import Scheduler
+from ai_worker_class import AIWorker
+from turn_state_class import TurnStateMachine, AIMING, FINISHED, GAME_OVER, default_delays
+from lan_class import poll_interval, idle_poll_interval
 
 game.init()
 game_font = game.font.SysFont('Cambria',20)
@@ -22,9 +27,13 @@ square_font = game.font.SysFont('Cambria',14)
 screen = game.display.set_mode((width, height))
 colors = [(0, 105, 148), game.Color("cyan"), game.Color("black")]
 game.event.set_allowed([game.QUIT, game.MOUSEBUTTONDOWN])
+# Seconds a CPU strategy has to choose its shot before a random square is fired at instead
+ai_time_budget = 2.0
+# Pre-drawn guessing board of each user
+board_views = WeakKeyDictionary()
 
 def battleship(users):
-	''' Main gameplay function
+	''' Main gameplay function: renders a Game from the engine module and feeds it the players' shots
 
 	Input: list of users
 
@@ -36,16 +45,9 @@ def battleship(users):
 
 	# Initialize each player depending on its type
 	for user_num in range(2):
-		# If list entry is CPU()
-		if isinstance(users[user_num], CPU):
-			cpu = users[user_num]
-			cpu.board = BoardState()
-			# Place ships
-			cpu.place_ships()
-			# Create and store list of available squares to shoot at
-			init_available_squares(cpu, square_list)
-		# List entry is like 'username'
-		else:
+		# List entry is like 'username'; CPU() entries are set up by the engine, and Player entries
+		# have already placed their ships
+		if not isinstance(users[user_num], (CPU, Player)):
 			name = users[user_num]
 			# Create Player instance and execute player_places_ships' main function until player has
 			# placed all ships on the board and pressed 'Ready'
@@ -57,283 +59,198 @@ def battleship(users):
 				game_on = False
 				return
 
-	# Shuffle user list so that who goes first is random
-	shuffle(users)
-	user_1 = users[0] # Goes first
-	user_2 = users[1] # Goes second
-	next_player_turn = False
+	# Place the CPU's fleet and shuffle the users so that who goes first is random
+	match = Game(users)
+	users = match.users
+	# Pauses between the turns are timed states, so the window keeps responding during them. The
+	# CPU's shots are computed in the background, starting while the player is still aiming
+	workers = {user: AIWorker(user, ai_time_budget) for user in users if isinstance(user, CPU)}
+	turns = TurnStateMachine(match, workers=workers)
 
 	# Store all the 100 squares on the board if it has not been done yet
 	if len(square_list) == 0:
 		square_list = collect_squares(square_list)
+	# Only the regions of the window that change are sent to the display
+	display = Display(screen, "gameplay")
+	scheduler = Scheduler(display)
 
 	# Main game loop
 	while game_on:
+		# Sleep until there is input or the current pause ends
+		events = scheduler.events(timeout=turns.time_left())
+		mouse_x, mouse_y = game.mouse.get_pos()
 
-		# Check if the opponent won in the previous round; if so, finish the game
-		if len(user_1.board.sunk_ships) == 10:
+		for e in events:
+			if e.type == game.QUIT:
+				game_on = False
+			if e.type == game.MOUSEBUTTONDOWN:
+				row = mouse_on_square(mouse_x, mouse_y)[0]
+				col = mouse_on_square(mouse_x, mouse_y)[1]
+				# If pressed on a square on the board while it is a player's turn, handle the
+				# player's guess. Note: ignored during the pauses and the CPU's turns
+				if row < 10 and col < 10:
+					turns.fire(row, col)
+
+		# Move on through the pauses that have ended; the CPU fires when its pause ends
+		turns.update()
+
+		# The game has finished and its last board has been shown: clear the screen
+		if turns.state == FINISHED:
 			game_on = False
-			user_lost = user_1
-			user_won = user_2
-			sleep(2)
 			screen.fill((0, 0, 0))
-			game.display.update()
+			display.invalidate()
+			display.flush()
 			break
 
-		# Player's turn
-		if isinstance(user_1, Player):
-			screen.blit(background, (0, 0))
-
-			mouse_x, mouse_y = game.mouse.get_pos()
-				
-			for e in game.event.get():
-				if e.type == game.QUIT:
-					game_on = False
-				if e.type == game.MOUSEBUTTONDOWN:
-					row = mouse_on_square(mouse_x, mouse_y)[0]
-					col = mouse_on_square(mouse_x, mouse_y)[1]
-					# If pressed on a square on the board, handle the player's guess and check if
-					# it is the next player's turn
-					if row < 10 and col < 10:
-						next_player_turn = shot_outcome(user_1, user_2, row, col)
-
-			draw_board(user_1, screen, colors, square_list, letter_dict, number_dict, square_font)
-
-			mouse_x, mouse_y = game.mouse.get_pos()
-			row = mouse_on_square(mouse_x, mouse_y)[0]
-			col = mouse_on_square(mouse_x, mouse_y)[1]
-			# Highlight square if it hasn't been shot at yet
-			if row < 10 and col < 10:
-				highlight_square(user_1, screen, colors, mouse_x, mouse_y, letter_dict, number_dict, square_font)
-			# Show number of tries and who's turn it is
-			show_tries(user_1, users, screen, game_font, (520,100))
-			show_player(user_1, users, screen, game_font, (520,300))
-
-			game.display.update()
-
-			# Move on to the next player
-			if next_player_turn:
-				sleep(0.5)
-				user_1, user_2 = swap_users(user_1, user_2)
-				next_player_turn = False
-
-		# CPU logic tries to guess the player's ships' locations in a random fashion (difficulty: 'normal')
-		elif isinstance(user_1, CPU):
-			screen.blit(background, (0, 0))
-			draw_board(user_1, screen, colors, square_list, letter_dict, number_dict, square_font)
-			show_tries(user_1, users, screen, game_font, (520,100))
-			show_player(user_1, users, screen, game_font, (520,300))
-			game.display.update()
-
-			# If CPU is not scanning for a ship yet (after hitting it for the first time), shoot
-			# at a square on the board in a random fashion
-			if type(user_1.currently_hit_ship) != str:
-				ship = user_1.currently_hit_ship
-				# If only hit one block of the ship, scan around it until a second block is hit
-				if len(ship.hit_blocks) == 1:
-					row, col = user_1.current_scanned_coord
-					# If a block has been hit in the previous turn
-					if user_1.board.guess_state[row][col] == 'X':
-						potential_locations = []
-						# Fill potential_locations with all the squares where the next block might be
-						for i in range(-1,2):
-							for j in range(-1,2):
-								if i != j and 0 in {i,j}:
-									new_row = row + i
-									new_col = col + j
-									if new_row in range(10) and new_col in range(10):
-										if (new_row, new_col) in user_1.available_squares:
-											potential_locations.append((new_row, new_col))
-						# Pick one of the potential locations at random and try shooting at it
-						shuffle(potential_locations)
-						row, col = potential_locations.pop(0)
-					# If the last potential location was a miss, pick the next one until the search concludes
-					else:
-						row, col = potential_locations.pop(0)
-
-				# If more than one block of this ship has been hit, continue shooting along the same direction
-				# until the ship has been sunk or the CPU misses, in which cases the direction is reversed along
-				# the same axis.
-				elif len(ship.hit_blocks) > 1:
-					# At this point, the CPU has already 'found out' whether the ship is placed vertically or horizontally
-					# Note that 'user_1.current_scanned_coord' has been updated in 'shot_outcome'
-					row, col = user_1.current_scanned_coord
-					hit_block_0 = ship.hit_blocks[0] # First block of the ship that was hit
-					hit_block_1 = ship.hit_blocks[-1] # Last block of the ship that was hit
-					if ship.vertical:
-						# Direction: +1 is down, -1 is up
-						direction = int((hit_block_1[0] - hit_block_0[0])/abs(hit_block_1[0] - hit_block_0[0]))
-						if user_1.board.guess_state[row][col] == 'M' or (row+direction, col) not in user_1.available_squares:
-							# Go back to the first hit_block and reverse the direction
-							row = hit_block_0[0]-direction
-						else:
-							# Go along the same direction
-							row += direction
-					else:
-						# Direction: +1 is right, -1 is left
-						direction = int((hit_block_1[1] - hit_block_0[1])/abs(hit_block_1[1] - hit_block_0[1]))
-						if user_1.board.guess_state[row][col] == 'M' or (row, col+direction) not in user_1.available_squares:
-							# Go back to the first hit_block and reverse the direction
-							col = hit_block_0[1]-direction
-						else:
-							# Go along the same direction
-							col += direction
-				# The square we're shooting at needs to be removed from the available choices
-				user_1.available_squares.remove((row,col))
-
-			# If not scanning for a ship, shoot at a random set of coordinates out of the available ones
-			else:
-				available_num = len(user_1.available_squares)
-				indx = randint(0,available_num-1)
-				row, col = user_1.available_squares[indx]
-				user_1.available_squares.pop(indx)
-
-			# Handle CPU guess and move on to the next player
-			next_player_turn = shot_outcome(user_1, user_2, row, col)
-
-			# Update display
-			sleep(0.5)
-			draw_board(user_1, screen, colors, square_list, letter_dict, number_dict, square_font)
-			show_tries(user_1, users, screen, game_font, (520,100))
-			show_player(user_1, users, screen, game_font, (520,300))
-			game.display.update()
-
-			if next_player_turn:
-				sleep(1)
-				user_1, user_2 = swap_users(user_1, user_2)
-				next_player_turn = False
+		# Highlight square if a player is choosing a shot and it hasn't been shot at yet
+		user_1 = turns.shown_user
+		mouse_x, mouse_y = game.mouse.get_pos()
+		row = mouse_on_square(mouse_x, mouse_y)[0]
+		col = mouse_on_square(mouse_x, mouse_y)[1]
+		if turns.state == AIMING and row < 10 and col < 10 and user_1.board.guess_state[row][col] == " ":
+			draw_turn(display, user_1, users, (row, col))
+		else:
+			draw_turn(display, user_1, users, None)
+		display.flush()
+
+	for worker in workers.values():
+		worker.cancel()
 
 	# Print who has won
 	# Will make it visual in future updates
-	if len(user_1.board.sunk_ships) == 10:
+	if match.finished:
+		user_won = match.result.winner
 		if isinstance(user_won, Player):
 			print(f"{user_won.name} has won! Congratulations!")
 		else:
 			print("The CPU has won! Better luck next time.")
 		#input("Press Enter to exit the program. ")
 
-# FUNCTIONS
-
-def swap_users(user_1, user_2):
-	''' Swap one user for another when it's the other player's turn; might modify/exclude in future versions
+def battleship_network(match):
+	''' LAN or online gameplay: renders a LanMatch (lan_class module) or an OnlineMatch (online_class
+		module) and sends the local player's shots. The connection runs in the background, so the
+		window keeps responding while the other player aims, and a player who leaves ends the game
+		instead of freezing it.
 
-	Input: user_1, user_2
+	Input: LanMatch or OnlineMatch instance, whose player has placed their ships
 
-	Output: (user_2, user_1)
+	Output: print who has won (return = None)
 	'''
-	temp_user = user_2
-	user_2 = user_1
-	user_1 = temp_user
-	return (user_1, user_2)
+	global square_list
+	if len(square_list) == 0:
+		square_list = collect_squares(square_list)
+	display = Display(screen, "network gameplay")
+	scheduler = Scheduler(display)
+	player = match.player
+	match.start()
+	# Time at which the final board stops being shown
+	game_over_end = None
+
+	while True:
+		# Sleep until there is input or it is time to check the connection again; while the local
+		# player aims, only a disconnection can arrive
+		if game_over_end is not None:
+			timeout = max(game_over_end - monotonic(), 0)
+		elif match.my_turn:
+			timeout = idle_poll_interval
+		else:
+			timeout = poll_interval
+		events = scheduler.events(timeout=timeout)
+		mouse_x, mouse_y = game.mouse.get_pos()
+		row, col = mouse_on_square(mouse_x, mouse_y)
+
+		quit_game = False
+		for e in events:
+			if e.type == game.QUIT:
+				quit_game = True
+			if e.type == game.MOUSEBUTTONDOWN:
+				# Ignored unless it is the local player's turn
+				if row < 10 and col < 10:
+					match.fire(row, col)
+		if quit_game:
+			break
 
-def shot_outcome(user, opponent, row, col):
-	''' Handle the user's guess
+		# Handle the other player's shots and the results of the local player's
+		match.update()
+		if match.error is not None:
+			break
+		if match.finished:
+			if game_over_end is None:
+				game_over_end = monotonic() + default_delays[GAME_OVER]
+			# Keep showing the final board while the other player's fleet is revealed
+			elif monotonic() >= game_over_end:
+				break
+
+		if match.my_turn and row < 10 and col < 10 and player.board.guess_state[row][col] == " ":
+			draw_turn(display, player, match.users or [player], (row, col), network_status(match))
+		else:
+			draw_turn(display, player, match.users or [player], None, network_status(match))
+		display.flush()
+
+	match.close()
+	screen.fill((0, 0, 0))
+	display.invalidate()
+	display.flush()
+
+	# Print who has won, and whether the other player's answers matched their fleet
+	if match.error is not None:
+		print(f"The game has ended: {match.error}.")
+	elif match.finished:
+		if match.result.winner is player:
+			print(f"{player.name} has won! Congratulations!")
+		else:
+			print(f"{match.result.winner.name} has won! Better luck next time.")
+		if match.verified is False:
+			print(f"{match.peer.name}'s answers do not match the fleet they placed!")
+		elif match.verified is None:
+			print(f"{match.peer.name}'s fleet could not be checked.")
 
-	Input: user, opponent, row, col
-	Output: next_player_turn boolean
+# FUNCTIONS
+
+def draw_turn(display, user_1, users, highlighted, status=None):
+	''' Draw the parts of the gameplay screen that changed since the last frame: the board, the
+		highlighted square and the tries/player boxes. Nothing is drawn if nothing changed.
+
+	Input: display (Display instance), user whose board is shown, users, highlighted (row, col) or
+		   None, text of the player box (default: whose turn it is, i.e. user_1)
+
+	Output: None
 	'''
-	# Only check if the given square has not been fired upon yet
-	if user.board.guess_state[row][col] not in {'S', 'X', 'M'}:
-
-		# Case 1: 'Hit'
-		if opponent.board.state[row][col] == 'X':
-			user.num_of_tries += 1
-			# Find out which of the rival's ships has been hit by looping through the indices
-			findr_indx = 0
-			while findr_indx in range(len(opponent.board.placed_ships)):
-				ship = opponent.board.placed_ships[findr_indx]
-				if (row,col) in ship.locations:
-					ship.hit_blocks.append((row,col))
-					break
-				else:
-					findr_indx += 1
-			# Check if the rival's ship has been sunk; if so, update the color of all hit blocks
-			if ship.check_if_sunk():
-				opponent.board.sunk_ships.append(ship)
-				# Change all the 'X' of the hit ship to 'S' in the relevant boards
-				for sunk_coords in ship.hit_blocks:
-					(sunk_x, sunk_y) = sunk_coords
-					opponent.board.state[sunk_x][sunk_y] = 'S'
-					user.board.guess_state[sunk_x][sunk_y] = 'S'
-					# If the CPU is playing: store the sunk ship & its surroundings
-					if isinstance(user,CPU):
-						sunk_block_surroundings = user.board.get_surroundings(sunk_x, sunk_y)
-						user.discarded_blocks = user.discarded_blocks.union(sunk_block_surroundings)
-				# For the CPU: discard the sunk ship & its surroundings from the list of
-				# available squares. Update the currently_hit_ship and current_scanned_coord
-				# attributes to stop scanning for the hit ship.
-				if isinstance(user,CPU):
-					user.available_squares = list(filter(lambda item: item not in user.discarded_blocks, user.available_squares))
-					user.currently_hit_ship = ''
-					user.current_scanned_coord = ()
-				# Opponent plays next
-				next_player_turn = True
-				return next_player_turn
-			else:
-				# Hit but not sunk
-				opponent.board.state[row][col] = 'H'
-				user.board.guess_state[row][col] = 'X'
-				if isinstance(user,CPU):
-					user.currently_hit_ship = ship
-					user.current_scanned_coord = (row, col)
-				next_player_turn = True
-				return next_player_turn
-
-		# Case 2: 'Miss'
-		elif opponent.board.state[row][col] in {'O',' '}:
-			user.num_of_tries += 1
-			user.board.guess_state[row][col] = 'M'
-			if isinstance(user,CPU):
-				user.current_scanned_coord = (row, col)
-			next_player_turn = True
-			return next_player_turn
+	board_size = sq_size*dimension
+	display.track("board", (id(user_1), user_1.num_of_tries, len(user_1.discarded_blocks)), game.Rect(0, 0, board_size, board_size))
+	if highlighted:
+		row, col = highlighted
+		display.track("highlight", highlighted, game.Rect(col*sq_size, row*sq_size, sq_size+4, sq_size+4))
 	else:
-		pass # Do nothing if square has already been fired upon
+		display.track("highlight", None)
+	display.track("tries", (id(user_1), user_1.num_of_tries), game.Rect(520-5, 100-5, sq_size*3.7, sq_size*0.75))
+	display.track("player", (id(user_1), status), game.Rect(520-5, 300-5, sq_size*3.7, sq_size*0.75))
+	if not display.needs_redraw():
+		return
+
+	screen.blit(background, (0, 0))
+	draw_board(user_1, screen, colors, square_list, letter_dict, number_dict, square_font)
+	if highlighted:
+		mouse_x, mouse_y = highlighted[1]*sq_size, highlighted[0]*sq_size
+		highlight_square(user_1, screen, colors, mouse_x, mouse_y, letter_dict, number_dict, square_font)
+	# Show number of tries and who's turn it is
+	show_tries(user_1, users, screen, game_font, (520,100))
+	show_player(user_1, users, screen, game_font, (520,300), status)
 
 def draw_board(user, screen, colors, square_list, letter_dict, number_dict, square_font):
 	''' Display the board. 
 		Note: this function is different from that in the player_places_ships module.
+		Each user's board is kept pre-drawn, so only the squares that changed since the last
+		frame are repainted.
 
 	Input: user, screen, colors, square_list, letter_dict, number_dict, square_font
 	
 	Output: None
 	'''
-	for square in square_list:
-		c = square.left // sq_size
-		r = square.top // sq_size
-		# Paint the sunk squares black
-		if user.board.guess_state[r][c] == 'S':
-			game.draw.rect(screen, game.Color("black"), square)
-			text_color = (255,255,255)
-		# Paint the hit squares green
-		elif user.board.guess_state[r][c] == 'X':
-			game.draw.rect(screen, game.Color("green"), square)
-			text_color = (255,255,255)
-		# For the CPU: paint ship surroundings in a light blue-ish color
-		elif (r,c) in user.discarded_blocks:
-			game.draw.rect(screen, (59, 174, 254), square)
-			text_color = (59, 174, 254) # Invisible
-		# Misses are red
-		elif user.board.guess_state[r][c] == 'M':
-			game.draw.rect(screen, game.Color("red"), square)
-			text_color = (255,255,255)
-		# The rest of the squares are displayed as usual
-		else:
-			color = colors[((r+c)%2)]
-			text_color = colors[((r+c-1)%2)]
-			game.draw.rect(screen, color, square)
-		
-		# Display letter/number in first row/column
-		row_letter = letter_dict[r]
-		col_number = number_dict[c]
-
-		row_text = square_font.render(f'{row_letter}', False, text_color)
-		if c == 0:
-			screen.blit(row_text, (square.topleft[0]+2, square.topleft[1]))
-
-		col_text = square_font.render(f'{col_number}', False, text_color)
-		if r== 0:
-			screen.blit(col_text, (square.bottomright[0]-15, square.bottomright[1]-17.5))
+	view = board_views.get(user)
+	if view is None:
+		view = board_views[user] = BoardView(colors, sq_size, dimension, letter_dict, number_dict, square_font)
+	view.draw(screen, user.board.guess_state, user.discarded_blocks)
 
 def highlight_square(user, screen, colors, mouse_x, mouse_y, letter_dict, number_dict, square_font):
 	''' Higlight the square the mouse is on. Note: slightly different from the function in the
@@ -349,8 +266,8 @@ def highlight_square(user, screen, colors, mouse_x, mouse_y, letter_dict, number
 	row_letter = letter_dict[row]
 	col_number = number_dict[col]
 
-	row_text = square_font.render(f'{row_letter}', False, text_color)
-	col_text = square_font.render(f'{col_number}', False, text_color)
+	row_text = render_text(square_font, f'{row_letter}', text_color)
+	col_text = render_text(square_font, f'{col_number}', text_color)
 
 	# If the square has not been shot at (and, for the CPU, if also not included in any surroundings), do
 	# highlight the square
@@ -370,14 +287,6 @@ def highlight_square(user, screen, colors, mouse_x, mouse_y, letter_dict, number
 	else:
 		pass
 
-def init_available_squares(user, square_list):
-	'''
-	Initialize square_list
-	'''
-	for square in square_list:
-		col, row = (square.left // sq_size, square.top // sq_size)
-		user.available_squares.append((row,col))
-
 def show_tries(user, users, screen, game_font, position):
 	''' Display how many shots the user has fired.
 
@@ -385,7 +294,7 @@ def show_tries(user, users, screen, game_font, position):
 
 	Output: None
 	'''
-	score = game_font.render(f'Number of tries: {user.num_of_tries}', False, (255, 255, 255))
+	score = render_text(game_font, f'Number of tries: {user.num_of_tries}', (255, 255, 255))
 	(score_x, score_y) = position
 	# Dark blue-ish for the first player, orange for the one who goes second
 	if user == users[0]:
@@ -395,10 +304,10 @@ def show_tries(user, users, screen, game_font, position):
 	game.draw.rect(screen, color, game.Rect(score_x-5, score_y-5, sq_size*3.7, sq_size*0.75))
 	screen.blit(score, position)
 
-def show_player(user, users, screen, game_font, position):
+def show_player(user, users, screen, game_font, position, status=None):
 	''' Show whose turn it is
 
-	Input: user, users, screen, game_font, position
+	Input: user, users, screen, game_font, position, text to show instead (e.g. in LAN games)
 
 	Output: None
 	'''
@@ -407,13 +316,26 @@ def show_player(user, users, screen, game_font, position):
 	else:
 		name = user.name
 	# Render text
-	player_name = game_font.render(f'Playing: {name}', False, (255, 255, 255))
+	player_name = render_text(game_font, f'Playing: {name}' if status is None else status, (255, 255, 255))
 	# Design the box that contains the text
 	(name_x, name_y) = position
 	color = game.Color("black")
 	game.draw.rect(screen, color, game.Rect(name_x-5, name_y-5, sq_size*3.7, sq_size*0.75))
 	screen.blit(player_name, position)
 
+def network_status(match):
+	''' Text of the player box in a LAN or online game
+
+	Input: LanMatch or OnlineMatch instance
+
+	Output: string
+	'''
+	if not match.started:
+		return "Waiting..."
+	if match.finished:
+		return f"{match.result.winner.name} won!"
+	return f"Playing: {match.user_1.name}"
+
 if __name__ == "__main__":
 	#battleship(['name', 'name2']) # Player vs Player
 	battleship(['name', CPU()])  # Player vs CPU (current difficulty level: 'normal')
\ No newline at end of file
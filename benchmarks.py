@@ -0,0 +1,1020 @@
+'''
+Benchmark suite. Every benchmark is a function registered in the 'benchmarks' dictionary and
+can be run from the command line, e.g.:
+
+    python benchmarks.py engine --games 5000
+
+Running the module without arguments executes every benchmark with its default settings.
+'''
+
+import argparse
+import os
+from random import randint, shuffle
+from time import perf_counter, process_time
+from timeit import timeit
+
+from available_squares_class import AvailableSquares
+from bitboard_class import BitBoardState, CELL_MASKS
+from cpu_class import CPU, HardCPU
+from engine import Game, shot_outcome
+from player_class import Player
+from fleet_placement import sample_fleet, sample_fleets, uniform_fleets
+from tournament import run_tournament
+
+def bench_engine(games=2000):
+    ''' Throughput of the headless engine: CPU vs CPU games played per second
+
+    Input: number of games to play
+
+    Output: games/sec
+    '''
+    start = perf_counter()
+    total_turns = 0
+    for _ in range(games):
+        result = Game([CPU(), CPU()]).play()
+        total_turns += result.num_of_turns
+    elapsed = perf_counter() - start
+    games_per_sec = games / elapsed
+    print(f"engine: {games} games in {elapsed:.2f}s -> {games_per_sec:.0f} games/sec "
+          f"({total_turns/games:.1f} shots/game)")
+    return games_per_sec
+
+def bench_bitboard(number=200000):
+    ''' Microbenchmark of BoardState against BitBoardState for hit tests, sunk checks and
+    placement legality checks on the same random fleet, and for the legality of enemy ship
+    placements given the guesses of a CPU halfway through a game (misses, sunk ships and the
+    squares discarded around them)
+
+    Input: number of repetitions of each operation
+
+    Output: dictionary {operation: speedup}
+    '''
+    cpu = CPU()
+    cpu.place_ships()
+    list_board = cpu.board
+    bit_board = BitBoardState()
+    bit_board.state = list_board.state
+    bit_board.placed_ships = list_board.placed_ships
+    # Half of the blocks of every ship have been hit
+    for ship in list_board.placed_ships:
+        ship.hit_blocks = ship.locations[:(len(ship)+1)//2]
+        for row, col in ship.hit_blocks:
+            list_board.state[row][col] = 'H'
+            bit_board.state[row][col] = 'H'
+    squares = [(randint(0,9), randint(0,9)) for _ in range(100)]
+    # Shots on the bitboard are single-bit masks
+    square_bits = [CELL_MASKS[row*10 + col] for row, col in squares]
+    placements = [(randint(1,4), randint(0,6), randint(0,6), bool(randint(0,1))) for _ in range(100)]
+    ships = list_board.placed_ships
+    # A CPU with a bitboard fires until half of the enemy fleet has sunk
+    shooter, target = CPU(), CPU()
+    shooter.board = BitBoardState()
+    shooter.init_available_squares()
+    target.place_ships()
+    while len(target.board.sunk_ships) < len(ships) // 2:
+        shot_outcome(shooter, target, *shooter.choose_shot())
+    guess_board = shooter.board
+    guess_grid = guess_board.guess_state.to_lists()
+    discarded_blocks = shooter.discarded_blocks
+
+    def list_hit_test():
+        for row, col in squares:
+            list_board.state[row][col] == 'X'
+    def bit_hit_test():
+        ships_mask = bit_board.ships
+        for bit in square_bits:
+            ships_mask & bit
+    def list_sunk_check():
+        for ship in ships:
+            ship.check_if_sunk()
+    def bit_sunk_check():
+        for ship in ships:
+            bit_board.is_sunk(ship)
+    def list_can_place():
+        # Same rule as CPU.place_ships: no block of the ship may touch another ship
+        for length, row, col, vertical in placements:
+            coord_surroundings = set()
+            for block in range(length):
+                block_row, block_col = row + block*vertical, col + block*(not vertical)
+                for i in range(-1,2):
+                    for j in range(-1,2):
+                        if (block_row + i) in range(10) and (block_col + j) in range(10):
+                            coord_surroundings.add(list_board.state[block_row+i][block_col+j])
+            'X' not in coord_surroundings
+    def bit_can_place():
+        for placement in placements:
+            bit_board.can_place(*placement)
+    def list_can_hold():
+        # Same rule as the CPU strategies: no block on a miss, a sunk ship or a discarded square
+        for length, row, col, vertical in placements:
+            for block in range(length):
+                block_row, block_col = row + block*vertical, col + block*(not vertical)
+                if guess_grid[block_row][block_col] in ('M', 'S') or (block_row, block_col) in discarded_blocks:
+                    break
+    def bit_can_hold():
+        for placement in placements:
+            guess_board.can_hold(*placement)
+
+    speedups = {}
+    repeat = max(number // 100, 1)
+    for name, list_func, bit_func in [('hit test', list_hit_test, bit_hit_test),
+                                      ('sunk check', list_sunk_check, bit_sunk_check),
+                                      ('placement check', list_can_place, bit_can_place),
+                                      ('enemy placement', list_can_hold, bit_can_hold)]:
+        calls = repeat*len(ships) if name == 'sunk check' else repeat*100
+        list_time = timeit(list_func, number=repeat) / calls
+        bit_time = timeit(bit_func, number=repeat) / calls
+        speedups[name] = list_time / bit_time
+        print(f"bitboard: {name:<16} lists {list_time*1e9:7.1f} ns  bitmasks {bit_time*1e9:7.1f} ns  "
+              f"speedup x{speedups[name]:.1f}")
+    return speedups
+
+def bench_hard_cpu(games=200):
+    ''' Shot selection latency of the 'hard' CPU and the number of shots it needs to sink a
+    fleet, compared with the 'normal' CPU
+
+    Input: number of games per difficulty
+
+    Output: dictionary {difficulty: mean shots to sink the whole fleet}
+    '''
+    mean_shots = {}
+    for cpu_class in (CPU, HardCPU):
+        shot_times = []
+        total_shots = 0
+        for _ in range(games):
+            shooter, target = cpu_class(), CPU()
+            match = Game([shooter, target])
+            # Only the measured CPU fires, so that every game is a full search of the target's fleet
+            match.user_1, match.user_2 = shooter, target
+            while not match.finished:
+                start = perf_counter()
+                row, col = shooter.choose_shot()
+                shot_times.append(perf_counter() - start)
+                match.fire(row, col)
+                match.user_1, match.user_2 = shooter, target
+            total_shots += shooter.num_of_tries
+        shot_times.sort()
+        mean_shots[cpu_class.__name__] = total_shots / games
+        print(f"hard_cpu: {cpu_class.__name__:<7} {total_shots/games:5.1f} shots/fleet  "
+              f"shot latency mean {sum(shot_times)/len(shot_times)*1e6:6.1f} us  "
+              f"p99 {shot_times[int(len(shot_times)*0.99)]*1e6:6.1f} us")
+    return mean_shots
+
+def bench_tournament(games=4000):
+    ''' Scaling of the tournament runner: games/sec with one process and with one per core
+
+    Input: number of games per run
+
+    Output: dictionary {processes: games/sec}
+    '''
+    throughput = {}
+    for processes in sorted({1, os.cpu_count()}):
+        start = perf_counter()
+        run_tournament('normal', 'normal', games, processes)
+        throughput[processes] = games / (perf_counter() - start)
+        print(f"tournament: {processes:>3} processes -> {throughput[processes]:.0f} games/sec "
+              f"(x{throughput[processes]/throughput[1]:.2f})")
+    return throughput
+
+def bench_placement(fleets=1000000):
+    ''' Fleet sampling speed of the placement engine, one fleet at a time and in bulk
+
+    Input: number of fleets for the bulk run
+
+    Output: (single fleets/sec, bulk fleets/sec, uniform bulk fleets/sec)
+    '''
+    single = min(fleets, 20000)
+    start = perf_counter()
+    for _ in range(single):
+        sample_fleet()
+    single_rate = single / (perf_counter() - start)
+    start = perf_counter()
+    compact = sample_fleets(fleets)
+    bulk_rate = fleets / (perf_counter() - start)
+    start = perf_counter()
+    uniform_fleets(fleets)
+    uniform_rate = fleets / (perf_counter() - start)
+    print(f"placement: sample_fleet {single_rate:.0f} fleets/sec  sample_fleets {bulk_rate:.0f} fleets/sec "
+          f"({compact.nbytes/fleets:.0f} bytes/fleet)  uniform_fleets {uniform_rate:.0f} fleets/sec")
+    return single_rate, bulk_rate, uniform_rate
+
+def bench_shot_outcome(games=500):
+    ''' Average cost of resolving a shot with shot_outcome, over every square of full boards
+
+    Input: number of boards
+
+    Output: seconds per shot
+    '''
+    elapsed = 0
+    shots = 0
+    squares = [(row, col) for row in range(10) for col in range(10)]
+    for _ in range(games):
+        shooter, target = CPU(), CPU()
+        target.place_ships()
+        start = perf_counter()
+        for row, col in squares:
+            shot_outcome(shooter, target, row, col)
+        elapsed += perf_counter() - start
+        shots += len(squares)
+    print(f"shot_outcome: {elapsed/shots*1e9:.0f} ns/shot")
+    return elapsed / shots
+
+def bench_available_squares(turns=2000):
+    ''' Cost of a CPU turn's operations on the available squares (random pick, membership tests of
+    the neighbours, removal and bulk removal of a sunk ship's surroundings) for growing board
+    sizes, with a plain list and with AvailableSquares
+
+    Input: number of turns per board size
+
+    Output: dictionary {board size: (list seconds/turn, AvailableSquares seconds/turn)}
+    '''
+    results = {}
+    for size in (10, 20, 50, 100, 200):
+        times = []
+        for container in (list, AvailableSquares):
+            squares = container((row, col) for row in range(size) for col in range(size))
+            start = perf_counter()
+            for turn in range(min(turns, size*size // 10)):
+                # Hunt shot at a random square
+                if container is list:
+                    row, col = squares.pop(randint(0, len(squares)-1))
+                else:
+                    row, col = squares.pop_random()
+                # Target mode: look for the neighbours that can still be fired upon
+                neighbours = [(row+i, col+j) for i, j in ((-1,0), (1,0), (0,-1), (0,1)) if (row+i, col+j) in squares]
+                # Sink: remove the surroundings of the square
+                surroundings = [(row+i, col+j) for i in range(-1,2) for j in range(-1,2)]
+                if container is list:
+                    squares[:] = [square for square in squares if square not in surroundings]
+                else:
+                    squares.discard_many(surroundings)
+            times.append((perf_counter() - start) / (turn + 1))
+        results[size] = tuple(times)
+        print(f"available_squares: {size:>3}x{size:<3} list {times[0]*1e6:9.1f} us/turn  "
+              f"AvailableSquares {times[1]*1e6:6.1f} us/turn")
+    return results
+
+def bench_frame_time(frames=300):
+    ''' Frame time of the placement and gameplay screens, rendered with the SDL dummy video driver
+
+    Input: number of frames per screen
+
+    Output: dictionary {screen: seconds/frame}
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import battleship
+    import player_places_ships
+
+    screen = battleship.screen
+    square_list = player_places_ships.collect_squares([])
+    fonts = (battleship.letter_dict, battleship.number_dict, battleship.square_font)
+    # A game in progress: misses, hits, a sunk ship and its surroundings
+    player = Player('name')
+    for row, col, mark in [(0, 0, 'M'), (4, 4, 'X'), (7, 2, 'S'), (7, 3, 'S'), (9, 9, 'M')]:
+        player.board.guess_state[row][col] = mark
+    player.discarded_blocks = {(6, 1), (6, 2), (6, 3), (6, 4), (8, 1), (8, 2), (8, 3), (8, 4), (7, 1), (7, 4)}
+    users = [player, CPU()]
+
+    def placement_frame():
+        screen.blit(player_places_ships.background, (0, 0))
+        player_places_ships.draw_board(screen, battleship.colors, square_list, *fonts)
+    def gameplay_frame():
+        screen.blit(battleship.background, (0, 0))
+        battleship.draw_board(player, screen, battleship.colors, square_list, *fonts)
+        battleship.highlight_square(player, screen, battleship.colors, 130, 130, *fonts)
+        battleship.show_tries(player, users, screen, battleship.game_font, (520,100))
+        battleship.show_player(player, users, screen, battleship.game_font, (520,300))
+
+    frame_times = {}
+    for name, frame in (('placement', placement_frame), ('gameplay', gameplay_frame)):
+        frame()
+        start = perf_counter()
+        for _ in range(frames):
+            frame()
+        frame_times[name] = (perf_counter() - start) / frames
+        print(f"frame_time: {name:<10} {frame_times[name]*1e3:.3f} ms/frame")
+    return frame_times
+
+def bench_dirty_rects(frames=300):
+    ''' Frame cost of the screens with dirty-rectangle updates, against redrawing and updating the
+    whole window every frame. Idle frames (nothing changed) and frames where the highlighted
+    square moves are measured separately. Rendered with the SDL dummy video driver.
+
+    Input: number of frames per case
+
+    Output: dictionary {case: seconds/frame}
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame as game
+    import battleship
+    import player_places_ships
+    from display_class import Display, frame_report
+
+    screen = battleship.screen
+    player = Player('name')
+    for row, col, mark in [(0, 0, 'M'), (4, 4, 'X'), (7, 2, 'S'), (7, 3, 'S'), (9, 9, 'M')]:
+        player.board.guess_state[row][col] = mark
+    users = [player, CPU()]
+    squares = [(row, col) for row in range(10) for col in range(10) if player.board.guess_state[row][col] == " "]
+
+    def full_frame(i):
+        # What every screen used to do: redraw everything and update the whole window
+        screen.blit(battleship.background, (0, 0))
+        battleship.draw_board(player, screen, battleship.colors, [], battleship.letter_dict,
+                              battleship.number_dict, battleship.square_font)
+        battleship.show_tries(player, users, screen, battleship.game_font, (520,100))
+        battleship.show_player(player, users, screen, battleship.game_font, (520,300))
+        game.display.update()
+
+    results = {}
+    cases = (('full redraw', None, full_frame),
+             ('idle', "gameplay idle", lambda i: None),
+             ('hover', "gameplay hover", lambda i: squares[i % len(squares)]))
+    for case, screen_name, highlighted in cases:
+        display = Display(screen, screen_name) if screen_name else None
+        start = perf_counter()
+        for i in range(frames):
+            if display is None:
+                highlighted(i)
+                continue
+            display.start_frame()
+            battleship.draw_turn(display, player, users, highlighted(i))
+            display.flush()
+        results[case] = (perf_counter() - start) / frames
+        print(f"dirty_rects: gameplay {case:<12} {results[case]*1e3:.3f} ms/frame")
+
+    # The real ship placement loop, left idle for a second; a QUIT event ends it
+    game.time.set_timer(game.QUIT, 1000, 1)
+    player_places_ships.ship_placing('name')
+    print(frame_report())
+    return results
+
+def bench_idle_cpu(seconds=2.0):
+    ''' CPU use of every screen's loop while the user is not doing anything, measured on the real
+    loops (left idle until a QUIT event ends them) with the SDL dummy video driver. The menu
+    loop without the scheduler, as it used to be, is measured as a reference.
+
+    Input: seconds per screen
+
+    Output: dictionary {screen: share of a core used}
+    '''
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame as game
+    import menu
+    import battleship
+    import player_places_ships
+    from display_class import Display
+    from scheduler_class import loop_stats
+
+    def busy_menu():
+        # Every frame polls the events and finds nothing to draw
+        display = Display(menu.menu_screen, "busy loop")
+        running = True
+        while running:
+            display.start_frame()
+            for e in game.event.get():
+                running = e.type != game.QUIT
+            display.track("button", False, None)
+            display.flush()
+    def placed_player(name):
+        player, cpu = Player(name), CPU()
+        cpu.place_ships()
+        player.board = cpu.board
+        return player
+
+    players = [placed_player('name'), placed_player('name2')]
+
+    screens = {
+        'busy loop': busy_menu,
+        'main menu': menu.main,
+        'username': lambda: menu.enter_username(menu.menu_screen, 1),
+        'placement': lambda: player_places_ships.ship_placing('name'),
+        'gameplay': lambda: battleship.battleship(players),
+    }
+    results = {}
+    for name, loop in screens.items():
+        game.event.clear()
+        game.time.set_timer(game.QUIT, int(seconds*1000), 1)
+        wall_start, cpu_start = perf_counter(), process_time()
+        loop()
+        results[name] = (process_time() - cpu_start) / (perf_counter() - wall_start)
+        iterations = loop_stats[name].iterations if name in loop_stats else None
+        print(f"idle_cpu: {name:<10} {results[name]:6.1%} of a core"
+              + (f" ({iterations} loop iterations)" if iterations is not None else ""))
+    return results
+
+class SlowCPU(HardCPU):
+    ''' HardCPU that spends extra time on every shot, standing in for an expensive strategy '''
+    think_time = 0.05
+    def choose_shot(self):
+        end = perf_counter() + self.think_time
+        while perf_counter() < end:
+            pass
+        return super().choose_shot()
+
+def bench_ai_worker(shots=20):
+    ''' Longest stall of a 60 fps frame loop while a CPU that needs 50 ms per shot plays, with its
+    shot chosen inline (in the frame loop) and by a background worker (thread and process). With
+    a worker, the shot is computed during the opponent's turn, so the reply latency (from the end
+    of the CPU's aiming pause to its shot) is close to zero.
+
+    Input: number of shots of the slow CPU per case
+
+    Output: dictionary {case: (longest frame stall, mean reply latency) in seconds}
+    '''
+    from time import sleep
+    from ai_worker_class import AIWorker
+    from turn_state_class import TurnStateMachine, CPU_AIMING, SHOT, GAME_OVER
+
+    delays = {CPU_AIMING: 0.1, SHOT: 0.1, GAME_OVER: 0}
+    results = {}
+    for case in ('inline', 'thread', 'process'):
+        slow_cpu, opponent = SlowCPU(), CPU()
+        match = Game([slow_cpu, opponent])
+        workers = {} if case == 'inline' else {slow_cpu: AIWorker(slow_cpu, kind=case)}
+        turns = TurnStateMachine(match, delays, workers=workers)
+        stalls, replies = [], []
+        while slow_cpu.num_of_tries < shots and not match.finished:
+            frame_start = perf_counter()
+            aiming = turns.state == CPU_AIMING and match.user_1 is slow_cpu
+            deadline = turns.deadline
+            tries = slow_cpu.num_of_tries
+            turns.update()
+            stalls.append(perf_counter() - frame_start)
+            if aiming and slow_cpu.num_of_tries > tries:
+                replies.append(perf_counter() - deadline)
+            sleep(max(1/60 - (perf_counter() - frame_start), 0))
+        results[case] = (max(stalls), sum(replies) / len(replies))
+        print(f"ai_worker: {case:<8} longest frame stall {results[case][0]*1e3:6.1f} ms, "
+              f"mean reply latency {results[case][1]*1e3:6.1f} ms")
+    return results
+
+def shots_to_sink(shooter, target):
+    ''' Number of shots a CPU needs to sink the fleet of another user on its own
+
+    Input: shooter (CPU instance), target (user with a placed fleet; its board is modified)
+
+    Output: number of shots
+    '''
+    shooter.init_available_squares()
+    while len(target.board.sunk_ships) < len(target.board.placed_ships):
+        row, col = shooter.choose_shot()
+        shot_outcome(shooter, target, row, col)
+    return shooter.num_of_tries
+
+def bench_monte_carlo(games=20, samples=2048):
+    ''' Sampling speed of the Monte Carlo strategy (one process and one per core), on an empty
+    board and in the middle of a game, and the shots it needs to sink a fleet compared with the
+    normal and hard CPUs (same fleets for all of them)
+
+    Input: number of fleets to sink, samples per shot
+
+    Output: dictionary {measure: value}
+    '''
+    from copy import deepcopy
+    from monte_carlo_class import MonteCarloCPU, MonteCarloStrategy
+    from strategy_class import Position
+
+    # Middle of a game: the normal CPU has fired 40 shots at a fleet
+    shooter, target = CPU(), CPU()
+    target.place_ships()
+    shooter.init_available_squares()
+    for _ in range(40):
+        row, col = shooter.choose_shot()
+        shot_outcome(shooter, target, row, col)
+    positions = {'empty': Position([[' ']*10]*10, set(), CPU.ship_lengths), 'mid-game': Position.from_cpu(shooter)}
+
+    results = {}
+    for processes in (None, os.cpu_count()):
+        for name, position in positions.items():
+            strategy = MonteCarloStrategy(processes)
+            strategy.start(position)
+            strategy.refine() # Starts the processes
+            warm_samples = strategy.samples
+            start = perf_counter()
+            while perf_counter() - start < 1:
+                strategy.refine()
+            samples_per_sec = (strategy.samples - warm_samples) / (perf_counter() - start)
+            label = f"{name}, {f'{processes} processes' if processes else 'in process'}"
+            results[label] = samples_per_sec
+            print(f"monte_carlo: {label:<24} {samples_per_sec:9.0f} samples/sec")
+
+    shots = {'normal': [], 'hard': [], 'monte carlo': []}
+    factories = {'normal': CPU, 'hard': HardCPU, 'monte carlo': lambda: MonteCarloCPU(move_time=60, max_samples=samples, endgame=False)}
+    for _ in range(games):
+        target = CPU()
+        target.place_ships()
+        for name, factory in factories.items():
+            shots[name].append(shots_to_sink(factory(), deepcopy(target)))
+    for name, counts in shots.items():
+        results[name] = sum(counts) / games
+        print(f"monte_carlo: {name:<12} {results[name]:.2f} shots to sink a fleet ({games} fleets)")
+    return results
+
+def bench_endgame(games=20, samples=2048):
+    ''' Shots the Monte Carlo CPU needs to sink a fleet with and without the exact endgame solver
+    (same fleets for both), and the longest time either took to choose a shot
+
+    Input: number of fleets to sink, samples per shot
+
+    Output: dictionary {measure: value}
+    '''
+    from copy import deepcopy
+    from monte_carlo_class import MonteCarloCPU
+
+    results = {}
+    shots = {'monte carlo': [], 'with endgame': []}
+    slowest = {name: 0.0 for name in shots}
+    for _ in range(games):
+        target = CPU()
+        target.place_ships()
+        for name in shots:
+            shooter = MonteCarloCPU(move_time=60, max_samples=samples, endgame=(name == 'with endgame'))
+            fleet = deepcopy(target)
+            shooter.init_available_squares()
+            while len(fleet.board.sunk_ships) < len(fleet.board.placed_ships):
+                start = perf_counter()
+                row, col = shooter.choose_shot()
+                slowest[name] = max(slowest[name], perf_counter() - start)
+                shot_outcome(shooter, fleet, row, col)
+            shots[name].append(shooter.num_of_tries)
+    for name, counts in shots.items():
+        results[name] = sum(counts) / games
+        results[f'{name}, slowest shot'] = slowest[name]
+        print(f"endgame: {name:<12} {results[name]:.2f} shots to sink a fleet, slowest shot {slowest[name]*1000:.0f} ms ({games} fleets)")
+    return results
+
+def bench_transposition(games=200):
+    ''' Time the hard and Monte Carlo CPUs need to sink a fleet with their transposition caches
+    cleared before every game, and shared across the games as in a tournament worker, with the
+    caches' hit counts
+
+    Input: number of fleets to sink (a tenth of them for the Monte Carlo CPU)
+
+    Output: dictionary {case: seconds/fleet}
+    '''
+    from copy import deepcopy
+    from monte_carlo_class import MonteCarloCPU
+    from transposition_class import transposition_cache
+
+    results = {}
+    cases = (('hard', HardCPU, 'density', games),
+             ('monte carlo', lambda: MonteCarloCPU(move_time=60, max_samples=2048), 'monte_carlo', max(1, games // 10)))
+    for name, factory, cache_name, num_fleets in cases:
+        targets = []
+        for _ in range(num_fleets):
+            target = CPU()
+            target.place_ships()
+            targets.append(target)
+        cache = transposition_cache(cache_name)
+        for shared in (False, True):
+            cache.clear()
+            start = perf_counter()
+            for target in targets:
+                if not shared:
+                    cache.clear()
+                shots_to_sink(factory(), deepcopy(target))
+            label = f"{name}, {'shared' if shared else 'cold'}"
+            results[label] = (perf_counter() - start) / num_fleets
+            print(f"transposition: {label:<20} {results[label]*1e3:8.2f} ms/fleet  {cache.report()}")
+    return results
+
+def bench_opening_book(games=200, fleets=100000, depth=12):
+    ''' Build time and size of an opening book, the cost of opening it and of a lookup, and the
+    shots the hard CPU needs to sink a fleet with and without it (same fleets for both)
+
+    Input: number of fleets to sink, fleets sampled for the book, most shots of a book position
+
+    Output: dictionary {measure: value}
+    '''
+    import tempfile
+    from copy import deepcopy
+    import opening_book
+
+    results = {}
+    path = os.path.join(tempfile.mkdtemp(), 'opening_book.bin')
+    start = perf_counter()
+    book = opening_book.build_book(fleets, depth)
+    size = opening_book.write_book(book, path, depth)
+    results['build seconds'] = perf_counter() - start
+    print(f"opening_book: {len(book)} positions from {fleets} fleets, {size} bytes, built in {results['build seconds']:.1f}s")
+
+    start = perf_counter()
+    reader = opening_book.OpeningBook(path)
+    results['open seconds'] = perf_counter() - start
+    keys = list(book)
+    repeats = max(1, 100000 // len(keys))
+    start = perf_counter()
+    for _ in range(repeats):
+        for key in keys:
+            reader.lookup(key)
+    results['lookup seconds'] = (perf_counter() - start) / (repeats * len(keys))
+    print(f"opening_book: opened in {results['open seconds']*1e6:.0f} us, {results['lookup seconds']*1e9:.0f} ns/lookup")
+    reader.close()
+
+    class LiveCPU(HardCPU):
+        use_opening_book = False
+    previous_path, opening_book.book_path = opening_book.book_path, path
+    try:
+        shots = {'live': 0, 'book': 0}
+        for _ in range(games):
+            target = CPU()
+            target.place_ships()
+            shots['live'] += shots_to_sink(LiveCPU(), deepcopy(target))
+            shots['book'] += shots_to_sink(HardCPU(), deepcopy(target))
+    finally:
+        opening_book.book_path = previous_path
+    for name, total in shots.items():
+        results[name] = total / games
+        print(f"opening_book: hard CPU, {name:<4} {results[name]:.2f} shots to sink a fleet ({games} fleets)")
+    return results
+
+def bench_batch_engine(games=10000):
+    ''' Throughput of the batched lockstep engine (batch_engine) against the one-game-at-a-time
+    engine (test_batch_engine checks that both play the same games)
+
+    Input: number of games
+
+    Output: dictionary {engine: games/sec}
+    '''
+    from batch_engine import BatchGames, hunt_target_shots
+    from fleet_placement import next_uniform_fleet
+
+    results = {}
+    start = perf_counter()
+    batch = BatchGames.random(games)
+    setup = perf_counter() - start
+    batch.play(hunt_target_shots)
+    elapsed = perf_counter() - start
+    results['batch'] = games / elapsed
+    print(f"batch_engine: {games} games in {elapsed:.2f}s ({setup:.2f}s placing fleets, {batch.steps} steps) "
+          f"-> {results['batch']:.0f} games/sec ({batch.num_of_turns.mean():.1f} shots/game)")
+    # The same number of games; the first buffer of uniform fleets is drawn before timing, as the
+    # batch's fleets are drawn by BatchGames.random (its later refills are timed, like its setup)
+    next_uniform_fleet()
+    start = perf_counter()
+    for _ in range(games):
+        Game([CPU(), CPU()]).play()
+    elapsed = perf_counter() - start
+    results['engine'] = games / elapsed
+    print(f"batch_engine: engine.Game {games} games in {elapsed:.2f}s -> {results['engine']:.0f} games/sec "
+          f"(x{results['batch']/results['engine']:.1f} for the batch)")
+    return results
+
+def lan_player(name):
+    ''' Player with a randomly placed fleet, as if they had placed their ships '''
+    player = Player(name)
+    player.board = CPU().place_ships()
+    player.placing_ships = False
+    return player
+
+def play_lan_side(match, timeout=1.0):
+    ''' Plays one side of a LAN game at random squares until it ends (run in its own thread). The
+    side waits for every message, as the frame loop would with a poll interval of zero. '''
+    squares = [(row, col) for row in range(10) for col in range(10)]
+    shuffle(squares)
+    match.start()
+    while match.error is None and not (match.finished and match.verified is not None):
+        if match.my_turn:
+            match.fire(*squares.pop())
+        match.update(timeout)
+
+def bench_lan(games=20):
+    ''' Move round trip of LAN games on loopback (from sending a shot to handling its result), with
+    both players in this process, and the time a player needs to notice that the other one has left
+    (test_lan checks the games and their fleet commitments)
+
+    Input: number of games
+
+    Output: dictionary {'p50', 'p99', 'max': round trip in seconds, 'disconnect': seconds}
+    '''
+    from threading import Thread
+    from lan_class import LanConnection, LanMatch
+
+    latencies = []
+    start = perf_counter()
+    for _ in range(games):
+        host, guest = LanConnection(), LanConnection()
+        address = host.host(0, '127.0.0.1')
+        guest.join(*address)
+        matches = [LanMatch(host, lan_player('host'), True), LanMatch(guest, lan_player('guest'), False)]
+        threads = [Thread(target=play_lan_side, args=(match,)) for match in matches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for match in matches:
+            if match.error is not None:
+                raise RuntimeError(f"LAN game failed: {match.error}")
+            latencies.extend(match.latencies)
+        host.close()
+        guest.close()
+    elapsed = perf_counter() - start
+    latencies.sort()
+    results = {'p50': latencies[len(latencies)//2], 'p99': latencies[int(len(latencies)*0.99)], 'max': latencies[-1]}
+
+    # The guest leaves once the game has started
+    host, guest = LanConnection(), LanConnection()
+    guest.join(*host.host(0, '127.0.0.1'))
+    matches = [LanMatch(host, lan_player('host'), True), LanMatch(guest, lan_player('guest'), False)]
+    for match in matches:
+        match.start()
+    while not all(match.started for match in matches):
+        for match in matches:
+            match.update(0.01)
+    left = perf_counter()
+    guest.close()
+    while matches[0].error is None:
+        matches[0].update(0.01)
+    results['disconnect'] = perf_counter() - left
+    host.close()
+
+    print(f"lan: {games} games ({len(latencies)} shots) in {elapsed:.2f}s, move round trip "
+          f"p50 {results['p50']*1e3:.2f} ms, p99 {results['p99']*1e3:.2f} ms, max {results['max']*1e3:.2f} ms")
+    print(f"lan: a player leaving is noticed after {results['disconnect']*1e3:.2f} ms ({matches[0].error})")
+    return results
+
+def bench_server(games=2000, duration=10.0, think_time=1.0):
+    ''' Online mode: a few games of two OnlineMatch clients against a game server (game_server)
+    started in a child process, then the load test of the server (load_test) with the given number
+    of concurrent games
+
+    Input: number of concurrent games of the load test, seconds of measurement, mean think time of
+           the simulated players
+
+    Output: dictionary of the load test's results, plus 'client_p50' and 'client_p99' (round trip
+            of the OnlineMatch clients, in seconds)
+    '''
+    from multiprocessing import Process, Queue
+    from threading import Thread
+    from lan_class import LanConnection
+    from load_test import run_load_test, server_process
+    from online_class import OnlineMatch
+
+    ready = Queue()
+    server = Process(target=server_process, args=(0, ready))
+    server.start()
+    address = ready.get()
+    latencies = []
+    try:
+        for _ in range(5):
+            matches = []
+            for name in ('first', 'second'):
+                connection = LanConnection()
+                connection.join(*address)
+                matches.append(OnlineMatch(connection, lan_player(name)))
+            threads = [Thread(target=play_lan_side, args=(match,)) for match in matches]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            for match in matches:
+                match.close()
+                if match.error is not None:
+                    raise RuntimeError(f"online game failed: {match.error}")
+                latencies.extend(match.latencies)
+    finally:
+        server.terminate()
+        server.join()
+    latencies.sort()
+    print(f"server: {len(latencies)} shots of OnlineMatch clients, round trip p50 "
+          f"{latencies[len(latencies)//2]*1e3:.2f} ms, p99 {latencies[int(len(latencies)*0.99)]*1e3:.2f} ms")
+
+    results = run_load_test(games, duration, think_time)
+    results['client_p50'] = latencies[len(latencies)//2]
+    results['client_p99'] = latencies[int(len(latencies)*0.99)]
+    return results
+
+def bench_wire(boards=2000):
+    ''' Cost of the binary encoding (wire_protocol) against JSON: the size and the time to encode
+    and decode the boards of a sample of CPU games (fleet and guess state at a random point of the
+    game), and a shot (their round trips are checked by test_wire_protocol)
+
+    Input: number of boards
+
+    Output: dictionary {'board_bytes', 'json_board_bytes', 'encode_us', 'decode_us' (into a
+            BoardState), 'grids_decode_us' (into lists, as JSON), 'json_encode_us', 'json_decode_us',
+            'shot_us'} (per board, shot = encode + decode)
+    '''
+    import json
+    from wire_protocol import decode_board, decode_fleet, decode_guess_state, decode_message, encode_board, encode_message
+    from lan_class import fleet_blocks
+
+    # Boards of real games, stopped at a random turn
+    sample = []
+    for _ in range(boards):
+        player, enemy = lan_player('player'), lan_player('enemy')
+        squares = [(row, col) for row in range(10) for col in range(10)]
+        shuffle(squares)
+        for row, col in squares[:randint(0, 100)]:
+            shot_outcome(player, enemy, row, col)
+        sample.append(player.board)
+
+    json_boards = [json.dumps({'fleet': fleet_blocks(board), 'guess_state': board.guess_state}) for board in sample]
+    encoded = [encode_board(board) for board in sample]
+    results = {'board_bytes': sum(map(len, encoded)) / boards,
+               'json_board_bytes': sum(map(len, json_boards)) / boards,
+               'encode_us': timeit(lambda: [encode_board(board) for board in sample], number=3) / (3*boards) * 1e6,
+               'decode_us': timeit(lambda: [decode_board(data) for data in encoded], number=3) / (3*boards) * 1e6,
+               'grids_decode_us': timeit(lambda: [decode_guess_state(data, decode_fleet(data)[1]) for data in encoded],
+                                         number=3) / (3*boards) * 1e6,
+               'json_encode_us': timeit(lambda: [json.dumps({'fleet': fleet_blocks(board), 'guess_state': board.guess_state})
+                                                 for board in sample], number=3) / (3*boards) * 1e6,
+               'json_decode_us': timeit(lambda: [json.loads(data) for data in json_boards], number=3) / (3*boards) * 1e6}
+    shot = {'type': 'shot', 'row': 4, 'col': 2}
+    results['shot_us'] = timeit(lambda: decode_message(encode_message(shot)), number=100000) / 100000 * 1e6
+    json_shot_us = timeit(lambda: json.loads(json.dumps(shot)), number=100000) / 100000 * 1e6
+    print(f"wire: board {results['board_bytes']:.0f} bytes (JSON {results['json_board_bytes']:.0f}), encode "
+          f"{results['encode_us']:.1f} us (JSON {results['json_encode_us']:.1f}), decode {results['grids_decode_us']:.1f} us "
+          f"(JSON {results['json_decode_us']:.1f}), {results['decode_us']:.1f} us into a BoardState")
+    print(f"wire: shot {len(encode_message(shot))} byte (JSON {len(json.dumps(shot))}), encode + decode "
+          f"{results['shot_us']:.2f} us (JSON {json_shot_us:.2f})")
+    return results
+
+def bench_spectators(games=200, spectators=10):
+    ''' Spectator broadcast of the game server (game_server.Broadcast): CPU games are played with
+    spectators that record what would be sent to them, and the bytes per shot and the server's cost
+    per shot are compared with sending a keyframe per shot (test_game_server checks that the
+    spectators rebuild the games exactly)
+
+    Input: number of games, spectators per game
+
+    Output: dictionary {'delta_bytes', 'keyframe_bytes' (per shot and spectator), 'publish_us'
+            (per shot, for all the spectators)}
+    '''
+    import asyncio
+    from game_server import Broadcast, ServerConnection
+
+    class RecordingTransport():
+        ''' Transport that keeps what is written to it '''
+        def __init__(self):
+            self.data = bytearray()
+        def is_closing(self):
+            return False
+        def write(self, data):
+            self.data += data
+
+    async def play():
+        shots = 0
+        delta_bytes = 0
+        keyframe_bytes = 0
+        publish_seconds = 0.0
+        for game_id in range(1, games + 1):
+            match = Game([CPU(), CPU()])
+            for user in match.users:
+                user.name = f"CPU {match.users.index(user) + 1}"
+            broadcast = Broadcast(game_id, match)
+            watchers = []
+            for _ in range(spectators):
+                watcher = ServerConnection(None)
+                watcher.transport = RecordingTransport()
+                broadcast.subscribe(watcher)
+                watchers.append(watcher)
+            # The first keyframes are sent in the next loop iteration
+            await asyncio.sleep(0)
+            while not match.finished:
+                shooter, opponent = match.user_1, match.user_2
+                row, col = shooter.choose_shot()
+                match.fire(row, col)
+                sunk = None
+                if shooter.board.guess_state[row][col] == 'S':
+                    sunk = opponent.board.placed_ships[opponent.board.ship_at[row][col]].locations
+                start = perf_counter()
+                broadcast.publish(shooter, row, col, sunk)
+                publish_seconds += perf_counter() - start
+                keyframe_bytes += len(broadcast.keyframe())
+                shots += 1
+                await asyncio.sleep(0)
+            delta_bytes += broadcast.bytes_sent
+        return shots, delta_bytes, keyframe_bytes, publish_seconds
+
+    shots, delta_bytes, keyframe_bytes, publish_seconds = asyncio.run(play())
+    results = {'delta_bytes': delta_bytes / (shots*spectators), 'keyframe_bytes': keyframe_bytes / shots,
+               'publish_us': publish_seconds / shots * 1e6}
+    print(f"spectators: {games} games ({shots} shots) watched by {spectators} spectators each")
+    print(f"spectators: {results['delta_bytes']:.1f} bytes per shot and spectator with deltas (first keyframe "
+          f"included), {results['keyframe_bytes']:.1f} with a keyframe per shot; {results['publish_us']:.1f} us "
+          f"to publish a shot to {spectators} spectators")
+    return results
+
+def bench_timers(timers=100000, seconds=600.0):
+    ''' Timer wheel of the game server's deadlines (timer_wheel_class) with the given number of
+    pending timers, due within the given number of seconds on a simulated clock: inserting them,
+    replacing each one (what a shot does: cancel the deadline of the shooter, insert the one of the
+    opponent), cancelling half of them, then ticking the clock until the rest have expired (that
+    each one expires in its tick is checked by test_timer_wheel). The same inserts, replacements
+    and cancels are timed with asyncio's call_later for comparison.
+
+    Input: number of pending timers, seconds within which they are due
+
+    Output: dictionary {'insert_ns', 'replace_ns', 'cancel_ns' (per timer, for the wheel and for
+            asyncio, as 'asyncio_insert_ns'...), 'tick_us' and 'p99_tick_us' (mean and 99th
+            percentile time of a tick), 'max_moves' (most timers moved to a lower level in a tick)}
+    '''
+    import asyncio
+    from math import ceil
+    from random import Random
+    from timer_wheel_class import TimerWheel, default_tick
+
+    rng = Random(25)
+    delays = [rng.uniform(0, seconds) for _ in range(timers)]
+    new_delays = [rng.uniform(0, seconds) for _ in range(timers)]
+    cancelled = set(rng.sample(range(timers), timers // 2))
+    results = {}
+
+    # The clock stays in the middle of a tick, so that its tick is never rounded down
+    clock = [0.5 * default_tick]
+    wheel = TimerWheel(default_tick, lambda: clock[0])
+    expired = {}
+    def expire(num):
+        expired[num] = wheel.now
+    start = perf_counter()
+    handles = [wheel.schedule(delay, expire, num) for num, delay in enumerate(delays)]
+    results['insert_ns'] = (perf_counter() - start) / timers * 1e9
+    start = perf_counter()
+    for num, delay in enumerate(new_delays):
+        wheel.cancel(handles[num])
+        handles[num] = wheel.schedule(delay, expire, num)
+    results['replace_ns'] = (perf_counter() - start) / timers * 1e9
+    start = perf_counter()
+    for num in cancelled:
+        wheel.cancel(handles[num])
+    results['cancel_ns'] = (perf_counter() - start) / len(cancelled) * 1e9
+
+    ticks = ceil(seconds / default_tick) + 1
+    tick_seconds = []
+    results['max_moves'] = 0
+    for tick in range(1, ticks + 1):
+        clock[0] = (tick + 0.5) * default_tick
+        cascaded = wheel.cascaded
+        start = perf_counter()
+        wheel.advance()
+        tick_seconds.append(perf_counter() - start)
+        results['max_moves'] = max(results['max_moves'], wheel.cascaded - cascaded)
+    results['tick_us'] = sum(tick_seconds) / ticks * 1e6
+    tick_seconds.sort()
+    results['p99_tick_us'] = tick_seconds[int(ticks*0.99)] * 1e6
+
+    loop = asyncio.new_event_loop()
+    try:
+        start = perf_counter()
+        handles = [loop.call_later(delay, expire, num) for num, delay in enumerate(delays)]
+        results['asyncio_insert_ns'] = (perf_counter() - start) / timers * 1e9
+        start = perf_counter()
+        for num, delay in enumerate(new_delays):
+            handles[num].cancel()
+            handles[num] = loop.call_later(delay, expire, num)
+        results['asyncio_replace_ns'] = (perf_counter() - start) / timers * 1e9
+        start = perf_counter()
+        for num in cancelled:
+            handles[num].cancel()
+        results['asyncio_cancel_ns'] = (perf_counter() - start) / len(cancelled) * 1e9
+        for handle in handles:
+            handle.cancel()
+    finally:
+        loop.close()
+
+    print(f"timers: {timers} pending timers due within {seconds:.0f}s, {default_tick*1e3:.0f} ms ticks; {len(expired)} "
+          f"expired ({wheel.cascaded/timers:.2f} moves to a lower level per timer)")
+    print(f"timers: wheel insert {results['insert_ns']:.0f} ns, replace {results['replace_ns']:.0f} ns, cancel "
+          f"{results['cancel_ns']:.0f} ns; asyncio call_later insert {results['asyncio_insert_ns']:.0f} ns, replace "
+          f"{results['asyncio_replace_ns']:.0f} ns, cancel {results['asyncio_cancel_ns']:.0f} ns")
+    print(f"timers: tick {results['tick_us']:.1f} us on average, p99 {results['p99_tick_us']:.0f} us, over {ticks} "
+          f"ticks; at most {results['max_moves']} timers moved down in a tick")
+    return results
+
+benchmarks = {
+    'engine': bench_engine,
+    'bitboard': bench_bitboard,
+    'hard_cpu': bench_hard_cpu,
+    'tournament': bench_tournament,
+    'placement': bench_placement,
+    'shot_outcome': bench_shot_outcome,
+    'available_squares': bench_available_squares,
+    'frame_time': bench_frame_time,
+    'dirty_rects': bench_dirty_rects,
+    'idle_cpu': bench_idle_cpu,
+    'ai_worker': bench_ai_worker,
+    'monte_carlo': bench_monte_carlo,
+    'endgame': bench_endgame,
+    'transposition': bench_transposition,
+    'opening_book': bench_opening_book,
+    'batch_engine': bench_batch_engine,
+    'lan': bench_lan,
+    'server': bench_server,
+    'wire': bench_wire,
+    'spectators': bench_spectators,
+    'timers': bench_timers,
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game's benchmarks")
+    parser.add_argument('names', nargs='*', help=f"benchmarks to run among {', '.join(benchmarks)} (default: all)")
+    parser.add_argument('--games', type=int, help="number of games for the simulation benchmarks")
+    args = parser.parse_args()
+    unknown = set(args.names) - set(benchmarks)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+    for name in args.names or list(benchmarks):
+        kwargs = {'games': args.games} if args.games and 'games' in benchmarks[name].__code__.co_varnames else {}
+        benchmarks[name](**kwargs)
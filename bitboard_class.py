@@ -0,0 +1,282 @@
+'''
+Contains the BitBoardState class, an alternative BoardState backend that stores every grid as
+integer bitmasks (one bit per square, bit number row*10 + col)
+'''
+
+from board_class import BoardState
+from transposition_class import guess_keys
+
+# PRECOMPUTED MASKS
+# Single-square masks
+CELL_MASKS = [1 << (row*10 + col) for row in range(10) for col in range(10)]
+# Surroundings of every square, excluding the square itself (replaces get_surroundings)
+NEIGHBOUR_MASKS = []
+for _row in range(10):
+    for _col in range(10):
+        _mask = 0
+        for i in range(-1,2):
+            for j in range(-1,2):
+                if (_row + i) in range(10) and (_col + j) in range(10) and not {i,j}.issubset({0}):
+                    _mask |= CELL_MASKS[(_row+i)*10 + _col+j]
+        NEIGHBOUR_MASKS.append(_mask)
+# Every square plus its surroundings
+ZONE_MASKS = [CELL_MASKS[i] | NEIGHBOUR_MASKS[i] for i in range(100)]
+# Ship and exclusion-zone masks of every placement on the board, keyed by (length, row, col, vertical).
+# Vertical ships go down the rows from (row, col), horizontal ones go right along the columns.
+PLACEMENT_MASKS = {}
+for _length in range(1, 5):
+    for _vertical in (True, False):
+        for _row in range(10 - (_length-1)*_vertical):
+            for _col in range(10 - (_length-1)*(not _vertical)):
+                _ship, _zone = 0, 0
+                for _block in range(_length):
+                    _indx = (_row + _block*_vertical)*10 + _col + _block*(not _vertical)
+                    _ship |= CELL_MASKS[_indx]
+                    _zone |= ZONE_MASKS[_indx]
+                PLACEMENT_MASKS[(_length, _row, _col, _vertical)] = (_ship, _zone)
+
+def mask_to_coords(mask):
+    ''' Convert a bitmask into the list of (row, col) squares it contains
+
+    Input: mask
+
+    Output: list of coordinates, in increasing bit order
+    '''
+    coords = []
+    while mask:
+        low_bit = mask & -mask
+        indx = low_bit.bit_length() - 1
+        coords.append(divmod(indx, 10))
+        mask ^= low_bit
+    return coords
+
+def coords_to_mask(coords):
+    ''' Convert an iterable of (row, col) squares into a bitmask '''
+    mask = 0
+    for row, col in coords:
+        mask |= CELL_MASKS[row*10 + col]
+    return mask
+
+class _GridRow():
+    '''One row of a _GridView; reads and writes single characters through the board's bitmasks'''
+    __slots__ = ('grid', 'row')
+    def __init__(self, grid, row):
+        self.grid = grid
+        self.row = row
+    def __getitem__(self, col):
+        if isinstance(col, slice):
+            return [self.grid.get(self.row, c) for c in range(10)[col]]
+        return self.grid.get(self.row, col)
+    def __setitem__(self, col, value):
+        self.grid.set(self.row, col, value)
+    def __len__(self):
+        return 10
+    def __iter__(self):
+        return (self.grid.get(self.row, col) for col in range(10))
+    def __eq__(self, other):
+        return list(self) == list(other)
+    def __repr__(self):
+        return repr(list(self))
+
+class _GridView():
+    '''List-of-lists view of a grid of a BitBoardState, so that grid[row][col] keeps working
+    for the UI and the engine. The characters are decoded from / encoded into the bitmasks.'''
+    __slots__ = ('board', 'decode', 'encode')
+    def __init__(self, board, decode, encode):
+        self.board = board
+        self.decode = decode
+        self.encode = encode
+    def get(self, row, col):
+        return self.decode(self.board, CELL_MASKS[row*10 + col])
+    def set(self, row, col, value):
+        self.encode(self.board, CELL_MASKS[row*10 + col], value)
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [_GridRow(self, r) for r in range(10)[row]]
+        return _GridRow(self, row)
+    def __len__(self):
+        return 10
+    def __iter__(self):
+        return (_GridRow(self, row) for row in range(10))
+    def __eq__(self, other):
+        return [list(row) for row in self] == [list(row) for row in other]
+    def to_lists(self):
+        ''' Plain 10x10 list of strings, e.g. for drawing a whole frame '''
+        return [list(row) for row in self]
+    def __repr__(self):
+        return repr(self.to_lists())
+
+# Character <-> bitmask conversions of both grids
+def _decode_state(board, bit):
+    if board.sunk & bit:
+        return 'S'
+    if board.hits & bit:
+        return 'H'
+    if board.ships & bit:
+        return 'X'
+    return ' '
+
+def _encode_state(board, bit, value):
+    board.ships &= ~bit
+    board.hits &= ~bit
+    board.sunk &= ~bit
+    if value in {'X', 'H', 'S'}:
+        board.ships |= bit
+    if value in {'H', 'S'}:
+        board.hits |= bit
+    if value == 'S':
+        board.sunk |= bit
+
+def _decode_guess_state(board, bit):
+    if board.guess_sunk & bit:
+        return 'S'
+    if board.guess_hits & bit:
+        return 'X'
+    if board.guess_misses & bit:
+        return 'M'
+    return ' '
+
+def _encode_guess_state(board, bit, value):
+    board.guess_hits &= ~bit
+    board.guess_misses &= ~bit
+    board.guess_sunk &= ~bit
+    if value in {'X', 'S'}:
+        board.guess_hits |= bit
+    if value == 'S':
+        board.guess_sunk |= bit
+    elif value == 'M':
+        board.guess_misses |= bit
+
+class BitBoardState(BoardState):
+    '''Same as BoardState, but every grid is stored as an integer bitmask. The state and
+    guess_state attributes are list-of-lists views of those bitmasks, so existing code
+    (and the UI) can keep indexing them as board.state[row][col].
+
+    Attributes:
+        ships           Squares occupied by the user's own ships
+        hits            Squares of the user's ships that have been hit (sunk ones included)
+        sunk            Squares of the user's ships that have been sunk
+        guess_hits      Squares where the user has hit an enemy ship (sunk ones included)
+        guess_misses    Squares where the user has missed
+        guess_sunk      Squares of enemy ships sunk by the user
+        discarded       Squares where the enemy fleet cannot be located (around the ships sunk by
+                        the user)
+        placed_ships    Same as in BoardState
+        sunk_ships      Same as in BoardState
+        ship_at         Same as in BoardState
+        hits_left       Same as in BoardState
+        guess_key       Same as in BoardState
+
+    Methods:
+        show                Prints the user's own board state; mainly used for testing
+        get_surroundings    Same as in BoardState, based on the precomputed neighbour masks
+        is_ship             Checks if one of the user's ships occupies a given square
+        fired_upon          Checks if the user has already fired at a given square
+        can_place           Checks if a ship can be placed without touching other ships
+        place               Places a Ship instance on the board
+        ship_mask           Bitmask of a Ship instance's blocks
+        is_sunk             Checks if all blocks of a ship have been hit
+        discard_surroundings  Adds a square's surroundings to the discarded mask
+        can_hold            Checks if an enemy ship may lie at a given position, given the guesses
+    '''
+    def __init__(self):
+        self.ships = 0
+        self.hits = 0
+        self.sunk = 0
+        self.guess_hits = 0
+        self.guess_misses = 0
+        self.guess_sunk = 0
+        self.discarded = 0
+        self.placed_ships = []
+        self.sunk_ships = []
+        self.ship_at = [[None]*10 for _ in range(10)]
+        self.hits_left = []
+        self.guess_key = 0
+        self._ship_masks = {} # id(ship) -> bitmask of its blocks
+    @property
+    def state(self):
+        return _GridView(self, _decode_state, _encode_state)
+    @state.setter
+    def state(self, grid):
+        self.ships = self.hits = self.sunk = 0
+        for row in range(10):
+            for col in range(10):
+                _encode_state(self, CELL_MASKS[row*10 + col], grid[row][col])
+    @property
+    def guess_state(self):
+        return _GridView(self, _decode_guess_state, _encode_guess_state)
+    @guess_state.setter
+    def guess_state(self, grid):
+        self.guess_hits = self.guess_misses = self.guess_sunk = 0
+        self.guess_key = 0
+        for row in range(10):
+            for col in range(10):
+                _encode_guess_state(self, CELL_MASKS[row*10 + col], grid[row][col])
+                self.guess_key ^= guess_keys[row*10 + col][grid[row][col]]
+    def get_surroundings(self, row, col):
+        return set(mask_to_coords(NEIGHBOUR_MASKS[row*10 + col]))
+    def is_ship(self, row, col):
+        return bool(self.ships & CELL_MASKS[row*10 + col])
+    def fired_upon(self, row, col):
+        return bool((self.guess_hits | self.guess_misses) & CELL_MASKS[row*10 + col])
+    def can_place(self, length, row, col, vertical):
+        '''
+        Checks if a ship fits on the board at the given position without touching any other ship
+
+        Input:
+            length      Length of the ship
+            row, col    Coordinates of the ship's first block (top/left)
+            vertical    Orientation of the ship
+
+        Output:
+            boolean
+        '''
+        masks = PLACEMENT_MASKS.get((length, row, col, vertical))
+        return masks is not None and not (masks[1] & self.ships)
+    def place(self, ship, row, col):
+        '''
+        Places a ship with its first block on (row, col), following its orientation. Legality
+        is not checked; see can_place.
+
+        Input: ship, row, col
+
+        Output: ship
+        '''
+        ship_mask = PLACEMENT_MASKS[(len(ship), row, col, ship.vertical)][0]
+        self.ships |= ship_mask
+        self._ship_masks[id(ship)] = ship_mask
+        ship.locations = mask_to_coords(ship_mask)
+        return self.add_ship(ship)
+    def ship_mask(self, ship):
+        ship_mask = self._ship_masks.get(id(ship))
+        if ship_mask is None:
+            ship_mask = self._ship_masks[id(ship)] = coords_to_mask(ship.locations)
+        return ship_mask
+    def is_sunk(self, ship):
+        ship_mask = self.ship_mask(ship)
+        return ship_mask & self.hits == ship_mask
+    def discard_surroundings(self, row, col):
+        ''' Adds the surroundings of a square (a block of a sunk enemy ship) to the discarded mask
+
+        Input: row, col
+
+        Output: mask of the squares that were not discarded yet
+        '''
+        new_mask = NEIGHBOUR_MASKS[row*10 + col] & ~self.discarded
+        self.discarded |= new_mask
+        return new_mask
+    def can_hold(self, length, row, col, vertical):
+        '''
+        Checks if an enemy ship may lie at the given position: none of its blocks is a miss, a
+        block of a sunk ship or a discarded square
+
+        Input:
+            length      Length of the ship
+            row, col    Coordinates of the ship's first block (top/left)
+            vertical    Orientation of the ship
+
+        Output:
+            boolean
+        '''
+        masks = PLACEMENT_MASKS.get((length, row, col, vertical))
+        return masks is not None and not (masks[0] & (self.guess_misses | self.guess_sunk | self.discarded))
@@ -2,6 +2,8 @@
 Contains the Ship and Board classes
 '''
 
+from transposition_class import guess_keys
+
 class Ship():
     '''This class is used to store ship instances and the key properties for their handling.
     
@@ -39,9 +41,17 @@ class BoardState():
         guess_state     Same as above but for the user's guesses regarding the opponent's fleet
         placed_ships    Stores all instances of ships that have been placed on the board
         sunk_ships      Same as above but for ships which have been sunk
+        ship_at         A 10x10 grid with the index in placed_ships of the ship on each block
+                        (None if there is no ship)
+        hits_left       Number of blocks of each placed ship that have not been hit yet
+        guess_key       Zobrist key of guess_state (see transposition_class), kept up to date
+                        by set_guess
 
     Methods:
         show                Prints the user's own board state; mainly used for testing
+        set_guess           Marks a square of guess_state
+        add_ship            Stores a placed ship and indexes its blocks
+        hit_ship            Registers a hit on a ship's block in constant time
         get_surroundings    For any given block, it will return a set of coordinates
                             within the board where ships can no longer be placed
     '''
@@ -52,9 +62,54 @@ class BoardState():
                             [" "]*10,[" "]*10,[" "]*10,[" "]*10,[" "]*10]
         self.placed_ships = []
         self.sunk_ships = []
+        self.ship_at = [[None]*10 for _ in range(10)]
+        self.hits_left = []
+        self.guess_key = 0
     def show(self):
         for i in range(10):
             print(self.state[i])
+    def set_guess(self, row, col, mark):
+        ''' Marks a square of guess_state ('M', 'X' or 'S'), updating guess_key with two XORs
+
+        Input: row, col, mark
+
+        Output: -
+        '''
+        guess_row = self.guess_state[row]
+        square_keys = guess_keys[row*10 + col]
+        self.guess_key ^= square_keys[guess_row[col]] ^ square_keys[mark]
+        guess_row[col] = mark
+    def add_ship(self, ship):
+        '''
+        Stores a ship whose locations have been set and indexes each of its blocks
+
+        Input:
+            ship        Ship instance
+
+        Output:
+            ship
+        '''
+        ship_indx = len(self.placed_ships)
+        self.placed_ships.append(ship)
+        for row, col in ship.locations:
+            self.ship_at[row][col] = ship_indx
+        self.hits_left.append(len(ship) - len(ship.hit_blocks))
+        return ship
+    def hit_ship(self, row, col):
+        '''
+        Registers a hit on the ship placed on the given block
+
+        Input:
+            row, col    Coordinates of a block occupied by a ship that has not been hit yet
+
+        Output:
+            (ship, sunk)    The hit Ship instance and whether all of its blocks have been hit
+        '''
+        ship_indx = self.ship_at[row][col]
+        ship = self.placed_ships[ship_indx]
+        ship.hit_blocks.append((row, col))
+        self.hits_left[ship_indx] -= 1
+        return ship, self.hits_left[ship_indx] == 0
     def get_surroundings(self, row, col):
         '''
         Returns a block's surroundings based on its coordinates
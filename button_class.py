@@ -3,6 +3,7 @@ Contains the Button class
 '''
 
 import pygame as game
+from render_cache import render_text
 
 class Button():
 	''' This class is used to automate the creation of buttons for the game.
@@ -59,5 +60,5 @@ class Button():
 			color_1, color_2 = color_2, color_1
 		# Draw the button and render the text
 		game.draw.rect(screen, color_1, self.rectangle)
-		button_text = font.render(text, False, color_2)
+		button_text = render_text(font, text, color_2)
 		screen.blit(button_text, (self.pos_x + (self.width/2 - button_text.get_width()/2), self.pos_y + (self.height/2 - button_text.get_height()/2)))
\ No newline at end of file
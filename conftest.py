@@ -0,0 +1,15 @@
+'''
+Helpers shared by the tests (test_*.py)
+'''
+
+import random
+
+from cpu_class import CPU
+from player_class import Player
+
+def cpu_player(name, seed):
+    ''' Output: Player instance, done placing, whose fleet a seeded CPU drew '''
+    player = Player(name)
+    player.board = CPU(rng=random.Random(seed)).place_ships()
+    player.placing_ships = False
+    return player
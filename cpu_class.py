@@ -2,25 +2,52 @@
 Contains the CPU class
 '''
 
-from random import randint
-from board_class import Ship, BoardState
+import random
+import numpy as np
+from available_squares_class import AvailableSquares
+from bitboard_class import BitBoardState, mask_to_coords
+from board_class import BoardState
+from fleet_placement import sample_fleet, uniform_fleet, next_uniform_fleet, fleet_ships
+from opening_book import opening_book
+from transposition_class import discard_keys, fleet_key, transposition_cache
 
 class CPU():
     '''This class is used to define the actions of the CPU in a game vs a player
 
     Attributes:
         ship_lengths            Same as in the Player class
+        uniform_placement       If True, every legal fleet is equally likely; else, ships are placed
+                                one after the other (slightly faster, but biased)
+        use_opening_book        If True, the CPU fires the shots of the opening book (see
+                                opening_book) while its position is in it
         board                   The CPU also has two boards
         num_of_tries            Number of fired bullets/canonballs
         discarded blocks        Used as part of the algorithm that looks for the player's
                                 ships. It stores the coordinates where the enemy fleet cannot be located.
         currently_hit_ship      Stores the ship instance that is currently being scanned to be sunk
         current_scanned_coord   Last coordinates the ship fired upon
-        available_squares       Stores the remaining squares where the CPU can fire
+        potential_locations     Squares around the first hit block of the scanned ship that have not
+                                been fired upon yet
+        available_squares       Stores the remaining squares where the CPU can fire (AvailableSquares)
+        enemy_sunk_lengths      Lengths of the enemy ships the CPU has sunk so far
+        discarded_key           Part of the position's Zobrist key given by the discarded blocks
+        rng                     random.Random instance the CPU draws all its random choices from
+                                (its fleet, its shots, ...)
+        seeded                  True if rng was given: the fleet is then drawn from it too, so the
+                                CPU's whole game can be replayed from the seed of rng
+        planning_attributes     Attributes changed by choose_shot (copied back from a background
+                                worker's copy of the CPU, see ai_worker_class)
 
     Methods:
-        place_ships             Takes random coordinates and orientation for each ship
-                                until the CPU has placed all 10 ships on its board.
+        place_ships             Draws a random legal fleet and places its 10 ships on the
+                                CPU's board.
+        init_available_squares  Fills available_squares with every square on the board
+        discard_squares         Discards squares where no enemy ship can be
+        discard_surroundings    Discards the surroundings of a block of a sunk enemy ship
+        position_key            Zobrist key of what the CPU knows about the enemy board
+        book_shot               Takes the shot of the opening book, if the position is in it
+        choose_shot             Picks the coordinates of the next shot (difficulty: 'normal')
+        random_shot             Picks a random available square, keeping the planning state consistent
     '''
     ship_lengths = [
                     4,
@@ -28,64 +55,319 @@ class CPU():
                     2,2,2,
                     1,1,1,1
                     ]
-    def __init__(self):
+    uniform_placement = True
+    use_opening_book = False
+    planning_attributes = ('available_squares', 'potential_locations', 'rng')
+    def __init__(self, rng=None):
         self.board = BoardState()
         self.num_of_tries = 0
         self.discarded_blocks = set()
         self.currently_hit_ship = '' # Takes a dummy variably upon initialisation
         self.current_scanned_coord = ()
-        self.available_squares = []
+        self.potential_locations = []
+        self.available_squares = AvailableSquares()
+        self.enemy_sunk_lengths = []
+        self.discarded_key = 0
+        # Without a given generator, the CPU gets a stream of its own seeded from the random module
+        self.seeded = rng is not None
+        self.rng = rng if rng is not None else random.Random(random.getrandbits(64))
+    def remaining_ship_lengths(self):
+        ''' Lengths of the enemy ships that are still afloat
+
+        Input: -
+
+        Output: list of lengths
+        '''
+        remaining = self.ship_lengths.copy()
+        for length in self.enemy_sunk_lengths:
+            remaining.remove(length)
+        return remaining
     def place_ships(self):
-        ''' Plants the CPU's ships across the board in a random fashion.
+        ''' Plants the CPU's ships across the board in a random fashion, using the precomputed
+        placement tables (see fleet_placement). Every legal fleet is equally likely, so that
+        the opponent cannot exploit a bias of the placement.
 
         Input: -
 
         Output: self.board
         '''
-        # Run until all ships have been placed, i.e., until ship_lengths is empty after
-        # popping all of its elements.
-        while len(self.ship_lengths) > 0:
-            ship = Ship(self.ship_lengths[0]) # Create the ship instance based on the ship's block length
-            rot_times = randint(1,10)
-            if rot_times % 2 == 1:
-            # Give a random orientation
-                ship.rotate()
-
-            # Take a random position
-            pos_x = randint(0,9)
-            pos_y = randint(0,9)
-            # Store the initial position
-            initial_pos_x, initial_pos_y = pos_x, pos_y
-            # Get the whole ship's surroundings block by block
-            coord_surroundings = set()
-            for block in range(len(ship)):
-                for i in range(-1,2):
-                    if (pos_x + i) in range(10):
+        if self.uniform_placement:
+            # The shared buffer of next_uniform_fleet hands out fleets in whatever order the
+            # games of the process ask for them, so a seeded CPU runs its own chain
+            if self.seeded:
+                fleet = uniform_fleet(self.ship_lengths, rng=self.rng)
+            else:
+                fleet = next_uniform_fleet(self.ship_lengths)
+        else:
+            fleet = sample_fleet(self.ship_lengths, self.rng)
+        for ship in fleet_ships(fleet, self.ship_lengths):
+            # Mark each block's position with an 'X' in the CPU's board's state
+            for row, col in ship.locations:
+                self.board.state[row][col] = 'X'
+            self.board.add_ship(ship)
+
+        return self.board
+    def init_available_squares(self):
+        ''' Stores every square of the board as a possible target.
+
+        Input: -
+
+        Output: self.available_squares
+        '''
+        self.available_squares = AvailableSquares((row, col) for row in range(10) for col in range(10))
+        return self.available_squares
+    def discard_squares(self, squares):
+        ''' Stores squares where the enemy fleet cannot be located (e.g. around a sunk ship) and
+        removes them from the available squares
+
+        Input: set of (row, col)
+
+        Output: -
+        '''
+        for row, col in squares - self.discarded_blocks:
+            self.discarded_key ^= discard_keys[row*10 + col]
+        self.discarded_blocks.update(squares)
+        self.available_squares.discard_many(squares)
+    def discard_surroundings(self, row, col):
+        ''' Discards the surroundings of a block of a sunk enemy ship. A BitBoardState records them
+        in its discarded mask, which tells which of them are new.
+
+        Input: row, col
+
+        Output: -
+        '''
+        if isinstance(self.board, BitBoardState):
+            self.discard_squares(set(mask_to_coords(self.board.discard_surroundings(row, col))))
+        else:
+            self.discard_squares(self.board.get_surroundings(row, col))
+    def position_key(self):
+        ''' Zobrist key of the CPU's guess state, discarded blocks and the enemy ships still afloat
+        (see transposition_class); the first two are kept up to date shot by shot
+
+        Input: -
+
+        Output: 64-bit integer
+        '''
+        return self.board.guess_key ^ self.discarded_key ^ fleet_key(self.remaining_ship_lengths())
+    def book_shot(self):
+        ''' Looks the position up in the opening book. The chosen square is removed from
+        available_squares.
+
+        Input: -
+
+        Output: (row, col) of the shot, or None if the position is not in the book (or the CPU
+                does not use it, or there is no book file)
+        '''
+        if not self.use_opening_book:
+            return None
+        book = opening_book()
+        if book is None:
+            return None
+        square = book.lookup(self.position_key())
+        if square is None or square not in self.available_squares:
+            return None
+        self.available_squares.remove(square)
+        return square
+    def choose_shot(self):
+        ''' Picks the next square to fire upon (difficulty: 'normal'). The CPU shoots at random
+        until it hits a ship; then it scans the hit block's neighbours and follows the ship's
+        direction until it has been sunk. The chosen square is removed from available_squares.
+
+        Input: -
+
+        Output: (row, col) of the shot
+        '''
+        # If CPU is not scanning for a ship yet (after hitting it for the first time), shoot
+        # at a square on the board in a random fashion
+        if type(self.currently_hit_ship) != str:
+            ship = self.currently_hit_ship
+            # If only hit one block of the ship, scan around it until a second block is hit
+            if len(ship.hit_blocks) == 1:
+                row, col = self.current_scanned_coord
+                # If a block has been hit in the previous turn
+                if self.board.guess_state[row][col] == 'X':
+                    self.potential_locations = []
+                    # Fill potential_locations with all the squares where the next block might be
+                    for i in range(-1,2):
                         for j in range(-1,2):
-                            if (pos_y + j) in range(10):
-                                coord_surroundings.add(self.board.state[pos_x+i][pos_y+j])
+                            if i != j and 0 in {i,j}:
+                                new_row = row + i
+                                new_col = col + j
+                                if new_row in range(10) and new_col in range(10):
+                                    if (new_row, new_col) in self.available_squares:
+                                        self.potential_locations.append((new_row, new_col))
+                    # Pick one of the potential locations at random and try shooting at it
+                    self.rng.shuffle(self.potential_locations)
+                    row, col = self.potential_locations.pop(0)
+                # If the last potential location was a miss, pick the next one until the search concludes
+                elif self.potential_locations:
+                    row, col = self.potential_locations.pop(0)
+                # Every potential location has been fired upon by random shots (see random_shot)
+                else:
+                    return self.random_shot()
+
+            # If more than one block of this ship has been hit, continue shooting along the same direction
+            # until the ship has been sunk or the CPU misses, in which cases the direction is reversed along
+            # the same axis.
+            elif len(ship.hit_blocks) > 1:
+                # At this point, the CPU has already 'found out' whether the ship is placed vertically or horizontally
+                # Note that 'self.current_scanned_coord' has been updated in 'shot_outcome'
+                row, col = self.current_scanned_coord
+                hit_block_0 = ship.hit_blocks[0] # First block of the ship that was hit
+                hit_block_1 = ship.hit_blocks[-1] # Last block of the ship that was hit
                 if ship.vertical:
-                    pos_y += 1
+                    # Direction: +1 is down, -1 is up
+                    direction = int((hit_block_1[0] - hit_block_0[0])/abs(hit_block_1[0] - hit_block_0[0]))
+                    if self.board.guess_state[row][col] == 'M' or (row+direction, col) not in self.available_squares:
+                        # Go back to the first hit_block and reverse the direction
+                        row = hit_block_0[0]-direction
+                    else:
+                        # Go along the same direction
+                        row += direction
                 else:
-                    pos_x += 1
-
-            # If the given position satisfies all the game's rules, place the ship; else, try again
-            if 'X' not in coord_surroundings and {pos_x-1, pos_y-1}.issubset(set(range(10))):
-                # Restore original position
-                pos_x, pos_y = initial_pos_x, initial_pos_y
-                # Mark each block's position with an 'X' in the CPU's board's state
-                for block in range(len(ship)):
-                    self.board.state[pos_x][pos_y] = 'X'
-                    ship.locations.append((pos_x, pos_y))
-                    if ship.vertical:
-                        pos_y += 1
+                    # Direction: +1 is right, -1 is left
+                    direction = int((hit_block_1[1] - hit_block_0[1])/abs(hit_block_1[1] - hit_block_0[1]))
+                    if self.board.guess_state[row][col] == 'M' or (row, col+direction) not in self.available_squares:
+                        # Go back to the first hit_block and reverse the direction
+                        col = hit_block_0[1]-direction
                     else:
-                        pos_x += 1
+                        # Go along the same direction
+                        col += direction
+            # A random shot (see random_shot) may have taken the square meanwhile
+            if (row, col) not in self.available_squares:
+                return self.random_shot()
+            # The square we're shooting at needs to be removed from the available choices
+            self.available_squares.remove((row,col))
 
-                # Store the placed ship, delete the current ship length, and move on to the next
-                self.board.placed_ships.append(ship)
-                self.ship_lengths.pop(0)
-            else:
-                continue
+        # If not scanning for a ship, shoot at a random set of coordinates out of the available ones
+        else:
+            row, col = self.random_shot()
 
-        return self.board
\ No newline at end of file
+        return (row, col)
+    def random_shot(self):
+        ''' Picks a random available square, e.g. when choose_shot has run out of time (see
+        ai_worker_class). The square is removed from available_squares and from the potential
+        locations of the ship being scanned, so that choose_shot never picks it again.
+
+        Input: -
+
+        Output: (row, col) of the shot
+        '''
+        square = self.available_squares.pop_random(self.rng)
+        if square in self.potential_locations:
+            self.potential_locations.remove(square)
+        return square
+
+class HardCPU(CPU):
+    '''CPU with the 'hard' difficulty. On every turn it counts how many legal placements of each
+    remaining enemy ship cover each square, given its guesses and the discarded blocks, and fires at
+    the square with the highest count. Placements through squares that have been hit but not sunk
+    yet are weighted much higher, so the CPU finishes off the ships it has found.
+
+    Attributes:
+        hit_weight      Weight multiplier of a placement per hit block it covers
+        use_opening_book    True: the opening book gives the first shots when there is one
+
+    Methods:
+        shot_density    Computes the 10x10 array of placement counts (or finds it in the
+                        'density' transposition cache)
+        choose_shot     Picks the square with the highest density
+    '''
+    hit_weight = 50
+    use_opening_book = True
+    def shot_density(self):
+        ''' Counts the legal placements of the remaining ships over each square (see shot_density below)
+
+        Input: -
+
+        Output: 10x10 float array (read-only) of weighted placement counts; squares already fired upon are 0
+        '''
+        return cached_shot_density(self.position_key(), self.board.guess_state, self.discarded_blocks,
+                                   self.remaining_ship_lengths(), self.hit_weight)
+    def choose_shot(self):
+        ''' Fires at the square covered by the most placements, picking randomly among ties (or
+        at the square of the opening book). The chosen square is removed from available_squares.
+
+        Input: -
+
+        Output: (row, col) of the shot
+        '''
+        shot = self.book_shot()
+        if shot is not None:
+            return shot
+        density = self.shot_density()
+        best = density.max()
+        if best > 0:
+            row, col = divmod(int(self.rng.choice(np.flatnonzero(density == best))), 10)
+            self.available_squares.remove((row, col))
+        # No placement fits anymore (should not happen in a fair game): shoot at random
+        else:
+            row, col = self.random_shot()
+        return (row, col)
+
+def cached_shot_density(key, guess_state, discarded_blocks, remaining, hit_weight):
+    ''' shot_density of a position, looked up in the shared 'density' transposition cache by the
+    position's Zobrist key first
+
+    Input: Zobrist key of the position, then same as shot_density
+
+    Output: 10x10 float array (read-only, since it is shared)
+    '''
+    cache = transposition_cache('density')
+    density = cache.get((key, hit_weight))
+    if density is None:
+        density = shot_density(guess_state, discarded_blocks, remaining, hit_weight)
+        density.flags.writeable = False
+        cache.put((key, hit_weight), density)
+    return density
+
+def shot_density(guess_state, discarded_blocks, remaining, hit_weight):
+    ''' Counts the legal placements of the remaining ships over each square with NumPy
+    sliding-window sums (a placement is legal if none of its blocks is a miss, a sunk block or a
+    discarded block). Placements through hit blocks are weighted hit_weight times more per hit.
+
+    Input: guess_state, discarded_blocks, remaining ship lengths, hit_weight
+
+    Output: 10x10 float array of weighted placement counts; squares already fired upon are 0
+    '''
+    # Read the guess state as one byte per square
+    guesses = np.frombuffer(''.join([''.join(row) for row in guess_state]).encode(), dtype=np.uint8)
+    hits = (guesses == ord('X')).reshape(10, 10)
+    blocked = ((guesses == ord('M')) | (guesses == ord('S'))).reshape(10, 10)
+    if discarded_blocks:
+        discarded_rows, discarded_cols = zip(*discarded_blocks)
+        blocked[discarded_rows, discarded_cols] = True
+    # Ships are straight and do not touch each other, so no ship can be diagonal to a hit block
+    padded_hits = np.pad(hits, 1)
+    blocked |= padded_hits[:-2, :-2] | padded_hits[:-2, 2:] | padded_hits[2:, :-2] | padded_hits[2:, 2:]
+    # Stack the rows and the columns of the grid, so that horizontal and vertical placements
+    # are counted together along the rows of a 20x10 array
+    free = ~blocked
+    free = np.concatenate((free, free.T)).astype(np.int64)
+    hits_int = np.concatenate((hits, hits.T)).astype(np.int64)
+
+    stacked_density = np.zeros((20, 10))
+    for length in set(remaining):
+        count = remaining.count(length)
+        legal = _window_sums(free, length) == length
+        weights = legal * (count * hit_weight ** _window_sums(hits_int, length))
+        # Spread every placement's weight over the squares it covers
+        stacked_density += _window_sums(weights, length, pad=length-1)
+    density = stacked_density[:10] + stacked_density[10:].T
+    # Only squares that have not been fired upon (nor discarded) are valid targets
+    density[blocked | hits] = 0
+    return density
+
+def _window_sums(grid, length, pad=0):
+    ''' Sums of every window of the given length along the rows of a 2D array, optionally
+    padding each row with zeros on both sides
+
+    Input: grid, length, pad
+
+    Output: array with (number of columns + 2*pad - length + 1) columns
+    '''
+    cumulative = np.zeros((grid.shape[0], grid.shape[1] + 2*pad + 1), dtype=grid.dtype)
+    np.cumsum(grid, axis=1, out=cumulative[:, pad+1:pad+1+grid.shape[1]])
+    # Past the end of the row the cumulative sum stays constant
+    cumulative[:, pad+1+grid.shape[1]:] = cumulative[:, pad+grid.shape[1]:pad+1+grid.shape[1]]
+    return cumulative[:, length:] - cumulative[:, :-length]
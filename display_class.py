@@ -0,0 +1,124 @@
+'''
+Contains the Display class, the rendering layer shared by every screen: it keeps track of the
+regions of the window that changed in the current frame and only sends those to the display.
+'''
+
+from time import perf_counter
+import pygame as game
+
+# Frame statistics of every screen, filled by the Display instances: {screen name: FrameStats}
+frame_stats = {}
+
+class FrameStats():
+	''' Frame costs of one screen
+
+	Attributes:
+		frames			Number of frames
+		drawn_frames	Frames where something changed and had to be drawn
+		seconds			Time spent in the frames (drawing and updating the display)
+		pixels			Pixels sent to the display
+		screen_pixels	Pixels of a full window update
+	'''
+	def __init__(self):
+		self.frames = 0
+		self.drawn_frames = 0
+		self.seconds = 0.0
+		self.pixels = 0
+		self.screen_pixels = 1
+
+	def report(self, name):
+		frames = max(self.frames, 1)
+		return (f"{name:<12} {self.frames:>7} frames, {self.drawn_frames/frames:6.1%} drawn, "
+				f"{self.seconds/frames*1e3:7.3f} ms/frame, "
+				f"{self.pixels/(frames*self.screen_pixels):6.1%} of the window updated per frame")
+
+class Display():
+	''' Tracks the changed regions of one screen
+
+	Attributes:
+		screen		Surface of the window
+		name		Screen name in the frame report
+		widgets		Last state and rect of every tracked widget
+		dirty		Rects to send to the display at the end of the frame
+		full		True if the whole window has to be updated
+
+	Methods:
+		start_frame		Marks the beginning of a frame (for the frame report)
+		track			Registers a widget's state; marks its old and new rects if it changed
+		invalidate		Marks a rect, or the whole window, as changed
+		needs_redraw	Checks if anything changed in this frame and clips drawing to the changed area
+		flush			Sends the changed rects to the display
+	'''
+	def __init__(self, screen, name):
+		self.screen = screen
+		self.name = name
+		self.widgets = {}
+		self.dirty = []
+		self.full = True
+		self.frame_start = perf_counter()
+		self.stats = frame_stats.setdefault(name, FrameStats())
+		self.stats.screen_pixels = screen.get_width() * screen.get_height()
+
+	def start_frame(self):
+		self.frame_start = perf_counter()
+
+	def track(self, key, state, rect=None):
+		''' Compare a widget's state with the previous frame
+
+		Input: key (widget name), state (any comparable value), rect (where it is drawn; may be None)
+
+		Output: True if the state changed
+		'''
+		previous = self.widgets.get(key)
+		if previous is not None and previous[0] == state:
+			return False
+		if previous is not None and previous[1] is not None:
+			self.dirty.append(game.Rect(previous[1]))
+		if rect is not None:
+			self.dirty.append(game.Rect(rect))
+		self.widgets[key] = (state, rect)
+		return True
+
+	def invalidate(self, rect=None):
+		''' Input: rect to update, or None for the whole window '''
+		if rect is None:
+			self.full = True
+		else:
+			self.dirty.append(game.Rect(rect))
+
+	def needs_redraw(self):
+		''' Check if anything changed in this frame. If only some regions changed, drawing is
+			clipped to them until flush, so that redrawing the whole screen only touches those pixels.
+
+		Output: boolean
+		'''
+		if self.full:
+			self.screen.set_clip(None)
+			return True
+		if self.dirty:
+			self.screen.set_clip(self.dirty[0].unionall(self.dirty[1:]))
+			return True
+		return False
+
+	def flush(self):
+		''' Send the changed regions to the display and close the frame '''
+		stats = self.stats
+		if self.full:
+			game.display.update()
+			stats.pixels += stats.screen_pixels
+			stats.drawn_frames += 1
+		elif self.dirty:
+			window = self.screen.get_rect()
+			rects = [rect.clip(window) for rect in self.dirty]
+			game.display.update(rects)
+			stats.pixels += sum(rect.width * rect.height for rect in rects)
+			stats.drawn_frames += 1
+		self.screen.set_clip(None)
+		self.full = False
+		self.dirty = []
+		stats.frames += 1
+		stats.seconds += perf_counter() - self.frame_start
+
+def frame_report():
+	''' Frame costs of every screen shown so far, one line per screen '''
+	return '\n'.join(stats.report(name) for name, stats in frame_stats.items())
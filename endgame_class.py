@@ -0,0 +1,274 @@
+'''
+Exact endgame solver. Once few enemy ships are left afloat, every arrangement of them that is
+still consistent with the CPU's guesses can be listed, and the shot that minimises the expected
+number of remaining shots (all arrangements being equally likely) can be found by searching the
+tree of shots and outcomes (miss, hit, or hit that sinks a given ship).
+
+The search keeps the results of the states it has solved (memoization: the same state is reached
+through different orders of shots, and the next turn starts from a state of this turn's tree),
+always takes a shot that hits in every arrangement first, and skips the shots whose lower bound
+cannot beat the best shot found so far (pruning). It is bounded by a number of nodes and by the
+strategy's deadline, so it can never freeze the game; when it runs out, the shot most likely to
+hit is used instead.
+'''
+
+from fleet_placement import placement_tables
+from monte_carlo_class import MonteCarloSetup, MonteCarloStrategy
+from strategy_class import Strategy
+
+# The solver takes over when at most this many arrangements are left
+max_layouts = 16
+# Nodes searched per shot before giving up on the exact answer
+max_nodes = 5000
+# Nodes between two checks of the deadline
+deadline_check_interval = 64
+
+class SearchAborted(Exception):
+    '''Raised when the endgame search runs out of nodes or time'''
+
+class EndgameSolver():
+    '''Expected remaining shots of endgame states
+
+    A state is (layouts, fired): layouts is a frozenset of arrangements, each a frozenset of the
+    bitmasks of the ships afloat, and fired is the bitmask of the squares fired upon among the
+    ones that hold a ship in some arrangement.
+
+    Attributes:
+        memo            {state: (expected remaining shots, best square bit)}
+        nodes           Nodes searched in the current call of solve
+        node_limit      Nodes allowed per call of solve
+        deadline        Time at which the current call gives up
+        clock           Clock of the deadline
+
+    Methods:
+        solve           Expected remaining shots and best square of a state
+        outcomes        Splits a state's arrangements by the outcome of a shot
+    '''
+    def __init__(self):
+        self.memo = {}
+        self.nodes = 0
+        self.node_limit = max_nodes
+        self.deadline = float('inf')
+        self.clock = None
+    def solve(self, layouts, fired):
+        ''' Input: frozenset of arrangements, fired bitmask
+
+        Output: (expected number of shots to sink every ship, bit of the best square to fire at)
+        '''
+        key = (layouts, fired)
+        if key in self.memo:
+            return self.memo[key]
+        self.nodes += 1
+        if self.nodes > self.node_limit:
+            raise SearchAborted
+        if self.clock is not None and self.nodes % deadline_check_interval == 0 and self.clock() >= self.deadline:
+            raise SearchAborted
+
+        # Squares that hold a ship in some arrangement and have not been fired upon, with the
+        # number of arrangements in which they do
+        counts = {}
+        for layout in layouts:
+            for ship in layout:
+                unhit = ship & ~fired
+                while unhit:
+                    bit = unhit & -unhit
+                    counts[bit] = counts.get(bit, 0) + 1
+                    unhit ^= bit
+        num_layouts = len(layouts)
+        # A single arrangement left: every one of its squares is a hit
+        if num_layouts == 1:
+            result = (len(counts), max(counts) if counts else None)
+            self.memo[key] = result
+            return result
+
+        # A square that is a hit in every arrangement has to be fired at eventually, and firing
+        # at it first can only reveal more
+        certain = [bit for bit, count in counts.items() if count == num_layouts]
+        if certain:
+            bit = certain[0]
+            result = (1 + self.expected(layouts, fired, bit), bit)
+            self.memo[key] = result
+            return result
+
+        best = (float('inf'), None)
+        # Most likely hits first: they usually give the best answer early, which prunes the rest
+        for bit in sorted(counts, key=counts.get, reverse=True):
+            groups = self.outcomes(layouts, fired, bit)
+            # Lower bound: every arrangement still needs one shot per square left to hit
+            bound = 1 + sum(len(group) * lower_bound(group, fired | bit) for group in groups) / num_layouts
+            if bound >= best[0]:
+                continue
+            value = 1 + sum(len(group) * self.solve(group, fired | bit)[0] for group in groups) / num_layouts
+            if value < best[0]:
+                best = (value, bit)
+        self.memo[key] = best
+        return best
+    def expected(self, layouts, fired, bit):
+        ''' Expected remaining shots after firing at the given square (not counting that shot) '''
+        groups = self.outcomes(layouts, fired, bit)
+        return sum(len(group) * self.solve(group, fired | bit)[0] for group in groups) / len(layouts)
+    def outcomes(self, layouts, fired, bit):
+        ''' Split the arrangements by what firing at the square would show: a miss, a hit, or a
+        hit that sinks a ship (which is then known, and removed from the arrangements)
+
+        Output: list of frozensets of arrangements
+        '''
+        groups = {}
+        for layout in layouts:
+            outcome = 'M'
+            for ship in layout:
+                if ship & bit:
+                    if ship & ~(fired | bit):
+                        outcome = 'X'
+                    else:
+                        outcome = ship
+                        layout = layout - {ship}
+                    break
+            groups.setdefault(outcome, set()).add(layout)
+        return [frozenset(group) for group in groups.values()]
+
+class EndgameStrategy(Strategy):
+    '''Plays another strategy until few arrangements are left, then the endgame solver
+
+    Attributes:
+        strategy        Strategy used before the endgame
+        max_layouts     Arrangements below which the solver takes over
+        solver          EndgameSolver instance (kept between shots, since the next state has
+                        often been solved already, until a ship sinks)
+        layouts         Arrangements of the current position, None if there are too many
+        ships_afloat    Lengths of the enemy ships afloat in the states held by the solver
+    '''
+    def __init__(self, strategy=None, max_layouts=max_layouts):
+        super().__init__()
+        self.strategy = strategy if strategy is not None else MonteCarloStrategy()
+        self.max_layouts = max_layouts
+        self.solver = EndgameSolver()
+        self.layouts = None
+        self.ships_afloat = None
+    def start(self, position):
+        super().start(position)
+        # Once a ship sinks, the solved states are dropped so that the memo does not grow for the
+        # whole game (the new position is solved again within max_nodes)
+        if position.remaining_ships != self.ships_afloat:
+            self.solver.memo.clear()
+            self.ships_afloat = position.remaining_ships
+        setup = MonteCarloSetup(position)
+        self.layouts, self.fired = list_layouts(position, self.max_layouts, setup)
+        if self.layouts is None:
+            self.strategy.deadline, self.strategy.clock, self.strategy.rng = self.deadline, self.clock, self.rng
+            if isinstance(self.strategy, MonteCarloStrategy):
+                # The setup of the position is only built once per shot
+                self.strategy.start(position, setup)
+            else:
+                self.strategy.start(position)
+            self.best = self.strategy.best
+            self.done = self.strategy.done
+            return
+        # Until the search finishes, the square that holds a ship in the most arrangements
+        counts = {}
+        for layout in self.layouts:
+            for ship in layout:
+                unhit = ship & ~self.fired
+                while unhit:
+                    bit = unhit & -unhit
+                    counts[bit] = counts.get(bit, 0) + 1
+                    unhit ^= bit
+        if counts:
+            most = max(counts.values())
+            self.best = bit_square(self.rng.choice([bit for bit, count in counts.items() if count == most]))
+    def refine(self):
+        if self.layouts is None:
+            self.strategy.refine()
+            self.best = self.strategy.best
+            self.done = self.strategy.done
+            return
+        solver = self.solver
+        solver.nodes = 0
+        solver.deadline, solver.clock = self.deadline, self.clock
+        try:
+            _, bit = solver.solve(self.layouts, self.fired)
+            if bit is not None:
+                self.best = bit_square(bit)
+        except SearchAborted:
+            pass
+        # Solved, or out of nodes or time: searching again would not get further
+        self.done = True
+
+# FUNCTIONS
+
+def list_layouts(position, limit, setup=None):
+    ''' Every arrangement of the ships afloat consistent with the position, if there are at most
+    'limit' of them
+
+    Input: Position instance, limit, its MonteCarloSetup (default: built here)
+
+    Output: (frozenset of arrangements or None if there are more than 'limit', fired bitmask)
+    '''
+    if setup is None:
+        setup = MonteCarloSetup(position)
+    hits = 0
+    for row, col in position.hits():
+        hits |= 1 << (row*10 + col)
+    layouts = set()
+    for option in setup.cover_options:
+        ships = [placement_tables[length].ship_masks[indx] for length, indx in option]
+        occupied = 0
+        for ship in ships:
+            occupied |= ship
+        left = list(position.remaining_ships)
+        for length, _ in option:
+            left.remove(length)
+        left.sort(reverse=True)
+        if not _place_rest(left, 0, -1, occupied, ships, setup, layouts, limit):
+            return None, hits
+    return frozenset(layouts), hits
+
+def _place_rest(left, ship_num, previous, occupied, ships, setup, layouts, limit):
+    ''' Depth-first placement of the ships that do not cover any hit. Ships of the same length
+    are placed in increasing placement order so that each arrangement is found once.
+
+    Output: False if more than 'limit' arrangements have been found
+    '''
+    if ship_num == len(left):
+        layouts.add(frozenset(ships))
+        return len(layouts) <= limit
+    length = left[ship_num]
+    table = placement_tables[length]
+    same_as_previous = ship_num > 0 and left[ship_num - 1] == length
+    for indx in setup.allowed[length]:
+        if same_as_previous and indx <= previous:
+            continue
+        if not table.zone_masks[indx] & occupied:
+            ships.append(table.ship_masks[indx])
+            found = _place_rest(left, ship_num + 1, indx, occupied | table.ship_masks[indx], ships, setup, layouts, limit)
+            ships.pop()
+            if not found:
+                return False
+    return True
+
+def lower_bound(layouts, fired):
+    ''' Lower bound of the expected remaining shots: every arrangement needs one shot per square
+    left to hit and, unless the next shot is a hit in every arrangement, the next shot misses in
+    some of them
+
+    Input: frozenset of arrangements, fired bitmask
+
+    Output: bound
+    '''
+    total = 0
+    counts = {}
+    for layout in layouts:
+        for ship in layout:
+            unhit = ship & ~fired
+            total += bin(unhit).count('1')
+            while unhit:
+                bit = unhit & -unhit
+                counts[bit] = counts.get(bit, 0) + 1
+                unhit ^= bit
+    if len(layouts) == 1 or not counts:
+        return total / len(layouts)
+    return total / len(layouts) + 1 - max(counts.values()) / len(layouts)
+
+def bit_square(bit):
+    ''' Output: (row, col) of a single-bit mask '''
+    return divmod(bit.bit_length() - 1, 10)
@@ -0,0 +1,182 @@
+'''
+Headless game engine: contains the rules of the game and its turn order without any
+dependency on PyGame. The PyGame front end in battleship.py renders a Game instance, while
+simulations can play thousands of CPU vs CPU games by calling Game.play() directly.
+'''
+
+import random
+
+from board_class import BoardState
+from cpu_class import CPU
+
+class GameResult():
+    '''Summary of a finished game
+
+    Attributes:
+        winner          User who sank the whole enemy fleet first
+        loser           The other user
+        first_player    User who fired the first shot after shuffling the users
+        num_of_turns    Number of valid shots fired by both users
+    '''
+    def __init__(self, winner, loser, first_player, num_of_turns):
+        self.winner = winner
+        self.loser = loser
+        self.first_player = first_player
+        self.num_of_turns = num_of_turns
+    def __repr__(self):
+        return (f"GameResult(winner={player_name(self.winner)}, tries={self.winner.num_of_tries}, "
+                f"first_player={player_name(self.first_player)}, num_of_turns={self.num_of_turns})")
+
+class Game():
+    '''Runs a game between two users (Player or CPU instances)
+
+    Attributes:
+        users           Both users, shuffled so that users[0] goes first
+        user_1          User whose turn it is
+        user_2          User waiting for their turn
+        num_of_turns    Number of valid shots fired so far
+        result          GameResult instance once the game has finished, None before that
+
+    Methods:
+        fire            Handles a shot of the current user and moves on to the next turn
+        cpu_turn        Lets the current user (a CPU) pick its shot and fire it
+        play            Plays CPU turns until the game has finished
+    '''
+    def __init__(self, users, board_factory=BoardState, rng=None):
+        # Place the fleet of every CPU; players have already placed their ships.
+        # board_factory picks the board backend of the CPUs (BoardState or BitBoardState), and rng
+        # (a random.Random instance, default: the random module) who goes first
+        for user in users:
+            if isinstance(user, CPU):
+                user.board = board_factory()
+                user.place_ships()
+                user.init_available_squares()
+        # Shuffle user list so that who goes first is random
+        self.users = list(users)
+        (random if rng is None else rng).shuffle(self.users)
+        self.user_1 = self.users[0] # Goes first
+        self.user_2 = self.users[1] # Goes second
+        self.num_of_turns = 0
+        self.result = None
+    @property
+    def finished(self):
+        return self.result is not None
+    def fire(self, row, col):
+        ''' Handle a shot of the current user at the given square. If the shot is valid, the
+        turn passes to the other user (or the game finishes).
+
+        Input: row, col
+
+        Output: next_player_turn boolean (None if the square had already been fired upon)
+        '''
+        next_player_turn = shot_outcome(self.user_1, self.user_2, row, col)
+        if next_player_turn:
+            self.num_of_turns += 1
+            # The opponent's whole fleet has been sunk
+            if len(self.user_2.board.sunk_ships) == len(self.user_2.board.placed_ships):
+                self.result = GameResult(self.user_1, self.user_2, self.users[0], self.num_of_turns)
+            else:
+                self.user_1, self.user_2 = swap_users(self.user_1, self.user_2)
+        return next_player_turn
+    def cpu_turn(self):
+        ''' The current user (a CPU) chooses a square and fires at it
+
+        Input: -
+
+        Output: (row, col) of the shot
+        '''
+        row, col = self.user_1.choose_shot()
+        self.fire(row, col)
+        return (row, col)
+    def play(self):
+        ''' Play until one of the fleets has been sunk. Only CPU users can be simulated.
+
+        Input: -
+
+        Output: GameResult instance
+        '''
+        while not self.finished:
+            self.cpu_turn()
+        return self.result
+
+# FUNCTIONS
+
+def player_name(user):
+    ''' Name to display for the given user
+
+    Input: user
+
+    Output: name string
+    '''
+    if isinstance(user, CPU):
+        return "CPU"
+    return user.name
+
+def swap_users(user_1, user_2):
+    ''' Swap one user for another when it's the other player's turn; might modify/exclude in future versions
+
+    Input: user_1, user_2
+
+    Output: (user_2, user_1)
+    '''
+    temp_user = user_2
+    user_2 = user_1
+    user_1 = temp_user
+    return (user_1, user_2)
+
+def shot_outcome(user, opponent, row, col):
+    ''' Handle the user's guess
+
+    Input: user, opponent, row, col
+    Output: next_player_turn boolean
+    '''
+    # Only check if the given square has not been fired upon yet
+    if user.board.guess_state[row][col] not in {'S', 'X', 'M'}:
+
+        # Case 1: 'Hit'
+        if opponent.board.state[row][col] == 'X':
+            user.num_of_tries += 1
+            # Find out which of the rival's ships has been hit through the board's index
+            ship, sunk = opponent.board.hit_ship(row, col)
+            # Check if the rival's ship has been sunk; if so, update the color of all hit blocks
+            if sunk:
+                opponent.board.sunk_ships.append(ship)
+                if isinstance(user,CPU):
+                    user.enemy_sunk_lengths.append(len(ship))
+                # Change all the 'X' of the hit ship to 'S' in the relevant boards
+                for sunk_coords in ship.hit_blocks:
+                    (sunk_x, sunk_y) = sunk_coords
+                    opponent.board.state[sunk_x][sunk_y] = 'S'
+                    user.board.set_guess(sunk_x, sunk_y, 'S')
+                    # If the CPU is playing: store the sunk ship's surroundings and discard them
+                    # from the available squares
+                    if isinstance(user,CPU):
+                        user.discard_surroundings(sunk_x, sunk_y)
+                # For the CPU: update the currently_hit_ship and current_scanned_coord
+                # attributes to stop scanning for the hit ship.
+                if isinstance(user,CPU):
+                    user.currently_hit_ship = ''
+                    user.current_scanned_coord = ()
+                # Opponent plays next
+                next_player_turn = True
+                return next_player_turn
+            else:
+                # Hit but not sunk
+                opponent.board.state[row][col] = 'H'
+                user.board.set_guess(row, col, 'X')
+                if isinstance(user,CPU):
+                    user.currently_hit_ship = ship
+                    user.current_scanned_coord = (row, col)
+                next_player_turn = True
+                return next_player_turn
+
+        # Case 2: 'Miss'
+        elif opponent.board.state[row][col] in {'O',' '}:
+            user.num_of_tries += 1
+            user.board.set_guess(row, col, 'M')
+            if isinstance(user,CPU):
+                user.current_scanned_coord = (row, col)
+            next_player_turn = True
+            return next_player_turn
+    else:
+        pass # Do nothing if square has already been fired upon
@@ -0,0 +1,340 @@
+'''
+Placement engine based on precomputed tables of every legal ship placement on the board.
+Each placement is a (length, row, col, vertical) tuple with the bitmask of its blocks and of its
+exclusion zone (the blocks plus their surroundings), taken from bitboard_class. A fleet is
+sampled by picking each ship among the placements that do not touch the ships placed before it,
+so it takes a fixed number of steps instead of retrying random positions. Placing ships one after
+the other does not give every legal fleet the same probability, though (the largest ships end up
+in the middle more often), so uniform_fleet and uniform_fleets sample fleets uniformly with a
+Markov chain over the same tables: one ship at a time is moved to a random placement of its
+length, and the move is kept if it is legal. Since the proposals are symmetric, the chain
+converges to the uniform distribution over all legal fleets.
+
+Fleets can be stored compactly as one byte per ship: the index of its placement in the table of
+its length (see placement_tables).
+'''
+
+import random
+
+import numpy as np
+
+from bitboard_class import PLACEMENT_MASKS
+from board_class import Ship
+
+def split_masks(masks):
+    ''' Split 100-bit masks into two uint64 arrays so that NumPy can handle them
+
+    Input: list of masks
+
+    Output: (low 64 bits array, high bits array)
+    '''
+    low = np.array([mask & 0xFFFFFFFFFFFFFFFF for mask in masks], dtype=np.uint64)
+    high = np.array([mask >> 64 for mask in masks], dtype=np.uint64)
+    return low, high
+
+class PlacementTable():
+    '''Every placement of a ship of a given length
+
+    Attributes:
+        length          Length of the ships
+        placements      List of (row, col, vertical) tuples
+        ship_masks      Bitmask of the blocks of each placement
+        zone_masks      Bitmask of the blocks and their surroundings of each placement
+        ship_lo/hi      ship_masks split into two uint64 NumPy arrays (bits 0-63 and 64-99)
+        zone_lo/hi      Same for zone_masks
+        cells           (placements x 100) uint8 array, 1 where the placement has a block
+    '''
+    def __init__(self, length):
+        self.length = length
+        self.placements = []
+        self.ship_masks = []
+        self.zone_masks = []
+        for (ship_length, row, col, vertical), (ship_mask, zone_mask) in PLACEMENT_MASKS.items():
+            # One-block ships look the same in both orientations; keep them once
+            if ship_length != length or (length == 1 and not vertical):
+                continue
+            self.placements.append((row, col, vertical))
+            self.ship_masks.append(ship_mask)
+            self.zone_masks.append(zone_mask)
+        self.ship_lo, self.ship_hi = split_masks(self.ship_masks)
+        self.zone_lo, self.zone_hi = split_masks(self.zone_masks)
+        self.cells = np.array([[(mask >> bit) & 1 for bit in range(100)] for mask in self.ship_masks], dtype=np.uint8)
+    def __len__(self):
+        return len(self.placements)
+
+# Tables of every ship length, built once at import
+placement_tables = {length: PlacementTable(length) for length in range(1, 5)}
+# Largest ships first: they have the fewest legal placements on a crowded board
+default_fleet = [4, 3, 3, 2, 2, 2, 1, 1, 1, 1]
+# Fleets drawn by sample_fleet before giving up on an impossible fleet. The default fleet never
+# reaches a dead end (not once in a million fleets), so this only matters for crowded custom fleets
+max_attempts = 1000
+# Random placements tried for each ship before filtering the whole table; most of them are legal,
+# and a random legal pick is just as uniform as a pick among the filtered ones
+quick_tries = 8
+# Sweeps (one move proposal per ship) of the Markov chain before a fleet is taken as uniform
+burn_in_sweeps = 100
+# Uniform fleets are drawn with NumPy this many at a time (one independent chain each) and handed
+# out one by one by next_uniform_fleet
+fleet_buffer_size = 4096
+_fleet_buffer = []
+
+# FUNCTIONS
+
+def sample_fleet(ship_lengths=default_fleet, rng=random):
+    ''' Draw a random legal fleet: each ship is placed uniformly among the placements of its length
+    that do not touch the ships placed before it
+
+    This is not uniform over all legal fleets (see the module docstring). The CPU only uses it as
+    is when its uniform_placement is False; otherwise it is the starting fleet of the Markov chain
+    of uniform_fleet, whose burn-in removes the bias (uniform_fleets starts from sample_fleets,
+    which draws the same way). If the ships placed so far leave no room for the next one, the
+    whole fleet is drawn again; after max_attempts dead ends ValueError is raised, since the
+    fleet most likely does not fit on the board at all.
+
+    Input: list of ship lengths, in placement order, random number generator (random.Random
+           instance or the random module)
+
+    Output: list with the index of each ship's placement in placement_tables[length]
+    '''
+    for _ in range(max_attempts):
+        occupied = 0 # Blocks of the ships placed so far
+        fleet = []
+        for length in ship_lengths:
+            table = placement_tables[length]
+            zone_masks = table.zone_masks
+            for _ in range(quick_tries):
+                indx = rng.randrange(len(zone_masks))
+                if not zone_masks[indx] & occupied:
+                    break
+            else:
+                candidates = [indx for indx in range(len(zone_masks)) if not zone_masks[indx] & occupied]
+                # Dead end: the ships placed so far leave no room for this one, start again
+                if not candidates:
+                    break
+                indx = rng.choice(candidates)
+            occupied |= table.ship_masks[indx]
+            fleet.append(indx)
+        else:
+            return fleet
+    raise ValueError(f"Could not place a fleet of lengths {ship_lengths} on the board")
+
+def sample_fleets(num_fleets, ship_lengths=default_fleet, batch_size=100000, seed=None):
+    ''' Draw many random fleets at once with NumPy, with the same distribution as sample_fleet
+    (fleets that reach a dead end are dropped and drawn again; ValueError if none of the first
+    max_attempts fits)
+
+    Input: number of fleets, list of ship lengths, fleets per batch (bounds the memory
+           used), seed of the NumPy generator
+
+    Output: (num_fleets x number of ships) uint8 array of placement indices
+    '''
+    generator = np.random.default_rng(seed)
+    fleets = np.empty((num_fleets, len(ship_lengths)), dtype=np.uint8)
+    done = 0
+    drawn = 0
+    while done < num_fleets:
+        size = min(batch_size, num_fleets - done)
+        batch, valid = _sample_batch(size, ship_lengths, generator)
+        drawn += size
+        # As in sample_fleet: a fleet that never fits is impossible, rather than drawn forever
+        if not valid.any() and drawn >= max_attempts:
+            raise ValueError(f"Could not place a fleet of lengths {ship_lengths} on the board")
+        batch = batch[valid]
+        fleets[done:done + len(batch)] = batch[:num_fleets - done]
+        done += len(batch)
+    return fleets
+
+def _sample_batch(size, ship_lengths, generator):
+    ''' Place every ship of 'size' fleets at the same time
+
+    Output: (fleets array, boolean array of the fleets that did not reach a dead end)
+    '''
+    fleets = np.zeros((size, len(ship_lengths)), dtype=np.uint8)
+    occupied_lo = np.zeros(size, dtype=np.uint64)
+    occupied_hi = np.zeros(size, dtype=np.uint64)
+    valid = np.ones(size, dtype=bool)
+    for ship_num, length in enumerate(ship_lengths):
+        table = placement_tables[length]
+        # Random placements first, redrawn for the fleets where they are illegal
+        choice = generator.integers(0, len(table), size)
+        pending = np.arange(size)
+        for _ in range(quick_tries):
+            chosen = choice[pending]
+            legal = ((table.zone_lo[chosen] & occupied_lo[pending]) | (table.zone_hi[chosen] & occupied_hi[pending])) == 0
+            pending = pending[~legal]
+            if len(pending) == 0:
+                break
+            choice[pending] = generator.integers(0, len(table), len(pending))
+        # Uniform choice among the legal placements of the remaining fleets: the largest random key wins
+        if len(pending):
+            legal = ((table.zone_lo[None, :] & occupied_lo[pending, None]) | (table.zone_hi[None, :] & occupied_hi[pending, None])) == 0
+            keys = generator.random(legal.shape)
+            keys[~legal] = -1
+            choice[pending] = keys.argmax(axis=1)
+            valid[pending] &= legal.any(axis=1)
+        fleets[:, ship_num] = choice
+        occupied_lo |= table.ship_lo[choice]
+        occupied_hi |= table.ship_hi[choice]
+    return fleets, valid
+
+def fleet_ships(fleet, ship_lengths=default_fleet):
+    ''' Build the Ship instances of a compact fleet
+
+    Input: placement indices, ship lengths
+
+    Output: list of Ship instances with their locations
+    '''
+    ships = []
+    for length, indx in zip(ship_lengths, fleet):
+        row, col, vertical = placement_tables[length].placements[indx]
+        ship = Ship(length)
+        ship.vertical = vertical
+        ship.locations = [(row + block*vertical, col + block*(not vertical)) for block in range(length)]
+        ships.append(ship)
+    return ships
+
+def uniform_fleet(ship_lengths=default_fleet, sweeps=burn_in_sweeps, rng=random):
+    ''' Draw a fleet uniformly among all legal fleets, by running the Markov chain from a fleet
+    given by sample_fleet
+
+    Input: list of ship lengths, number of sweeps, random number generator
+
+    Output: list of placement indices, as in sample_fleet
+    '''
+    fleet = sample_fleet(ship_lengths, rng)
+    tables = [placement_tables[length] for length in ship_lengths]
+    ship_masks = [table.ship_masks[indx] for table, indx in zip(tables, fleet)]
+    occupied = 0
+    for ship_mask in ship_masks:
+        occupied |= ship_mask
+    # Local names: this loop runs sweeps x ships times per fleet
+    uniform = rng.random
+    moves = [(ship_num, len(table), table.zone_masks, table.ship_masks) for ship_num, table in enumerate(tables)]
+    for _ in range(sweeps):
+        for ship_num, num_placements, zone_masks, table_ship_masks in moves:
+            indx = int(uniform() * num_placements)
+            # Ships never overlap, so removing one of them is an XOR
+            others = occupied ^ ship_masks[ship_num]
+            if not zone_masks[indx] & others:
+                fleet[ship_num] = indx
+                ship_masks[ship_num] = table_ship_masks[indx]
+                occupied = others | ship_masks[ship_num]
+    return fleet
+
+def next_uniform_fleet(ship_lengths=default_fleet):
+    ''' Same as uniform_fleet, but much faster: fleets are taken from a buffer that is refilled
+    with uniform_fleets, using one chain per fleet so that they are all independent
+
+    Input: list of ship lengths
+
+    Output: list of placement indices, as in sample_fleet
+    '''
+    if ship_lengths != default_fleet:
+        return uniform_fleet(ship_lengths)
+    if not _fleet_buffer:
+        seed = random.getrandbits(64)
+        _fleet_buffer.extend(uniform_fleets(fleet_buffer_size, chains=fleet_buffer_size, seed=seed).tolist())
+    return _fleet_buffer.pop()
+
+def uniform_fleets(num_fleets, ship_lengths=default_fleet, chains=100000, sweeps=burn_in_sweeps, thinning=1, seed=None):
+    ''' Draw many fleets uniformly with NumPy, by running many Markov chains side by side. After the
+    burn-in, the state of every chain is recorded every 'thinning' sweeps.
+
+    Input: number of fleets, list of ship lengths, number of chains, burn-in sweeps, sweeps between
+           two recorded fleets of a chain, seed of the NumPy generator
+
+    Output: (num_fleets x number of ships) uint8 array of placement indices
+    '''
+    generator = np.random.default_rng(seed)
+    chains = min(chains, num_fleets)
+    tables = [placement_tables[length] for length in ship_lengths]
+    fleets = np.empty((num_fleets, len(ship_lengths)), dtype=np.uint8)
+
+    # Start every chain from a fleet placed ship by ship
+    state = sample_fleets(chains, ship_lengths, seed=generator.integers(1 << 63))
+    ship_lo = np.stack([table.ship_lo[state[:, ship_num]] for ship_num, table in enumerate(tables)], axis=1)
+    ship_hi = np.stack([table.ship_hi[state[:, ship_num]] for ship_num, table in enumerate(tables)], axis=1)
+    occupied_lo = np.bitwise_or.reduce(ship_lo, axis=1)
+    occupied_hi = np.bitwise_or.reduce(ship_hi, axis=1)
+
+    def sweep():
+        nonlocal occupied_lo, occupied_hi
+        for ship_num, table in enumerate(tables):
+            proposal = generator.integers(0, len(table), chains)
+            others_lo = occupied_lo ^ ship_lo[:, ship_num]
+            others_hi = occupied_hi ^ ship_hi[:, ship_num]
+            accept = ((table.zone_lo[proposal] & others_lo) | (table.zone_hi[proposal] & others_hi)) == 0
+            state[accept, ship_num] = proposal[accept]
+            ship_lo[accept, ship_num] = table.ship_lo[proposal[accept]]
+            ship_hi[accept, ship_num] = table.ship_hi[proposal[accept]]
+            occupied_lo = others_lo | ship_lo[:, ship_num]
+            occupied_hi = others_hi | ship_hi[:, ship_num]
+
+    for _ in range(sweeps):
+        sweep()
+    done = 0
+    while done < num_fleets:
+        size = min(chains, num_fleets - done)
+        fleets[done:done + size] = state[:size]
+        done += size
+        if done < num_fleets:
+            for _ in range(thinning):
+                sweep()
+    return fleets
+
+def exact_uniform_fleets(num_fleets, ship_lengths=default_fleet, batch_size=1000000, seed=None):
+    ''' Reference sampler: every ship is drawn independently among all placements of its length
+    and the whole fleet is rejected if two ships touch. Exactly uniform, but only about one fleet
+    in 4000 is kept, so it is only meant to check the other samplers.
+
+    Input: number of fleets, list of ship lengths, proposals per batch, seed of the NumPy generator
+
+    Output: (num_fleets x number of ships) uint8 array of placement indices
+    '''
+    generator = np.random.default_rng(seed)
+    fleets = np.empty((num_fleets, len(ship_lengths)), dtype=np.uint8)
+    done = 0
+    while done < num_fleets:
+        batch = np.empty((batch_size, len(ship_lengths)), dtype=np.uint8)
+        legal = np.ones(batch_size, dtype=bool)
+        occupied_lo = np.zeros(batch_size, dtype=np.uint64)
+        occupied_hi = np.zeros(batch_size, dtype=np.uint64)
+        for ship_num, length in enumerate(ship_lengths):
+            table = placement_tables[length]
+            choice = generator.integers(0, len(table), batch_size)
+            legal &= ((table.zone_lo[choice] & occupied_lo) | (table.zone_hi[choice] & occupied_hi)) == 0
+            occupied_lo |= table.ship_lo[choice]
+            occupied_hi |= table.ship_hi[choice]
+            batch[:, ship_num] = choice
+        batch = batch[legal][:num_fleets - done]
+        fleets[done:done + len(batch)] = batch
+        done += len(batch)
+    return fleets
+
+def fleet_occupancy(fleets, ship_lengths=default_fleet):
+    ''' Number of fleets that have a block on each square
+
+    Input: (fleets x ships) array of placement indices, ship lengths
+
+    Output: 10x10 int64 array
+    '''
+    occupancy = np.zeros(100, dtype=np.int64)
+    for ship_num, length in enumerate(ship_lengths):
+        table = placement_tables[length]
+        counts = np.bincount(fleets[:, ship_num], minlength=len(table))
+        occupancy += counts @ table.cells.astype(np.int64)
+    return occupancy.reshape(10, 10)
+
+def fleet_ship_at(fleets, ship_lengths=default_fleet):
+    ''' Number of the ship on each square of every fleet
+
+    Input: (fleets x ships) array of placement indices, ship lengths
+
+    Output: (fleets x 100) int8 array, -1 for water
+    '''
+    ship_at = np.full((len(fleets), 100), -1, dtype=np.int8)
+    for ship_num, length in enumerate(ship_lengths):
+        cells = placement_tables[length].cells[fleets[:, ship_num]].astype(bool)
+        ship_at[cells] = ship_num
+    return ship_at
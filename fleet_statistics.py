@@ -0,0 +1,82 @@
+'''
+Compares the fleet placers numerically: draws a large number of fleets with each of them, in
+chunks so that memory does not grow with the number of fleets, and writes the per-square
+occupancy heatmaps (probability that a ship's block lies on each square) as CSV files.
+
+Placers:
+    sequential      sample_fleets: ships placed one after the other, largest first
+    uniform         uniform_fleets: Markov chain over the placement tables
+    exact           exact_uniform_fleets: rejection sampling, exactly uniform but slow
+
+Usage:
+    python fleet_statistics.py --fleets 10000000 --exact 20000 --output heatmaps
+'''
+
+import argparse
+import os
+from time import perf_counter
+
+import numpy as np
+
+from fleet_placement import sample_fleets, uniform_fleets, exact_uniform_fleets, fleet_occupancy
+
+placers = {
+    'sequential': sample_fleets,
+    'uniform': uniform_fleets,
+    'exact': exact_uniform_fleets,
+}
+
+def occupancy_heatmap(placer, num_fleets, chunk_size=1000000, seed=None):
+    ''' Occupancy probability of every square over num_fleets fleets drawn by the given placer
+
+    Input: placer name, number of fleets, fleets per chunk, seed
+
+    Output: 10x10 float array
+    '''
+    seeds = np.random.SeedSequence(seed).spawn((num_fleets + chunk_size - 1) // chunk_size)
+    occupancy = np.zeros((10, 10), dtype=np.int64)
+    for chunk_num, chunk_seed in enumerate(seeds):
+        size = min(chunk_size, num_fleets - chunk_num*chunk_size)
+        fleets = placers[placer](size, seed=chunk_seed.generate_state(1)[0])
+        occupancy += fleet_occupancy(fleets)
+    return occupancy / num_fleets
+
+def compare(heatmap, reference):
+    ''' Distance between two heatmaps
+
+    Output: (largest difference on a single square, total variation distance of the
+             normalised heatmaps)
+    '''
+    max_diff = np.abs(heatmap - reference).max()
+    total_variation = 0.5 * np.abs(heatmap/heatmap.sum() - reference/reference.sum()).sum()
+    return max_diff, total_variation
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the occupancy heatmaps of the fleet placers")
+    parser.add_argument('--fleets', type=int, default=10000000, help="fleets per placer")
+    parser.add_argument('--exact', type=int, default=0, help="fleets of the exact reference placer (slow)")
+    parser.add_argument('--output', default='heatmaps', help="directory of the CSV files")
+    parser.add_argument('--seed', type=int, default=None)
+    args = parser.parse_args()
+    if args.fleets <= 0 and args.exact <= 0:
+        parser.error("no fleets to draw: give --fleets or --exact")
+
+    os.makedirs(args.output, exist_ok=True)
+    heatmaps = {}
+    for placer in placers:
+        num_fleets = args.exact if placer == 'exact' else args.fleets
+        if num_fleets <= 0:
+            continue
+        start = perf_counter()
+        heatmaps[placer] = occupancy_heatmap(placer, num_fleets, seed=args.seed)
+        elapsed = perf_counter() - start
+        np.savetxt(os.path.join(args.output, f"{placer}.csv"), heatmaps[placer], delimiter=',', fmt='%.6f')
+        print(f"{placer}: {num_fleets} fleets in {elapsed:.1f}s ({num_fleets/elapsed:.0f} fleets/sec), "
+              f"occupancy {heatmaps[placer].min():.4f} - {heatmaps[placer].max():.4f}")
+
+    # The placers are compared with the exact one, or else with the uniform one
+    reference = 'exact' if 'exact' in heatmaps else 'uniform'
+    for placer, heatmap in heatmaps.items():
+        if placer != reference:
+            max_diff, total_variation = compare(heatmap, heatmaps[reference])
+            print(f"{placer} vs {reference}: max square difference {max_diff:.4f}, total variation {total_variation:.4f}")
@@ -0,0 +1,568 @@
+'''
+Authoritative game server of the online mode: hosts many games at once, each between two players
+connected over TCP, and runs their rules itself (engine.Game, i.e. shot_outcome), so a client only
+learns the outcome of its own shots and the other player's fleet never leaves the server.
+
+Everything runs in one asyncio event loop on one core. Connections are asyncio protocols rather
+than streams: a message is handled in the callback that receives it, with no task per connection
+or per move, so a move costs a one-byte decode, Game.fire and two writes of two bytes.
+
+Messages are the binary frames of wire_protocol, as in LAN games (lan_class):
+    client -> server
+        join        {'type': 'join', 'version', 'name', 'fleet'}: the fleet is a list of ships,
+                    each a list of [row, col]; players are paired in the order they join
+        shot        {'type': 'shot', 'row', 'col'}
+    server -> client
+        start       {'type': 'start', 'opponent', 'first'}: first is True for the player who
+                    fires first
+        result      {'type': 'result', 'row', 'col', 'outcome', 'ship' (only for 'S')}: outcome
+                    of the player's shot
+        shot        {'type': 'shot', 'row', 'col', 'outcome'}: the opponent's shot at the
+                    player's fleet
+        end         {'type': 'end', 'won', 'reason'}: the game is over, won or lost (the
+                    connection is then closed)
+        error       {'type': 'error', 'reason'}: the last message broke the protocol (idem)
+
+Spectators connect the same way, but send watch messages instead of joining. Every game has a
+number (from 1, in the order the games start; 0 in a watch means the latest game):
+    client -> server
+        watch       {'type': 'watch', 'game'}: adds a game to the ones the spectator watches
+    server -> spectator
+        keyframe    {'type': 'keyframe', 'game', 'turn', 'next', 'names', 'guesses'}: the whole
+                    state of a game: number of shots so far, player who fires next (0: the one
+                    who fired first), names and guess states of both players
+        delta       {'type': 'delta', 'game', 'turn', 'player', 'cells', 'sunk'}: a shot, as the
+                    squares of the shooter's guess state that changed, (row, col, mark), and the
+                    blocks of the ship it sank (None if it did not)
+        finished    {'type': 'finished', 'game', 'winner', 'reason'}: the game is over (winner is
+                    wire_protocol.NO_WINNER if the game does not exist)
+
+Every player has time_per_move seconds for each shot and time_per_game seconds on their clock for
+the whole game (as with a chess clock, only the time of their own turns counts); a player who runs
+out of either loses the game, as if they had left. The deadlines of every game are kept in one
+timer wheel (timer_wheel_class.TimerWheel), so each shot costs a constant-time cancel and insert
+instead of an event loop handle per player and per move, and a single handle ticks the wheel
+while deadlines are pending.
+
+A delta is encoded once and the same bytes are written to every spectator of the game. A
+spectator that does not read fast enough never slows the players down: once the bytes waiting to
+be sent to it go over spectator_buffer_size, its deltas are dropped, and when it has caught up it
+receives a new keyframe of every game that has moved meanwhile, a few games per loop iteration
+(keyframes are encoded once per shot, however many spectators need them).
+
+Usage:
+    python game_server.py --port 40405 --time-per-move 30 --time-per-game 300
+'''
+
+import argparse
+import asyncio
+import gc
+import random
+import signal
+import socket
+from time import monotonic, perf_counter
+
+from engine import Game
+from lan_class import ProtocolError, legal_fleet
+from player_class import Player
+from timer_wheel_class import TimerWheel
+from wire_protocol import NO_WINNER, encode_message, fleet_board, protocol_version, split_messages
+
+# TCP port of the server
+default_port = 40405
+# Longest name of a player
+max_name_length = 20
+# Bytes that can wait to be sent to a spectator (in the socket and in asyncio's buffer each)
+# before its deltas are dropped
+spectator_buffer_size = 16384
+# Keyframes sent to a spectator per loop iteration while it catches up
+keyframe_batch = 32
+# Seconds a player has for each shot, and on their clock for the whole game (0: no limit)
+time_per_move = 30.0
+time_per_game = 300.0
+# Thresholds of the garbage collector (gc.set_threshold): a full collection scans every object of
+# every game being played (half a second with 10,000 games), so one is only considered every
+# 2000*10*50 objects allocated and not freed, instead of 700*10*10 (CPython then still waits for a
+# quarter of the long-lived objects to be new), while the young generations stay small
+gc_thresholds = (2000, 10, 50)
+# Seconds per tick of the timer wheel of the deadlines (a player runs out of time at most about
+# two ticks late)
+clock_tick = 0.05
+
+class ServerConnection(asyncio.Protocol):
+    '''Connection of one player to the server
+
+    Attributes:
+        server          GameServer instance
+        transport       asyncio transport of the connection
+        buffer          Bytes received after the last complete message (bytearray)
+        player          Player instance once the player has joined (None before)
+        match           engine.Game instance while the player is in a game (None otherwise)
+        opponent        ServerConnection of the other player of the game
+        broadcast       Broadcast instance of the player's game
+        spectator       True once the connection has sent a watch message
+        watching        Broadcast instances of the games a spectator watches
+        behind          True while too many bytes wait to be sent (see pause_writing)
+        stale           Broadcast instances of the games whose keyframe a spectator needs (its
+                        first one, or deltas have been dropped)
+        pending         Encoded messages to send to a spectator at the next flush
+        time_left       Seconds left on the player's clock for the rest of the game
+        turn_started    Time (time.monotonic) at which the player's turn started
+        deadline        Timer of the player's turn (see GameServer.start_clock), None while it is
+                        not their turn
+
+    Methods:
+        send            Sends a message
+        write           Sends an encoded message
+        write_soon      Sends an encoded message together with the others of the same loop iteration
+        flush           Sends the messages of write_soon
+        catch_up        Sends a batch of the keyframes a spectator needs
+        fail            Sends an error and closes the connection
+        close           Closes the connection once the messages sent have been written
+    '''
+    def __init__(self, server):
+        self.server = server
+        self.transport = None
+        self.buffer = bytearray()
+        self.player = None
+        self.match = None
+        self.opponent = None
+        self.broadcast = None
+        self.spectator = False
+        self.watching = set()
+        self.behind = False
+        self.stale = set()
+        self.pending = []
+        self.time_left = None
+        self.turn_started = None
+        self.deadline = None
+    def connection_made(self, transport):
+        self.transport = transport
+        self.server.connections += 1
+    def data_received(self, data):
+        self.buffer += data
+        # Frames are at most wire_protocol.max_frame_size bytes, so the buffer stays small
+        while self.transport is not None:
+            try:
+                messages = split_messages(self.buffer)
+                if not messages:
+                    break
+                for message in messages:
+                    if self.transport is None:
+                        break
+                    self.server.handle(self, message)
+            except (ProtocolError, KeyError, TypeError, ValueError) as error:
+                self.fail(f"invalid message ({error})")
+    def connection_lost(self, exc):
+        self.transport = None
+        self.server.disconnected(self)
+    def pause_writing(self):
+        # Called by asyncio once the bytes waiting to be sent go over the high-water mark
+        self.behind = True
+    def resume_writing(self):
+        # ... and once they are back under the low-water mark: a spectator starts again from the
+        # current state of the games that have moved meanwhile
+        self.behind = False
+        if self.stale:
+            self.catch_up()
+    def send(self, message):
+        self.write(encode_message(message))
+    def write(self, data):
+        # A transport that has failed is closing until connection_lost is called
+        if self.transport is not None and not self.transport.is_closing():
+            self.transport.write(data)
+    def write_soon(self, data):
+        # A spectator of many games gets many deltas per loop iteration: they are sent with a
+        # single system call
+        if not self.pending:
+            asyncio.get_running_loop().call_soon(self.flush)
+        self.pending.append(data)
+    def flush(self):
+        self.write(b''.join(self.pending))
+        self.pending = []
+    def catch_up(self):
+        # A few keyframes at a time, so that a spectator of many games does not hold up the loop;
+        # the rest follow in the next iterations, unless the spectator is behind again
+        for _ in range(min(keyframe_batch, len(self.stale))):
+            broadcast = self.stale.pop()
+            data = broadcast.keyframe()
+            self.write_soon(data)
+            broadcast.keyframes_sent += 1
+            broadcast.bytes_sent += len(data)
+        if self.stale and not self.behind and self.transport is not None:
+            asyncio.get_running_loop().call_soon(self.catch_up)
+    def fail(self, reason):
+        self.send({'type': 'error', 'reason': reason})
+        self.close()
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+            # No more messages are handled; connection_lost follows
+            self.transport = None
+
+class Broadcast():
+    '''The spectators of a game, and the updates sent to them
+
+    Attributes:
+        game_id         Number of the game
+        match           engine.Game instance
+        spectators      ServerConnections watching the game
+        deltas_sent     Deltas written to spectators
+        deltas_dropped  Deltas not sent to spectators that were behind
+        keyframes_sent  Keyframes written to spectators
+        bytes_sent      Bytes of the deltas and keyframes written
+        cached          (turn, encoded keyframe) of the latest keyframe
+
+    Methods:
+        keyframe        Encoded keyframe of the current state
+        subscribe       Adds a spectator, which then gets a keyframe
+        unsubscribe     Removes a spectator
+        publish         Sends a shot to every spectator that keeps up
+        finish          Tells every spectator that the game is over
+    '''
+    def __init__(self, game_id, match):
+        self.game_id = game_id
+        self.match = match
+        self.spectators = set()
+        self.deltas_sent = 0
+        self.deltas_dropped = 0
+        self.keyframes_sent = 0
+        self.bytes_sent = 0
+        self.cached = None
+    def keyframe(self):
+        match = self.match
+        if self.cached is None or self.cached[0] != match.num_of_turns:
+            data = encode_message({'type': 'keyframe', 'game': self.game_id, 'turn': match.num_of_turns,
+                                   'next': match.users.index(match.user_1),
+                                   'names': [user.name for user in match.users],
+                                   'guesses': [user.board.guess_state for user in match.users]})
+            self.cached = (match.num_of_turns, data)
+        return self.cached[1]
+    def subscribe(self, spectator):
+        if spectator in self.spectators:
+            return
+        self.spectators.add(spectator)
+        spectator.watching.add(self)
+        spectator.stale.add(self)
+        # A spectator that is behind gets it once it has caught up
+        if not spectator.behind and len(spectator.stale) == 1:
+            asyncio.get_running_loop().call_soon(spectator.catch_up)
+    def unsubscribe(self, spectator):
+        self.spectators.discard(spectator)
+        spectator.watching.discard(self)
+        spectator.stale.discard(self)
+    def publish(self, shooter, row, col, sunk):
+        ''' Input: user who fired, square, blocks of the ship sunk (None if none was) '''
+        if sunk is None:
+            cells = [(row, col, shooter.board.guess_state[row][col])]
+        else:
+            cells = [(block_row, block_col, 'S') for block_row, block_col in sunk]
+        # Encoded once for every spectator
+        data = encode_message({'type': 'delta', 'game': self.game_id, 'turn': self.match.num_of_turns,
+                               'player': self.match.users.index(shooter), 'cells': cells, 'sunk': sunk})
+        for spectator in self.spectators:
+            # Nothing is sent until the keyframe, which will include this shot
+            if spectator.behind or self in spectator.stale:
+                self.deltas_dropped += 1
+                spectator.stale.add(self)
+            else:
+                spectator.write_soon(data)
+                self.deltas_sent += 1
+                self.bytes_sent += len(data)
+    def finish(self, winner, reason):
+        ''' Input: index in match.users of the winner (NO_WINNER if nobody has won), reason '''
+        data = encode_message({'type': 'finished', 'game': self.game_id, 'winner': winner, 'reason': reason})
+        for spectator in self.spectators:
+            # Sent even to a spectator that is behind: it would otherwise never know
+            spectator.write_soon(data)
+            spectator.watching.discard(self)
+            spectator.stale.discard(self)
+        self.spectators = set()
+
+class GameServer():
+    '''Pairs the players that join and runs their games
+
+    Attributes:
+        rng             random.Random instance drawing who goes first
+        waiting         ServerConnection of the player waiting for an opponent, None if nobody is
+        connections     Number of open connections
+        games           Number of games being played
+        games_finished  Number of games over (sunk fleet or a player who left)
+        moves           Number of shots handled
+        move_seconds    Total time spent handling shots
+        slowest_move    Longest time spent handling a shot
+        broadcasts      {game number: Broadcast instance} of the games being played
+        last_game_id    Number of the latest game
+        spectators      Number of connections watching games
+        deltas_sent     Deltas written to spectators
+        deltas_dropped  Deltas not sent to spectators that were behind
+        keyframes_sent  Keyframes written to spectators
+        broadcast_bytes Bytes written to spectators
+        time_per_move   Seconds a player has for each shot (0: no limit)
+        time_per_game   Seconds a player has for all their shots of a game (0: no limit)
+        timers          TimerWheel instance holding the deadline of every player whose turn it is
+        ticker          asyncio TimerHandle of the next tick of the wheel, None while no deadline
+                        is pending
+        timeouts        Number of games lost on time
+        latest_timeout  Most seconds by which a player ran out of time after their deadline
+
+    Methods:
+        serve           Accepts connections until stopped
+        handle          Handles a message of a connection
+        join            Pairs a player with the one waiting, or makes them wait
+        watch           Adds a game to the ones a spectator watches
+        shot            Resolves a shot and sends its outcome to both players
+        start_clock     Starts the turn of a player, with its deadline
+        stop_clock      Ends the turn of a player, taking its time off their clock
+        out_of_time     Ends the game of a player who has run out of time
+        tick            Expires the deadlines that are due
+        end_game        Tells both players that their game is over and closes their connections
+        disconnected    Forgets a closed connection; its opponent wins
+        report          Text summary of the counts
+    '''
+    def __init__(self, rng=None, time_per_move=time_per_move, time_per_game=time_per_game):
+        self.rng = rng or random.Random()
+        self.waiting = None
+        self.connections = 0
+        self.games = 0
+        self.games_finished = 0
+        self.moves = 0
+        self.move_seconds = 0.0
+        self.slowest_move = 0.0
+        self.broadcasts = {}
+        self.last_game_id = 0
+        self.spectators = 0
+        self.deltas_sent = 0
+        self.deltas_dropped = 0
+        self.keyframes_sent = 0
+        self.broadcast_bytes = 0
+        self.time_per_move = time_per_move
+        self.time_per_game = time_per_game
+        self.timers = TimerWheel(clock_tick)
+        self.ticker = None
+        self.timeouts = 0
+        self.latest_timeout = 0.0
+    async def serve(self, address='', port=default_port, ready=None, stop=None):
+        ''' Accept connections until the stop event is set
+
+        Input: address to listen on ('' for every interface), port, function called with the
+               (address, port) listened on once the server is ready, asyncio.Event that stops it
+               (default: run forever)
+
+        Output: None
+        '''
+        loop = asyncio.get_running_loop()
+        # Many clients connect at once when a load test starts
+        server = await loop.create_server(lambda: ServerConnection(self), address or None, port, backlog=4096)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[:2])
+        stop = stop or asyncio.Event()
+        async with server:
+            await stop.wait()
+    def handle(self, connection, message):
+        kind = message['type']
+        if kind == 'shot':
+            self.shot(connection, int(message['row']), int(message['col']))
+        elif kind == 'join':
+            self.join(connection, message)
+        elif kind == 'watch':
+            self.watch(connection, int(message['game']))
+        else:
+            raise ProtocolError(f"unknown message type {kind!r}")
+    def join(self, connection, message):
+        if connection.player is not None or connection.spectator:
+            raise ProtocolError("second join, or join of a spectator")
+        if message['version'] != protocol_version:
+            raise ProtocolError(f"version {message['version']} instead of {protocol_version}")
+        fleet = [[(int(row), int(col)) for row, col in ship] for ship in message['fleet']]
+        if not legal_fleet(fleet):
+            raise ProtocolError("the fleet breaks the placement rules")
+        connection.player = Player(str(message['name'])[:max_name_length])
+        connection.player.board = fleet_board(fleet)
+        connection.player.placing_ships = False
+
+        opponent = self.waiting
+        if opponent is None or opponent.transport is None:
+            self.waiting = connection
+            return
+        self.waiting = None
+        match = Game([opponent.player, connection.player], rng=self.rng)
+        self.last_game_id += 1
+        broadcast = Broadcast(self.last_game_id, match)
+        self.broadcasts[broadcast.game_id] = broadcast
+        for player_connection, other in ((opponent, connection), (connection, opponent)):
+            player_connection.match = match
+            player_connection.opponent = other
+            player_connection.broadcast = broadcast
+            player_connection.time_left = self.time_per_game or None
+            player_connection.send({'type': 'start', 'opponent': other.player.name,
+                                    'first': match.user_1 is player_connection.player})
+        self.start_clock(opponent if match.user_1 is opponent.player else connection)
+        self.games += 1
+    def watch(self, connection, game_id):
+        if connection.player is not None:
+            raise ProtocolError("a player cannot watch games")
+        if not connection.spectator:
+            connection.spectator = True
+            self.spectators += 1
+            # A spectator may only take so much memory, in the kernel and in asyncio's buffer
+            sock = connection.transport.get_extra_info('socket')
+            if sock is not None:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, spectator_buffer_size)
+            connection.transport.set_write_buffer_limits(high=spectator_buffer_size)
+        broadcast = self.broadcasts.get(game_id or self.last_game_id)
+        if broadcast is None:
+            connection.send({'type': 'finished', 'game': game_id, 'winner': NO_WINNER, 'reason': "no such game being played"})
+        else:
+            broadcast.subscribe(connection)
+    def shot(self, connection, row, col):
+        start = perf_counter()
+        match = connection.match
+        if match is None or match.user_1 is not connection.player:
+            raise ProtocolError("shot out of turn")
+        if not (0 <= row < 10 and 0 <= col < 10):
+            raise ProtocolError(f"shot out of the board at {row}, {col}")
+        if not match.fire(row, col):
+            raise ProtocolError(f"square {row}, {col} fired upon twice")
+        # A shot received before the deadline has expired is on time
+        self.stop_clock(connection)
+        outcome = connection.player.board.guess_state[row][col]
+        result = {'type': 'result', 'row': row, 'col': col, 'outcome': outcome}
+        sunk = None
+        if outcome == 'S':
+            board = connection.opponent.player.board
+            sunk = result['ship'] = board.placed_ships[board.ship_at[row][col]].locations
+        connection.send(result)
+        connection.opponent.send({'type': 'shot', 'row': row, 'col': col, 'outcome': outcome})
+        if connection.broadcast.spectators:
+            connection.broadcast.publish(connection.player, row, col, sunk)
+        if match.finished:
+            self.end_game(connection, connection.opponent, "the whole fleet has been sunk")
+        else:
+            self.start_clock(connection.opponent)
+        self.moves += 1
+        elapsed = perf_counter() - start
+        self.move_seconds += elapsed
+        self.slowest_move = max(self.slowest_move, elapsed)
+    def end_game(self, winner, loser, reason):
+        ''' Input: connections of the winner and of the loser, why the game is over '''
+        broadcast = self.broadcasts.pop(winner.broadcast.game_id)
+        broadcast.finish(broadcast.match.users.index(winner.player), reason)
+        self.deltas_sent += broadcast.deltas_sent
+        self.deltas_dropped += broadcast.deltas_dropped
+        self.keyframes_sent += broadcast.keyframes_sent
+        self.broadcast_bytes += broadcast.bytes_sent
+        for player_connection in (winner, loser):
+            self.stop_clock(player_connection)
+            player_connection.broadcast = None
+            player_connection.send({'type': 'end', 'won': player_connection is winner, 'reason': reason})
+            player_connection.match = None
+            # No reference cycle is left, so the game is freed by reference counting alone (see
+            # settle_gc)
+            player_connection.opponent = None
+            player_connection.close()
+        self.games -= 1
+        self.games_finished += 1
+    def start_clock(self, connection):
+        ''' Start the turn of a player: they lose if they have not fired before its deadline,
+        the end of their time for the move or for the game, whichever comes first '''
+        limits = [limit for limit in (self.time_per_move or None, connection.time_left) if limit is not None]
+        if not limits:
+            return
+        connection.turn_started = monotonic()
+        connection.deadline = self.timers.schedule(min(limits), self.out_of_time, connection)
+        if self.ticker is None:
+            self.ticker = asyncio.get_running_loop().call_later(clock_tick, self.tick)
+    def stop_clock(self, connection):
+        if connection.deadline is None:
+            return
+        self.timers.cancel(connection.deadline)
+        connection.deadline = None
+        if connection.time_left is not None:
+            connection.time_left = max(connection.time_left - (monotonic() - connection.turn_started), 0.0)
+    def out_of_time(self, connection):
+        ''' Callback of a deadline that has expired '''
+        self.timeouts += 1
+        self.latest_timeout = max(self.latest_timeout, monotonic() - connection.deadline.when)
+        connection.deadline = None
+        if connection.time_left is not None:
+            connection.time_left = 0.0
+        self.end_game(connection.opponent, connection, f"{connection.player.name} ran out of time")
+    def tick(self):
+        ''' Expire the deadlines that are due; ticks again while some are pending '''
+        self.timers.advance()
+        self.ticker = None
+        if self.timers.pending:
+            self.ticker = asyncio.get_running_loop().call_later(clock_tick, self.tick)
+    def disconnected(self, connection):
+        self.connections -= 1
+        if self.waiting is connection:
+            self.waiting = None
+        if connection.spectator:
+            self.spectators -= 1
+            for broadcast in list(connection.watching):
+                broadcast.unsubscribe(connection)
+        # The other player wins the game
+        if connection.match is not None:
+            connection.match = None
+            self.end_game(connection.opponent, connection, f"{connection.player.name} left the game")
+    def report(self):
+        mean = self.move_seconds / self.moves if self.moves else 0.0
+        text = (f"{self.connections} connections, {self.games} games being played, {self.games_finished} "
+                f"finished, {self.moves} moves (handled in {mean*1e6:.0f} us on average, {self.slowest_move*1e3:.2f} ms at most)"
+                f", {self.timers.pending} deadlines pending, {self.timeouts} games lost on time")
+        if self.timeouts:
+            text += f" (at most {self.latest_timeout*1e3:.0f} ms after the deadline)"
+        # Games still being played count too
+        broadcasts = self.broadcasts.values()
+        deltas_sent = self.deltas_sent + sum(broadcast.deltas_sent for broadcast in broadcasts)
+        if self.spectators or deltas_sent:
+            dropped = self.deltas_dropped + sum(broadcast.deltas_dropped for broadcast in broadcasts)
+            keyframes = self.keyframes_sent + sum(broadcast.keyframes_sent for broadcast in broadcasts)
+            sent = self.broadcast_bytes + sum(broadcast.bytes_sent for broadcast in broadcasts)
+            text += (f"; {self.spectators} spectators, {deltas_sent} deltas sent and {dropped} dropped, "
+                     f"{keyframes} keyframes, {sent} bytes broadcast")
+        return text
+
+# FUNCTIONS
+
+def settle_gc():
+    ''' Set up the garbage collector of a process holding many games, once it has imported its
+    modules and built its long-lived objects: they are moved out of the collector's way for good
+    (gc.freeze), and full collections are made rare (gc_thresholds). Finished games leave no
+    reference cycles (see GameServer.end_game), so they are freed as soon as they are over; only
+    asyncio's closed transports (a small cycle each) wait for a full collection.
+    '''
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(*gc_thresholds)
+
+def run_server(address='', port=default_port, ready=None, time_per_move=time_per_move, time_per_game=time_per_game):
+    ''' Run a server until SIGINT or SIGTERM, then print its counts
+
+    Input: address, port, function called with the (address, port) listened on, seconds a
+           player has for each shot and for the whole game (0: no limit)
+
+    Output: GameServer instance
+    '''
+    server = GameServer(time_per_move=time_per_move, time_per_game=time_per_game)
+    settle_gc()
+    async def main():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signal_num in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(signal_num, stop.set)
+        await server.serve(address, port, ready, stop)
+    asyncio.run(main())
+    print(server.report(), flush=True)
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the game server of the online mode")
+    parser.add_argument('--address', default='', help="address to listen on (default: every interface)")
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--time-per-move', type=float, default=time_per_move, help="seconds a player has for each shot (0: no limit)")
+    parser.add_argument('--time-per-game', type=float, default=time_per_game, help="seconds a player has for the whole game (0: no limit)")
+    args = parser.parse_args()
+    run_server(args.address, args.port, lambda address: print(f"Listening on {address[0]}:{address[1]}", flush=True),
+               args.time_per_move, args.time_per_game)
@@ -0,0 +1,462 @@
+'''
+Contains the LanConnection and LanMatch classes: a game between two players on different computers
+of the same network. One of them hosts (listens on a TCP port) and the other one joins.
+
+The connection runs an asyncio event loop in a background thread, and the messages it receives
+wait in a queue until the frame loop picks them up, so the window never blocks on a socket (and a
+peer that disconnects only ends the game). Messages are dictionaries, sent as the compact binary
+frames of wire_protocol (a shot takes one byte, its result two).
+
+Each player resolves the shots fired at their own fleet, with the same rules as the engine
+(shot_outcome), and answers with the outcome. So that nobody can move their ships during the game,
+both players commit to their fleet before the first shot (they send a SHA-256 digest of the fleet
+and a random nonce), and reveal both once the game is over; every answer given during the game is
+then checked against the revealed fleet.
+
+Messages:
+    hello       {'type': 'hello', 'version', 'name', 'commitment'}: sent by both players once
+                their ships are placed
+    start       {'type': 'start', 'first'}: sent by the host once both hellos have been exchanged;
+                first is True if the player who joined fires first
+    shot        {'type': 'shot', 'row', 'col'}: sent by the player whose turn it is
+    result      {'type': 'result', 'row', 'col', 'outcome' ('M', 'X' or 'S'), 'ship' (blocks of
+                the sunk ship, only for 'S')}: the answer to a shot
+    reveal      {'type': 'reveal', 'fleet', 'nonce'}: sent by both players once the game is over
+'''
+
+import asyncio
+import hashlib
+import queue
+import random
+import secrets
+import socket
+import threading
+from time import perf_counter
+
+from engine import GameResult, shot_outcome, swap_users
+from player_class import Player
+from wire_protocol import encode_fleet, encode_message, protocol_version, split_messages
+
+# TCP port of the hosted games
+default_port = 40404
+# Seconds a player waits for the host to accept the connection
+connect_timeout = 5.0
+# Seconds between two checks of the connection while the frame loop waits for the peer, and while
+# it waits for the local player (when only a disconnection can arrive)
+poll_interval = 0.01
+idle_poll_interval = 0.5
+
+# States of a connection
+CONNECTING = 'connecting'   # Listening for the peer, or connecting to the host
+CONNECTED = 'connected'
+CLOSED = 'closed'           # Closed by either side, or never established (see error)
+
+class ProtocolError(Exception):
+    '''Raised when the peer sends a message that breaks the protocol or the rules'''
+
+class LanConnection():
+    '''TCP connection to the other player, run by an asyncio event loop in a background thread
+
+    Attributes:
+        state           CONNECTING, CONNECTED or CLOSED
+        error           Why the connection was closed (None if it was closed by this side)
+        address         (address, port) listened on, or connected to
+        incoming        Queue of the messages received, read by receive
+        loop            asyncio event loop of the background thread
+
+    Methods:
+        host            Listens for the other player
+        join            Connects to the host
+        send            Sends a message (does not wait for it to be written)
+        receive         Messages received since the previous call
+        close           Closes the connection and stops the background thread
+    '''
+    def __init__(self):
+        self.state = CONNECTING
+        self.error = None
+        self.address = None
+        self.incoming = queue.Queue()
+        self.server = None
+        self.writer = None
+        self.task = None
+        # Messages sent before the connection was established
+        self.unsent = []
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="lan connection", daemon=True)
+        self.thread.start()
+    def host(self, port=default_port, address=''):
+        ''' Listen for the other player; the first one to connect is accepted
+
+        Input: port (0 for any free port), address to listen on ('' for every interface)
+
+        Output: (address, port) listened on; raises OSError if the port cannot be used
+        '''
+        asyncio.run_coroutine_threadsafe(self._listen(address, port), self.loop).result()
+        return self.address
+    def join(self, address, port=default_port, timeout=connect_timeout):
+        ''' Connect to the host in the background; state becomes CONNECTED, or CLOSED with an
+        error if the host cannot be reached within the timeout
+
+        Input: address of the host, port, seconds to wait for the host
+
+        Output: None
+        '''
+        self.address = (address, port)
+        asyncio.run_coroutine_threadsafe(self._connect(address, port, timeout), self.loop)
+    def send(self, message):
+        ''' Input: message (dictionary) '''
+        self.loop.call_soon_threadsafe(self._write, encode_message(message))
+    def receive(self, timeout=0):
+        ''' Messages received since the previous call
+
+        Input: seconds to wait for the first message (0: do not wait)
+
+        Output: list of messages
+        '''
+        messages = []
+        try:
+            messages.append(self.incoming.get(timeout=timeout) if timeout else self.incoming.get_nowait())
+            while True:
+                messages.append(self.incoming.get_nowait())
+        except queue.Empty:
+            pass
+        # None only wakes up a receive waiting for a connection that has been closed
+        return [message for message in messages if message is not None]
+    def close(self):
+        # Closed by this side: no error to report
+        self.set_closed(None)
+        if self.thread.is_alive():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result()
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+    async def _listen(self, address, port):
+        self.server = await asyncio.start_server(self._accept, address or None, port)
+        self.address = self.server.sockets[0].getsockname()[:2]
+    async def _accept(self, reader, writer):
+        # Only one player can join a game
+        if self.writer is not None or self.state == CLOSED:
+            writer.close()
+            return
+        self.task = asyncio.current_task()
+        self.server.close()
+        await self._run(reader, writer)
+    async def _connect(self, address, port, timeout):
+        self.task = asyncio.current_task()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(address, port), timeout)
+        except (OSError, asyncio.TimeoutError) as error:
+            self.set_closed(f"could not connect to {address}:{port} ({error or 'timed out'})")
+            return
+        await self._run(reader, writer)
+    async def _run(self, reader, writer):
+        ''' Read the peer's messages until the connection is closed '''
+        if self.state == CLOSED:
+            writer.close()
+            return
+        self.writer = writer
+        self.state = CONNECTED
+        for data in self.unsent:
+            writer.write(data)
+        self.unsent = []
+        error = "the other player left the game"
+        buffer = bytearray()
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                buffer += data
+                messages = split_messages(buffer)
+                while messages:
+                    for message in messages:
+                        self.incoming.put(message)
+                    messages = split_messages(buffer)
+        except (ConnectionError, ValueError) as reason:
+            error = f"connection lost ({reason})"
+        finally:
+            writer.close()
+            self.set_closed(error)
+    async def _shutdown(self):
+        if self.server is not None:
+            self.server.close()
+        if self.task is None or self.task.done():
+            return
+        if self.writer is None:
+            # Still connecting
+            self.task.cancel()
+        else:
+            # The reading task sees the end of the stream and returns
+            self.writer.close()
+        await asyncio.wait({self.task}, timeout=connect_timeout)
+    def _write(self, data):
+        if self.writer is None:
+            self.unsent.append(data)
+        elif not self.writer.is_closing():
+            self.writer.write(data)
+    def set_closed(self, error):
+        # The first reason given is the one reported
+        if self.state != CLOSED:
+            self.error = error
+            self.state = CLOSED
+            self.incoming.put(None)
+
+class LanMatch():
+    '''A LAN game seen from one of the players; the frame loop calls update every frame
+
+    Attributes:
+        connection      LanConnection instance (connected)
+        player          Local Player instance, with its ships placed
+        peer            Player instance standing for the other player: its board's guess_state
+                        holds their shots at the local fleet (None until their hello arrives)
+        host            True if the local player hosts the game
+        users           [first player, second player] once the game has started, else None
+        user_1          User whose turn it is
+        user_2          User waiting for their turn
+        num_of_turns    Number of valid shots fired by both players
+        pending_shot    (row, col) of the local player's shot waiting for its result, or None
+        latencies       Seconds from sending each shot to receiving its result
+        result          GameResult instance once the game has finished, None before that
+        error           Why the game ended before finishing (e.g. the peer left), None otherwise
+        verified        Once the game is over: True if the peer's revealed fleet matches their
+                        commitment and every answer they gave, False if not (None until then)
+
+    Methods:
+        start           Sends the local player's hello
+        fire            Sends a shot of the local player
+        update          Handles the messages received since the previous call
+        close           Closes the connection
+    '''
+    def __init__(self, connection, player, host, rng=None):
+        self.connection = connection
+        self.player = player
+        self.peer = None
+        self.host = host
+        # Who goes first is drawn by the host
+        self.rng = rng or random.Random()
+        self.users = None
+        self.user_1 = None
+        self.user_2 = None
+        self.num_of_turns = 0
+        self.pending_shot = None
+        self.shot_sent = None
+        self.latencies = []
+        self.result = None
+        self.error = None
+        self.verified = None
+        self.fleet = fleet_blocks(player.board)
+        self.nonce = secrets.token_hex(16)
+        self.peer_commitment = None
+        # Results of the local player's shots: (row, col, outcome, sunk ship blocks or None)
+        self.answers = []
+        self.enemy_sunk = 0
+    @property
+    def started(self):
+        return self.users is not None
+    @property
+    def finished(self):
+        return self.result is not None
+    @property
+    def my_turn(self):
+        ''' True if the local player can fire now '''
+        return (self.started and not self.finished and self.error is None
+                and self.user_1 is self.player and self.pending_shot is None)
+    def start(self):
+        self.connection.send({'type': 'hello', 'version': protocol_version, 'name': self.player.name,
+                              'commitment': fleet_commitment(self.fleet, self.nonce)})
+    def fire(self, row, col):
+        ''' The local player fires at the given square; ignored unless it is their turn
+
+        Input: row, col
+
+        Output: True if the shot was sent
+        '''
+        if not self.my_turn or self.player.board.guess_state[row][col] != ' ':
+            return False
+        self.pending_shot = (row, col)
+        self.shot_sent = perf_counter()
+        self.connection.send({'type': 'shot', 'row': row, 'col': col})
+        return True
+    def update(self, timeout=0):
+        ''' Handle the messages received since the previous call
+
+        Input: seconds to wait for the first message (0: do not wait)
+
+        Output: None
+        '''
+        # Checked before reading, so that every message sent before the connection was closed
+        # is handled first
+        closed = self.connection.state == CLOSED
+        for message in self.connection.receive(timeout):
+            try:
+                self.handle(message)
+            except (ProtocolError, KeyError, TypeError, ValueError) as error:
+                self.error = f"invalid message from the other player ({error})"
+                self.connection.close()
+                return
+        if closed and not self.finished and self.error is None:
+            self.error = self.connection.error or "the connection was closed"
+    def handle(self, message):
+        ''' Apply a message of the peer; raises ProtocolError if it is not allowed now '''
+        kind = message['type']
+        if kind == 'hello':
+            if self.peer is not None:
+                raise ProtocolError("second hello")
+            if message['version'] != protocol_version:
+                raise ProtocolError(f"version {message['version']} instead of {protocol_version}")
+            self.peer = Player(str(message['name']))
+            self.peer_commitment = str(message['commitment'])
+            if self.host:
+                first = self.rng.choice(('host', 'join'))
+                self.connection.send({'type': 'start', 'first': first == 'join'})
+                self.begin(first == 'host')
+        elif kind == 'start':
+            if self.host or self.peer is None or self.started:
+                raise ProtocolError("unexpected start")
+            self.begin(bool(message['first']))
+        elif kind == 'shot':
+            self.resolve_shot(int(message['row']), int(message['col']))
+        elif kind == 'result':
+            self.apply_result(message)
+        elif kind == 'reveal':
+            if not self.finished or self.verified is not None:
+                raise ProtocolError("unexpected reveal")
+            self.verified = check_reveal(message['fleet'], str(message['nonce']), self.peer_commitment, self.answers)
+        else:
+            raise ProtocolError(f"unknown message type {kind!r}")
+    def begin(self, local_first):
+        self.users = [self.player, self.peer] if local_first else [self.peer, self.player]
+        self.user_1, self.user_2 = self.users
+    def resolve_shot(self, row, col):
+        ''' The peer fires at the local fleet: resolved as in the engine, and answered '''
+        if not self.started or self.finished or self.user_1 is not self.peer:
+            raise ProtocolError("shot out of turn")
+        if not (0 <= row < 10 and 0 <= col < 10):
+            raise ProtocolError(f"shot out of the board at {row}, {col}")
+        if not shot_outcome(self.peer, self.player, row, col):
+            raise ProtocolError(f"square {row}, {col} fired upon twice")
+        outcome = self.peer.board.guess_state[row][col]
+        answer = {'type': 'result', 'row': row, 'col': col, 'outcome': outcome}
+        if outcome == 'S':
+            board = self.player.board
+            answer['ship'] = [list(block) for block in board.placed_ships[board.ship_at[row][col]].locations]
+        self.connection.send(answer)
+        self.end_turn(len(self.player.board.sunk_ships) == len(self.player.board.placed_ships))
+    def apply_result(self, message):
+        ''' The answer to the local player's pending shot '''
+        row, col, outcome = int(message['row']), int(message['col']), message['outcome']
+        if self.pending_shot != (row, col):
+            raise ProtocolError(f"result of a shot that was not fired at {row}, {col}")
+        if outcome not in ('M', 'X', 'S'):
+            raise ProtocolError(f"unknown outcome {outcome!r}")
+        self.latencies.append(perf_counter() - self.shot_sent)
+        self.pending_shot = None
+        self.player.num_of_tries += 1
+        ship = None
+        if outcome == 'S':
+            ship = [(int(block_row), int(block_col)) for block_row, block_col in message['ship']]
+            if (row, col) not in ship or not all(0 <= r < 10 and 0 <= c < 10 for r, c in ship):
+                raise ProtocolError("sunk ship that does not contain the shot")
+            for block_row, block_col in ship:
+                self.player.board.set_guess(block_row, block_col, 'S')
+            self.enemy_sunk += 1
+        else:
+            self.player.board.set_guess(row, col, outcome)
+        self.answers.append((row, col, outcome, ship))
+        self.end_turn(self.enemy_sunk == len(Player.ship_lengths))
+    def end_turn(self, fleet_sunk):
+        ''' Every valid shot passes the turn, unless it sank the whole fleet '''
+        self.num_of_turns += 1
+        if fleet_sunk:
+            self.result = GameResult(self.user_1, self.user_2, self.users[0], self.num_of_turns)
+            self.connection.send({'type': 'reveal', 'fleet': self.fleet, 'nonce': self.nonce})
+        else:
+            self.user_1, self.user_2 = swap_users(self.user_1, self.user_2)
+    def close(self):
+        self.connection.close()
+
+# FUNCTIONS
+
+def fleet_blocks(board):
+    ''' Blocks of every ship placed on a board, in a canonical order
+
+    Input: BoardState instance
+
+    Output: list of ships, each a sorted list of [row, col]
+    '''
+    return sorted(sorted([row, col] for row, col in ship.locations) for ship in board.placed_ships)
+
+def fleet_commitment(fleet, nonce):
+    ''' Output: SHA-256 digest (hex) of a fleet (see fleet_blocks) and a nonce (hex), as encoded
+    by wire_protocol '''
+    return hashlib.sha256(encode_fleet(fleet) + bytes.fromhex(nonce)).hexdigest()
+
+def legal_fleet(fleet, ship_lengths=Player.ship_lengths):
+    ''' Checks that a fleet follows the rules: the right ships, each one straight, on the board and
+    not touching any other (not even diagonally)
+
+    Input: list of ships, each a list of [row, col]
+
+    Output: boolean
+    '''
+    if sorted(len(ship) for ship in fleet) != sorted(ship_lengths):
+        return False
+    owner = {}
+    for ship_num, ship in enumerate(fleet):
+        blocks = sorted((row, col) for row, col in ship)
+        rows = {row for row, _ in blocks}
+        cols = {col for _, col in blocks}
+        straight = ((len(rows) == 1 and max(cols) - min(cols) == len(blocks) - 1) or
+                    (len(cols) == 1 and max(rows) - min(rows) == len(blocks) - 1))
+        if not straight or not all(0 <= row < 10 and 0 <= col < 10 for row, col in blocks):
+            return False
+        for block in blocks:
+            owner[block] = ship_num
+    for (row, col), ship_num in owner.items():
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                if owner.get((row + d_row, col + d_col), ship_num) != ship_num:
+                    return False
+    return len(owner) == sum(ship_lengths)
+
+def check_reveal(fleet, nonce, commitment, answers):
+    ''' Checks a fleet revealed at the end of a game against its commitment and the answers given
+    during the game
+
+    Input: revealed fleet, nonce, commitment sent in the hello, list of (row, col, outcome, sunk
+           ship blocks) of the shots fired at that fleet
+
+    Output: True if everything matches
+    '''
+    fleet = sorted(sorted([int(row), int(col)] for row, col in ship) for ship in fleet)
+    if fleet_commitment(fleet, nonce) != commitment or not legal_fleet(fleet):
+        return False
+    ship_of = {(row, col): ship_num for ship_num, ship in enumerate(fleet) for row, col in ship}
+    fired = set()
+    for row, col, outcome, ship in answers:
+        fired.add((row, col))
+        ship_num = ship_of.get((row, col))
+        if (outcome == 'M') != (ship_num is None):
+            return False
+        if ship_num is not None:
+            blocks = {(block_row, block_col) for block_row, block_col in fleet[ship_num]}
+            # A ship is sunk by the shot that hits its last block, and only then
+            if (outcome == 'S') != (blocks <= fired):
+                return False
+            if outcome == 'S' and set(ship) != blocks:
+                return False
+    return True
+
+def local_address():
+    ''' Address of this computer in the LAN, to tell the other player (no packet is sent)
+
+    Output: IP address string
+    '''
+    probe = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        probe.connect(('10.255.255.255', 1))
+        return probe.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+    finally:
+        probe.close()
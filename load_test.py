@@ -0,0 +1,512 @@
+'''
+Load test of the game server (game_server.py): simulated players keep many games going at once
+against a server started in a child process (or an already running one), and the move latency is
+measured from sending a shot to receiving its result.
+
+Every simulated player fires at random squares after a random think time (uniform between zero
+and twice the mean), so the server sees a steady flow of moves, and a game that ends is replaced
+by a new one. The players are spread over a few processes, since every process can only hold so
+many sockets. Latencies are only counted once every game has started.
+
+Spectators can watch the games meanwhile (from another process): each one watches a number of
+random games, and a new one whenever a game it watches is over. Slow spectators only read for a
+moment every few seconds, so that the server has to drop their deltas; a game rebuilt from deltas
+is checked against the keyframe that follows such a gap.
+
+A share of the players can stall: they stop firing at some point of their game, and the server
+has to end it once their time for the move is over (see game_server.time_per_move). How long after
+their turn started they learn that they have lost is measured.
+
+Usage:
+    python load_test.py --games 10000 --duration 30 --think-time 3
+    python load_test.py --games 5000 --spectators 100 --slow-spectators 20 --watched 200
+    python load_test.py --games 5000 --stalling 0.1 --time-per-move 2
+'''
+
+import argparse
+import asyncio
+import os
+import random
+import socket
+from math import ceil
+from multiprocessing import Event, Process, Queue
+from time import perf_counter
+
+from fleet_placement import fleet_ships, uniform_fleets
+from game_server import default_port, run_server, settle_gc, time_per_game, time_per_move
+from online_class import SpectatedGame
+from wire_protocol import encode_message, protocol_version, split_messages
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Target of the online mode: 99% of the moves answered within this many seconds
+target_p99 = 0.005
+# Sockets of every process kept for other uses (listening socket, pipes, ...)
+reserved_files = 64
+# Connections opened at the same time while the games start
+connect_batch = 500
+# A slow spectator reads for read_seconds every pause_seconds, with a small socket buffer
+slow_read_seconds = 0.2
+slow_pause_seconds = 8.0
+slow_receive_buffer = 4096
+
+class SimulatedPlayer(asyncio.Protocol):
+    '''A client of the server that joins with a random fleet and fires at random squares
+
+    Attributes:
+        client          LoadClient instance of the process
+        fleet           Ships of the player, each a list of [row, col]
+        squares         Squares not fired at yet, in the order they will be
+        transport       asyncio transport of the connection
+        buffer          Bytes received after the last complete message (bytearray)
+        timer           Pending shot (asyncio TimerHandle), None if there is none
+        sent            Time at which the pending shot was sent
+        stall_after     Shots after which the player stops firing (None: it never stalls)
+        stalled         Time at which the player stalled, None until then
+    '''
+    def __init__(self, client, fleet):
+        self.client = client
+        self.fleet = fleet
+        self.squares = [(row, col) for row in range(10) for col in range(10)]
+        random.shuffle(self.squares)
+        self.transport = None
+        self.buffer = bytearray()
+        self.timer = None
+        self.sent = None
+        self.stall_after = random.randrange(50) if random.random() < client.stalling else None
+        self.stalled = None
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(encode_message({'type': 'join', 'version': protocol_version, 'name': 'load test',
+                                        'fleet': self.fleet}))
+    def data_received(self, data):
+        self.buffer += data
+        for message in split_messages(self.buffer):
+            self.handle(message)
+    def handle(self, message):
+        kind = message['type']
+        if kind == 'start':
+            self.client.games_started += 1
+            if message['first']:
+                self.think()
+        elif kind == 'shot':
+            # The opponent has fired: our turn
+            self.think()
+        elif kind == 'result':
+            self.client.moved(perf_counter() - self.sent)
+        elif kind == 'end':
+            if self.stalled is not None:
+                self.client.timed_out(perf_counter() - self.stalled, message['won'])
+            self.client.ended(self)
+        elif kind == 'error':
+            self.client.errors += 1
+    def think(self):
+        if self.stall_after is not None and 100 - len(self.squares) >= self.stall_after:
+            self.stalled = perf_counter()
+            return
+        delay = random.uniform(0, 2*self.client.think_time)
+        self.timer = asyncio.get_running_loop().call_later(delay, self.fire)
+    def fire(self):
+        self.timer = None
+        if self.transport is None or self.transport.is_closing():
+            return
+        row, col = self.squares.pop()
+        self.sent = perf_counter()
+        self.transport.write(encode_message({'type': 'shot', 'row': row, 'col': col}))
+    def connection_lost(self, exc):
+        self.transport = None
+        if self.timer is not None:
+            self.timer.cancel()
+        self.client.connections -= 1
+
+class SimulatedSpectator(asyncio.Protocol):
+    '''A spectator of the server that watches random games and rebuilds them
+
+    Attributes:
+        client          SpectatorClient instance of the process
+        game_ids        Numbers of the games to watch first
+        slow            True if it only reads from time to time
+        transport       asyncio transport of the connection
+        buffer          Bytes received after the last complete message (bytearray)
+        games           {game number: SpectatedGame instance}
+    '''
+    def __init__(self, client, game_ids, slow):
+        self.client = client
+        self.game_ids = game_ids
+        self.slow = slow
+        self.transport = None
+        self.buffer = bytearray()
+        self.games = {}
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(b''.join(encode_message({'type': 'watch', 'game': game_id}) for game_id in self.game_ids))
+        if self.slow:
+            self.pause()
+    def pause(self):
+        if self.transport is None:
+            return
+        self.transport.pause_reading()
+        asyncio.get_running_loop().call_later(slow_pause_seconds, self.resume)
+    def resume(self):
+        if self.transport is None:
+            return
+        self.transport.resume_reading()
+        asyncio.get_running_loop().call_later(slow_read_seconds, self.pause)
+    def data_received(self, data):
+        client = self.client
+        client.bytes_received += len(data)
+        self.buffer += data
+        for message in split_messages(self.buffer):
+            game = self.games.get(message['game'])
+            if game is None:
+                game = self.games[message['game']] = SpectatedGame(message['game'])
+            kind = message['type']
+            if kind == 'keyframe':
+                client.keyframes += 1
+                client.keyframe_bytes += len(encode_message(message))
+                if game.synced:
+                    # Deltas were dropped: what has been rebuilt so far must agree with the keyframe
+                    client.catch_ups += 1
+                    if message['turn'] < game.turn or not all(
+                            old == new or (old == 'X' and new == 'S')
+                            for old_grid, new_grid in zip(game.guesses, message['guesses'])
+                            for old_row, new_row in zip(old_grid, new_grid)
+                            for old, new in zip(old_row, new_row) if old != ' '):
+                        client.mismatches += 1
+            gaps = game.gaps
+            if game.apply(message) and kind == 'delta':
+                client.deltas += 1
+            client.gaps += game.gaps - gaps
+            if kind == 'finished':
+                del self.games[message['game']]
+                client.finished += 1
+                # Watch the latest game instead
+                self.transport.write(encode_message({'type': 'watch', 'game': 0}))
+    def connection_lost(self, exc):
+        self.transport = None
+
+class SpectatorClient():
+    '''The simulated spectators of one process
+
+    Attributes:
+        address         (address, port) of the server
+        bytes_received  Bytes received by every spectator
+        keyframes       Keyframes received
+        keyframe_bytes  Bytes of the keyframes received
+        deltas          Deltas applied
+        catch_ups       Keyframes of games already watched, after the server dropped deltas
+        gaps            Deltas that did not follow the previous one (the server sends a keyframe
+                        instead, so there should be none)
+        mismatches      Keyframes that did not agree with the state rebuilt from the deltas
+        finished        Watched games that finished
+    '''
+    def __init__(self, address):
+        self.address = address
+        self.bytes_received = 0
+        self.keyframes = 0
+        self.keyframe_bytes = 0
+        self.deltas = 0
+        self.catch_ups = 0
+        self.gaps = 0
+        self.mismatches = 0
+        self.finished = 0
+    async def connect(self, game_ids, slow):
+        loop = asyncio.get_running_loop()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        if slow:
+            # A small buffer, as on a slow link, so that the server soon has to hold the bytes
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, slow_receive_buffer)
+        sock.setblocking(False)
+        await loop.sock_connect(sock, self.address)
+        await loop.create_connection(lambda: SimulatedSpectator(self, game_ids, slow), sock=sock)
+    def counts(self):
+        return {'bytes': self.bytes_received, 'keyframes': self.keyframes, 'keyframe_bytes': self.keyframe_bytes,
+                'deltas': self.deltas, 'catch_ups': self.catch_ups, 'gaps': self.gaps, 'mismatches': self.mismatches, 'finished': self.finished}
+    async def run(self, spectators, slow_spectators, watched, games, duration, results):
+        ''' Connect the spectators, each watching random games, and once they have received their
+        first keyframes put 'watching' in the results queue and let them watch for the given
+        number of seconds
+
+        Output: dictionary of the counts while watching (plus 'seconds': how long that was)
+        '''
+        start = perf_counter()
+        for spectator_num in range(spectators):
+            await self.connect(random.sample(range(1, games + 1), min(watched, games)), spectator_num < slow_spectators)
+        # The first keyframe of every game (slow spectators receive theirs in their first read)
+        fast = spectators - slow_spectators
+        while self.keyframes < fast*min(watched, games) and perf_counter() - start < duration:
+            await asyncio.sleep(0.05)
+        results.put('watching')
+        first = self.counts()
+        watch_start = perf_counter()
+        await asyncio.sleep(duration)
+        counts = {name: value - first[name] for name, value in self.counts().items()}
+        counts['seconds'] = perf_counter() - watch_start
+        return counts
+
+class LoadClient():
+    '''The simulated players of one process
+
+    Attributes:
+        address         (address, port) of the server
+        think_time      Mean seconds a player waits before firing
+        connections     Open connections
+        games_started   'start' messages received (two per game)
+        games_ended     'end' messages received
+        errors          'error' messages received
+        results         multiprocessing Queue of the results (and of a 'started' message once
+                        every game has started)
+        go              multiprocessing Event set when the measurement starts
+        measuring       True during the measurement
+        latencies       Move latencies measured (seconds)
+        moves           Moves answered, measured or not
+        stalling        Share of the players that stall
+        stall_waits     Seconds from a stall to the end of the game, for the games lost by the
+                        stalled player during the measurement
+        stall_wins      Games won by a stalled player (only if the opponent left meanwhile)
+    '''
+    def __init__(self, address, think_time, results, go, stalling=0.0):
+        self.address = address
+        self.results = results
+        self.go = go
+        self.think_time = think_time
+        self.connections = 0
+        self.games_started = 0
+        self.games_ended = 0
+        self.errors = 0
+        self.measuring = False
+        self.latencies = []
+        self.moves = 0
+        self.stalling = stalling
+        self.stall_waits = []
+        self.stall_wins = 0
+        self.fleets = []
+    def new_fleet(self):
+        ''' Output: random legal fleet, as a list of ships of [row, col] '''
+        if not self.fleets:
+            self.fleets = list(uniform_fleets(1000))
+        return [[list(block) for block in ship.locations] for ship in fleet_ships(self.fleets.pop())]
+    async def connect(self):
+        loop = asyncio.get_running_loop()
+        self.connections += 1
+        try:
+            await loop.create_connection(lambda: SimulatedPlayer(self, self.new_fleet()), *self.address)
+        except OSError:
+            self.connections -= 1
+            self.errors += 1
+    def moved(self, latency):
+        self.moves += 1
+        if self.measuring:
+            self.latencies.append(latency)
+    def timed_out(self, wait, won):
+        if won:
+            self.stall_wins += 1
+        elif self.measuring:
+            self.stall_waits.append(wait)
+    def ended(self, player):
+        # The game is over (the server closes the connection): a new player takes its place
+        self.games_ended += 1
+        asyncio.get_running_loop().create_task(self.connect())
+    async def run(self, players, duration):
+        ''' Connect the players, then measure for the given number of seconds
+
+        Output: dictionary of the counts and latencies
+        '''
+        for first in range(0, players, connect_batch):
+            await asyncio.gather(*(self.connect() for _ in range(min(connect_batch, players - first))))
+        # Wait for the players of the other processes, so that every game has started
+        while self.games_started < players - self.errors:
+            await asyncio.sleep(0.1)
+        # The spectators (if any) connect before the measurement starts
+        self.results.put('started')
+        while not self.go.is_set():
+            await asyncio.sleep(0.05)
+        self.measuring = True
+        moves = self.moves
+        await asyncio.sleep(duration)
+        self.measuring = False
+        return {'latencies': self.latencies, 'moves': self.moves - moves, 'errors': self.errors,
+                'games_ended': self.games_ended, 'connections': self.connections,
+                'stall_waits': self.stall_waits, 'stall_wins': self.stall_wins}
+
+# FUNCTIONS
+
+def raise_file_limit():
+    ''' Raise the limit of open files of this process to the hard limit
+
+    Output: limit (None if it is not known)
+    '''
+    if resource is None:
+        return None
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard if hard != resource.RLIM_INFINITY else None
+
+def client_process(address, players, duration, think_time, results, go, stalling=0.0):
+    ''' Worker function: runs simulated players and puts their results in the queue '''
+    raise_file_limit()
+    # The simulated players live as long as their games, as in the server
+    settle_gc()
+    client = LoadClient(address, think_time, results, go, stalling)
+    results.put(asyncio.run(client.run(players, duration)))
+
+def spectator_process(address, spectators, slow_spectators, watched, games, duration, results):
+    ''' Worker function: runs simulated spectators and puts their counts in the queue '''
+    raise_file_limit()
+    settle_gc()
+    client = SpectatorClient(address)
+    results.put(asyncio.run(client.run(spectators, slow_spectators, watched, games, duration, results)))
+
+def server_process(port, ready, move_seconds=time_per_move, game_seconds=time_per_game):
+    ''' Runs the server on loopback; puts the (address, port) listened on in the queue '''
+    raise_file_limit()
+    run_server('127.0.0.1', port, ready.put, move_seconds, game_seconds)
+
+def cpu_seconds(pid):
+    ''' Processor time used by a process so far (Linux only)
+
+    Output: seconds, None if it cannot be read
+    '''
+    try:
+        with open(f"/proc/{pid}/stat") as stat_file:
+            fields = stat_file.read().rsplit(')', 1)[1].split()
+        # utime and stime are the 14th and 15th fields of the file
+        return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError):
+        return None
+
+def run_load_test(games, duration=30.0, think_time=3.0, address=None, processes=None,
+                  spectators=0, slow_spectators=0, watched=100, stalling=0.0, move_seconds=time_per_move):
+    ''' Play the given number of concurrent games against a server and measure the move latency
+
+    Input: number of concurrent games, seconds of measurement, mean think time of the players,
+           (address, port) of a running server (None: start one in a child process), number of
+           client processes (default: enough for the limit of open files), number of spectators,
+           how many of them are slow, games watched by each one, share of the players that stall,
+           seconds a player has for each shot on the server started
+
+    Output: dictionary of the results ('p50', 'p99' and 'max' latencies in seconds, 'moves_per_sec',
+            'server_cpu' share of a core or None, 'games', with spectators 'spectators': their
+            counts, and with stalling players 'stall_waits': seconds from a stall to the end of
+            the game)
+    '''
+    limit = raise_file_limit()
+    server = None
+    if address is None:
+        # Two sockets per game on the server's side, and one per spectator
+        if limit is not None and 2*games + spectators > limit - reserved_files:
+            games = (limit - reserved_files - spectators) // 2
+            print(f"load test: the limit of {limit} open files per process only allows {games} games on the server")
+        ready = Queue()
+        server = Process(target=server_process, args=(0, ready, move_seconds))
+        server.start()
+        address = ready.get()
+    players = 2*games
+    if processes is None:
+        processes = 1 if limit is None else ceil(players / (limit - reserved_files))
+    results = Queue()
+    go = Event()
+    clients = []
+    for client_num in range(processes):
+        share = players // processes + (client_num < players % processes)
+        clients.append(Process(target=client_process, args=(address, share, duration, think_time, results, go, stalling)))
+    for client in clients:
+        client.start()
+
+    # Once every game has started, the spectators connect, then the measurement starts
+    for _ in clients:
+        results.get()
+    watchers = None
+    if spectators:
+        spectator_results = Queue()
+        # The spectators stop a little before the players, so that the games stopped at the end
+        # of the test are not counted
+        watchers = Process(target=spectator_process, args=(address, spectators, slow_spectators, watched, games,
+                                                           max(duration - 0.5, 0.5*duration), spectator_results))
+        watchers.start()
+        spectator_results.get()
+    # The server's processor time is measured while every client process is measuring
+    go.set()
+    measure_start = perf_counter()
+    server_cpu_start = None if server is None else cpu_seconds(server.pid)
+    clients_cpu_start = [cpu_seconds(client.pid) for client in clients]
+    reports = [results.get() for _ in clients]
+    clients_cpu = [cpu_seconds(client.pid) for client in clients]
+    measured = perf_counter() - measure_start
+    server_cpu = None
+    if server_cpu_start is not None:
+        server_cpu = (cpu_seconds(server.pid) - server_cpu_start) / measured
+    clients_cpu = None if None in clients_cpu + clients_cpu_start else (sum(clients_cpu) - sum(clients_cpu_start)) / measured
+    for client in clients:
+        client.join()
+    if watchers is not None:
+        spectator_report = spectator_results.get()
+        watchers.join()
+    if server is not None:
+        server.terminate()
+        server.join()
+
+    latencies = sorted(latency for report in reports for latency in report['latencies'])
+    if not latencies:
+        raise RuntimeError("no move was measured")
+    summary = {'games': games,
+               'p50': latencies[len(latencies)//2],
+               'p99': latencies[int(len(latencies)*0.99)],
+               'max': latencies[-1],
+               'moves_per_sec': sum(report['moves'] for report in reports) / duration,
+               'server_cpu': server_cpu}
+    errors = sum(report['errors'] for report in reports)
+    print(f"load test: {games} concurrent games, {summary['moves_per_sec']:.0f} moves/sec for {duration:.0f}s "
+          f"({sum(report['games_ended'] for report in reports)} games ended, {errors} errors)")
+    print(f"load test: move latency p50 {summary['p50']*1e3:.2f} ms, p99 {summary['p99']*1e3:.2f} ms, "
+          f"max {summary['max']*1e3:.2f} ms (target: p99 under {target_p99*1e3:.0f} ms, "
+          f"{'met' if summary['p99'] < target_p99 else 'missed'})")
+    if server_cpu is not None:
+        print(f"load test: the server used {server_cpu:.0%} of a core"
+              + (f", the simulated players {clients_cpu:.0%}" if clients_cpu is not None else ""))
+    if stalling:
+        waits = sorted(wait for report in reports for wait in report['stall_waits'])
+        summary['stall_waits'] = waits
+        if waits:
+            print(f"load test: {len(waits)} games lost on time by stalled players, {waits[0]:.2f}s to "
+                  f"{waits[-1]:.2f}s after they stalled (median {waits[len(waits)//2]:.2f}s; "
+                  f"{move_seconds:g}s per move on the server started), "
+                  f"{sum(report['stall_wins'] for report in reports)} won by them")
+        else:
+            print("load test: no game was lost on time by a stalled player")
+    if watchers is not None:
+        summary['spectators'] = spectator_report
+        report = spectator_report
+        # What the same updates would have cost as a keyframe each
+        snapshot_bytes = report['deltas'] * (report['keyframe_bytes'] / report['keyframes'] if report['keyframes'] else 79)
+        print(f"load test: {spectators} spectators ({slow_spectators} slow) watching {watched} games each, for "
+              f"{report['seconds']:.0f}s: {report['deltas']} deltas and {report['keyframes']} keyframes, "
+              f"{report['bytes']/report['seconds']/1e3:.1f} kB/s in all (a keyframe per update would take "
+              f"{snapshot_bytes/report['seconds']/1e3:.1f} kB/s)")
+        print(f"load test: {report['catch_ups']} keyframes after dropped deltas, {report['gaps']} gaps, "
+              f"{report['mismatches']} keyframes that did not agree with the rebuilt game")
+    return summary
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test of the game server")
+    parser.add_argument('--games', type=int, default=10000, help="concurrent games")
+    parser.add_argument('--duration', type=float, default=30.0, help="seconds of measurement")
+    parser.add_argument('--think-time', type=float, default=3.0, help="mean seconds a player waits before firing")
+    parser.add_argument('--server', default=None, metavar='ADDRESS:PORT', help="running server to test (default: start one)")
+    parser.add_argument('--processes', type=int, default=None, help="client processes (default: as many as the open files limit requires)")
+    parser.add_argument('--spectators', type=int, default=0, help="spectators watching the games")
+    parser.add_argument('--slow-spectators', type=int, default=0, help="spectators among them that only read every few seconds")
+    parser.add_argument('--watched', type=int, default=100, help="games watched by each spectator")
+    parser.add_argument('--stalling', type=float, default=0.0, help="share of the players that stop firing during their game")
+    parser.add_argument('--time-per-move', type=float, default=time_per_move, help="seconds a player has for each shot on the server started")
+    args = parser.parse_args()
+    address = None
+    if args.server:
+        host, _, port = args.server.partition(':')
+        address = (host, int(port) if port else default_port)
+    run_load_test(args.games, args.duration, args.think_time, address, args.processes,
+                  args.spectators, args.slow_spectators, args.watched, args.stalling, args.time_per_move)
@@ -1,7 +1,7 @@
 '''
-Main module: executes the menu with the different gameplay options. Most of these are to be
-incorporated in the future. Current version only includes the possibility to play locally, against
-either the CPU ('normal' difficulty) or another player
+Main module: executes the menu with the different gameplay options: locally, against either the CPU
+('normal' difficulty) or another player, against another player in the same network (LAN), and
+online, against another player on a game server (game_server.py)
 '''
 
 import os
@@ -9,6 +9,12 @@ from button_class import Button
 from player_places_ships import *
 from battleship import *
 from textbox_class import TextBox
+from display_class import Display, frame_report
+from scheduler_class import Scheduler, loop_report
+from render_cache import render_text
+from online_class import OnlineMatch
+from game_server import default_port as server_port
+from lan_class import LanConnection, LanMatch, local_address, default_port, idle_poll_interval, CONNECTING, CLOSED
 
 # TITLE AND GAME ICON (TEMPORARY!)
 os.environ['SDL_VIDEO_CENTERED'] = "1" # Not working?
@@ -24,6 +30,8 @@ background_2 = game.image.load(os.path.join("img", "menu_pic3.jpg"))
 menu_width = 1072
 menu_height = 712
 menu_screen = game.display.set_mode((menu_width, menu_height))
+coming_soon_font = game.font.SysFont('Cambria',50)
+message_font = game.font.SysFont('Cambria',30)
 
 def main():
 	''' Main function of the module. Displays the different screens of the menu.
@@ -42,8 +50,7 @@ def main():
 
 	# Will store the players before executing battleship.py
 	list_of_players = []
-	# The four modalities of gameplay that will be available in the future
-	# Currently, only the first two are present
+	# The four modalities of gameplay
 	modalities = {1: "CPU", 2: "Local", 3: "LAN", 4: "Online"}
 
 	# Creating and storing the buttons of the main menu
@@ -64,10 +71,7 @@ def main():
 	for i in range(4):
 		button_width = sq_size*8
 		button_height = sq_size*0.75
-		if i < 2: # Temporary! Will take out after incorporating LAN & Online modes
-			new_button = Button((menu_width-button_width)/2, 125+i*150, button_width, button_height, (0, 85, 128), (255, 255, 255))
-		else:
-			new_button = Button((menu_width-button_width)/2, 125+i*150, button_width, button_height, game.Color("gray"), (255, 255, 255))
+		new_button = Button((menu_width-button_width)/2, 125+i*150, button_width, button_height, (0, 85, 128), (255, 255, 255))
 		new_game_buttons.append(new_button)
 	top_scores_buttons.append(return_button)
 	options_buttons.append(return_button)
@@ -78,12 +82,14 @@ def main():
 		# Corresponds to the main menu, where one can choose out of four options: 'New Game', 
 		# 'Top Scores', 'Options', and 'Quit'. Currently, 'Top Scores' and 'Options' will only
 		# display a 'Coming Soon' message
+		main_display = Display(menu_screen, "main menu")
+		main_scheduler = Scheduler(main_display)
 		while main_menu:
 
-			menu_screen.blit(background, (0, 0))
+			events = main_scheduler.events()
 			mouse_pos = game.mouse.get_pos()
 
-			for e in game.event.get():
+			for e in events:
 				if e.type == game.QUIT:
 					main_menu = False
 					display_menus = False
@@ -99,11 +105,18 @@ def main():
 						# Updates button's 'mouse_on' boolean
 						button.mouse_over(mouse_pos)
 
-			# Check which button has been pressed and activate the corresponding loop (or quit)
+			# Only redraw the screen if a button's highlight changed
 			text_dict = {0: "New Game", 1: "Top Scores", 2:"Options", 3: "Quit"}
+			for i in range(len(text_dict)):
+				main_display.track(("button", i), button_list[i].mouse_on, button_list[i].rectangle)
+			if main_display.needs_redraw():
+				menu_screen.blit(background, (0, 0))
+				for i in range(len(text_dict)):
+					button_list[i].draw(menu_screen, text_dict[i], button_font)
+
+			# Check which button has been pressed and activate the corresponding loop (or quit)
 			for i in range(len(text_dict)):
 				button = button_list[i]
-				button.draw(menu_screen, text_dict[i], button_font)
 				if button.pressed:
 					# 'New Game' selected
 					if i == 0:
@@ -123,15 +136,17 @@ def main():
 						display_menus = False
 					button.pressed = False
 
-			game.display.update()
+			main_display.flush()
 
 		# Play a new game
+		new_game_display = Display(menu_screen, "new game")
+		new_game_scheduler = Scheduler(new_game_display)
 		while new_game:
 
-			menu_screen.blit(background_2, (0, 0))
+			events = new_game_scheduler.events()
 			mouse_pos = game.mouse.get_pos()
 
-			for e in game.event.get():
+			for e in events:
 				if e.type == game.QUIT:
 					new_game = False
 					display_menus = False
@@ -149,10 +164,15 @@ def main():
 
 			# Check which modality has been chosen if a button has been pressed
 			modality = " "
-			text_dict = {0: "Return", 1: "Play vs CPU", 2:"Play vs A Friend (Local)", 3: "LAN Game - Unavailable", 4: "Play Online - Unavailable"}
+			text_dict = {0: "Return", 1: "Play vs CPU", 2:"Play vs A Friend (Local)", 3: "LAN Game", 4: "Play Online"}
+			for i in range(len(text_dict)):
+				new_game_display.track(("button", i), new_game_buttons[i].mouse_on, new_game_buttons[i].rectangle)
+			if new_game_display.needs_redraw():
+				menu_screen.blit(background_2, (0, 0))
+				for i in range(len(text_dict)):
+					new_game_buttons[i].draw(menu_screen, text_dict[i], button_font)
 			for i in range(len(text_dict)):
 				button = new_game_buttons[i]
-				button.draw(menu_screen, text_dict[i], button_font)
 				if button.pressed:
 					if i == 0:
 						new_game = False
@@ -161,7 +181,7 @@ def main():
 						modality = modalities[i]
 					button.pressed = False
 
-			game.display.update()
+			new_game_display.flush()
 
 			# Play the chosen modality
 			game_result = ''
@@ -170,25 +190,28 @@ def main():
 			elif modality == "Local":
 				game_result = play_local(menu_screen)
 			elif modality == "LAN":
-				game_result = play_lan()
+				game_result = play_lan(menu_screen)
 			elif modality == "Online":
-				game_result = play_online()
+				game_result = play_online(menu_screen)
 
 			# The user has quit during the game or while writing the usernames
 			if game_result == None:
 				new_game = False
 				display_menus = False
-			# Username discarded in the TextBox
+			# Username discarded in the TextBox: the menu has to be drawn again
 			elif game_result == 404:
+				new_game_display.invalidate()
 				continue
 
 		# Display the game's top scores
+		top_scores_display = Display(menu_screen, "top scores")
+		top_scores_scheduler = Scheduler(top_scores_display)
 		while top_scores:
 
-			menu_screen.blit(background_2, (0, 0))
+			events = top_scores_scheduler.events()
 			mouse_pos = game.mouse.get_pos()
 
-			for e in game.event.get():
+			for e in events:
 				if e.type == game.QUIT:
 					top_scores = False
 					display_menus = False
@@ -206,27 +229,33 @@ def main():
 
 			# Only the return button is currently available
 			text_dict = {0: "Return"}
+			for i in range(len(text_dict)):
+				top_scores_display.track(("button", i), top_scores_buttons[i].mouse_on, top_scores_buttons[i].rectangle)
+			if top_scores_display.needs_redraw():
+				menu_screen.blit(background_2, (0, 0))
+				for i in range(len(text_dict)):
+					top_scores_buttons[i].draw(menu_screen, text_dict[i], button_font)
+				# 'Coming Soon' rectangle
+				coming_soon()
 			for i in range(len(text_dict)):
 				button = top_scores_buttons[i]
-				button.draw(menu_screen, text_dict[i], button_font)
 				if button.pressed:
 					if i == 0:
 						top_scores = False
 						main_menu = True
 					button.pressed = False
 
-			# 'Coming Soon' rectangle
-			coming_soon()
-
-			game.display.update()
+			top_scores_display.flush()
 
 		# Change music volume and other settings
+		options_display = Display(menu_screen, "options")
+		options_scheduler = Scheduler(options_display)
 		while options:
 
-			menu_screen.blit(background_2, (0, 0))
+			events = options_scheduler.events()
 			mouse_pos = game.mouse.get_pos()
 
-			for e in game.event.get():
+			for e in events:
 				if e.type == game.QUIT:
 					options = False
 					display_menus = False
@@ -244,47 +273,61 @@ def main():
 
 			# Only the return button is currently available
 			text_dict = {0: "Return"}
+			for i in range(len(text_dict)):
+				options_display.track(("button", i), options_buttons[i].mouse_on, options_buttons[i].rectangle)
+			if options_display.needs_redraw():
+				menu_screen.blit(background_2, (0, 0))
+				for i in range(len(text_dict)):
+					options_buttons[i].draw(menu_screen, text_dict[i], button_font)
+				# 'Coming Soon' rectangle
+				coming_soon()
 			for i in range(len(text_dict)):
 				button = options_buttons[i]
-				button.draw(menu_screen, text_dict[i], button_font)
 				if button.pressed:
 					if i == 0:
 						options = False
 						main_menu = True
 					button.pressed = False
 
-			# 'Coming Soon' rectangle
-			coming_soon()
+			options_display.flush()
 
-			game.display.update()
+	# Frame costs and CPU use of every screen, e.g. to check a kiosk's idle load
+	if os.environ.get("BATTLESHIP_LOOP_REPORT"):
+		print(frame_report())
+		print(loop_report())
 
 def coming_soon():
 	'''
 		Display 'Coming Soon' message to indicate a future implementation.
 	'''
-	rec_width = 8*sq_size
+	show_message("Coming Soon...", coming_soon_font)
+
+def show_message(message, font):
+	'''
+		Display a message in a black rectangle in the middle of the menu (wide enough for the text)
+	'''
+	text = render_text(font, message, (255,255,255))
+	rec_width = max(8*sq_size, text.get_width() + sq_size)
 	rec_height = 2*sq_size
 	game.draw.rect(screen, game.Color("black"), game.Rect((menu_width - rec_width)/2, (menu_height - rec_height)/2, rec_width, rec_height))
-	font = game.font.SysFont('Cambria',50)
-	text = font.render("Coming Soon...", False, (255,255,255))
 	menu_screen.blit(text, ((menu_width - rec_width)/2 + (rec_width/2 - text.get_width()/2), (menu_height - rec_height)/2 + (rec_height/2 - text.get_height()/2)))
 
-def enter_username(screen, player_num, background = background_2):
-	''' Text box to introduce username
+def enter_username(screen, player_num, background = background_2, prompt = None):
+	''' Text box to introduce username (or any other text, given a prompt)
 	
-	Input: screen, player_num, background
+	Input: screen, player_num, background, prompt (default text of the box)
 
 	Output: introduced username
 	'''
 	pos_x, pos_y, width, height = (350, 300, 350, 50)
-	textbox = TextBox(pos_x, pos_y, width, height, player_num)
+	textbox = TextBox(pos_x, pos_y, width, height, player_num, prompt)
+	username_display = Display(screen, "username")
+	username_scheduler = Scheduler(username_display)
 
 	# Display the input box and interact with it until a username has been entered or
 	# the 'Discard' button has been pressed
 	while not textbox.finished:
-		screen.blit(background, (0, 0))
-
-		for e in game.event.get():
+		for e in username_scheduler.events():
 			if e.type == game.QUIT:
 				return
 			else:
@@ -292,8 +335,14 @@ def enter_username(screen, player_num, background = background_2):
 				if handle_result == "red_cross":
 					return 404
 
-		textbox.draw(menu_screen)
-		game.display.update()
+		# Only the text box can change
+		if username_display.track("textbox", (textbox.text, textbox.active), textbox.background_rect):
+			screen.blit(background, textbox.background_rect, textbox.background_rect)
+		if username_display.needs_redraw():
+			if username_display.full:
+				screen.blit(background, (0, 0))
+			textbox.draw(menu_screen)
+		username_display.flush()
 	return textbox.final_str
 
 def play_vs_cpu(screen):
@@ -326,19 +375,156 @@ def play_local(screen):
 		else:
 			battleship([player1_name, player2_name])
 
-def play_lan():
+def play_lan(screen):
+	'''
+		Third modality: game vs a friend in the same network. One of the players hosts the game
+		and the other one joins it with the host's address
+	'''
+	player_name = enter_username(screen, 0)
+	if player_name == None or player_name == 404:
+		return player_name
+	role = choose_lan_role(screen)
+	if role == None or role == 404:
+		return role
+
+	connection = LanConnection()
+	if role == "host":
+		try:
+			connection.host()
+		except OSError as error:
+			print(f"Could not host a LAN game: {error}")
+			connection.close()
+			return 404
+		message = f"Waiting for a friend to join {local_address()}..."
+	else:
+		address = enter_username(screen, 0, prompt="Host address")
+		if address == None or address == 404:
+			connection.close()
+			return address
+		# The port can be given after the address, e.g. '192.168.1.20:40404'
+		host, _, port = address.strip().partition(":")
+		connection.join(host, int(port) if port.isdigit() else default_port)
+		message = f"Connecting to {address.strip()}..."
+
+	connected = wait_for_peer(screen, connection, message)
+	if connected != True:
+		connection.close()
+		return connected
+	# The connection stays open in the background while the ships are placed
+	player = ship_placing(player_name)
+	if not player.placing_ships and len(player.board.placed_ships) < 10:
+		connection.close()
+		return
+	battleship_network(LanMatch(connection, player, host=(role == "host")))
+
+def choose_lan_role(screen):
+	''' Screen to choose between hosting a LAN game and joining one
+
+	Input: screen
+
+	Output: "host", "join", 404 if 'Return' has been pressed, None if the user has quit
 	'''
-		Third modality: play a game in LAN (to be incorporated)
+	button_font = game.font.SysFont('Cambria',26)
+	button_width = sq_size*8
+	lan_buttons = [Button(50, 50, sq_size*3, sq_size*0.75, (0, 85, 128), (255, 255, 255))]
+	for i in range(2):
+		lan_buttons.append(Button((menu_width-button_width)/2, 275+i*150, button_width, sq_size*0.75, (0, 85, 128), (255, 255, 255)))
+	text_dict = {0: "Return", 1: "Host a Game", 2: "Join a Game"}
+	choices = {0: 404, 1: "host", 2: "join"}
+	lan_display = Display(screen, "lan menu")
+	lan_scheduler = Scheduler(lan_display)
+
+	while True:
+		events = lan_scheduler.events()
+		mouse_pos = game.mouse.get_pos()
+
+		for e in events:
+			if e.type == game.QUIT:
+				return
+			elif e.type == game.MOUSEBUTTONDOWN:
+				if e.button == 1:
+					for i in range(len(lan_buttons)):
+						if lan_buttons[i].mouse_on:
+							return choices[i]
+			# Due to the event limitation, this means that the mouse has not been clicked anywhere
+			else:
+				for button in lan_buttons:
+					button.mouse_over(mouse_pos)
+
+		for i in range(len(text_dict)):
+			lan_display.track(("button", i), lan_buttons[i].mouse_on, lan_buttons[i].rectangle)
+		if lan_display.needs_redraw():
+			screen.blit(background_2, (0, 0))
+			for i in range(len(text_dict)):
+				lan_buttons[i].draw(screen, text_dict[i], button_font)
+		lan_display.flush()
+
+def wait_for_peer(screen, connection, message):
+	''' Screen shown while the connection to the other player (or to the server) is being established. The connection is made in the
+		background, so the screen keeps responding, and 'Return' gives up on it
+
+	Input: screen, LanConnection instance, message to display
+
+	Output: True once connected, 404 if 'Return' has been pressed or the connection has failed,
+			None if the user has quit
 	'''
-	print("Start a LAN game vs a friend...")
-	pass
+	button_font = game.font.SysFont('Cambria',26)
+	return_button = Button(50, 50, sq_size*3, sq_size*0.75, (0, 85, 128), (255, 255, 255))
+	wait_display = Display(screen, "lan wait")
+	wait_scheduler = Scheduler(wait_display)
 
-def play_online():
+	while connection.state == CONNECTING:
+		# Wake up regularly to check the connection
+		events = wait_scheduler.events(timeout=idle_poll_interval)
+		mouse_pos = game.mouse.get_pos()
+
+		for e in events:
+			if e.type == game.QUIT:
+				return
+			elif e.type == game.MOUSEBUTTONDOWN:
+				if e.button == 1 and return_button.mouse_on:
+					return 404
+			else:
+				return_button.mouse_over(mouse_pos)
+
+		wait_display.track("return", return_button.mouse_on, return_button.rectangle)
+		if wait_display.needs_redraw():
+			screen.blit(background_2, (0, 0))
+			return_button.draw(screen, "Return", button_font)
+			show_message(message, message_font)
+		wait_display.flush()
+
+	if connection.state == CLOSED:
+		print(f"The game could not start: {connection.error}.")
+		return 404
+	return True
+
+def play_online(screen):
 	'''
-		Fourth modality: play an online game (to be incorporated)
+		Fourth modality: game vs another player on an online server (game_server.py), which pairs
+		the players in the order they join and runs the rules
 	'''
-	print("Play Online (need to set up a server)...")
-	pass
+	player_name = enter_username(screen, 0)
+	if player_name == None or player_name == 404:
+		return player_name
+	address = enter_username(screen, 0, prompt="Server address")
+	if address == None or address == 404:
+		return address
+
+	connection = LanConnection()
+	# The port can be given after the address, e.g. 'battleship.example.org:40405'
+	host, _, port = address.strip().partition(":")
+	connection.join(host, int(port) if port.isdigit() else server_port)
+	connected = wait_for_peer(screen, connection, f"Connecting to {address.strip()}...")
+	if connected != True:
+		connection.close()
+		return connected
+	# The server pairs the player with an opponent once the ships are placed
+	player = ship_placing(player_name)
+	if not player.placing_ships and len(player.board.placed_ships) < 10:
+		connection.close()
+		return
+	battleship_network(OnlineMatch(connection, player))
 
 if __name__ == "__main__":
 	main()
@@ -0,0 +1,248 @@
+'''
+Monte Carlo targeting: samples many complete enemy fleets that agree with everything the CPU has
+seen (misses, hits, sunk ships and discarded blocks) and fires at the square that holds a ship in
+the largest share of them.
+
+Fleets are not drawn at random and rejected when they contradict the observations, since late in
+a game almost all of them would be. They are built with constraint-aware placement instead:
+  1. Every way of covering the hit (but not sunk) squares with the ships still afloat is listed
+     once per position (there are only a few hits at a time). A sample picks one of them.
+  2. The other ships are placed one after the other, each among the placements (precomputed in
+     fleet_placement) that avoid the misses, the sunk and discarded squares and the ships placed
+     so far, many samples at a time with NumPy.
+Placing ships this way does not give every consistent fleet the same probability, so each sample
+is weighted by the number of choices it had at every step (sequential importance sampling); the
+weighted counts estimate the share of consistent fleets, all equally likely, with a ship on each
+square.
+'''
+
+from math import factorial
+from multiprocessing import Pool
+
+import numpy as np
+
+from fleet_placement import placement_tables, split_masks
+from strategy_class import Strategy, StrategyCPU, DensityStrategy
+from transposition_class import transposition_cache
+
+# Samples drawn by every refine step (per process)
+batch_size = 512
+# Positions with more ways of covering the hits than this are left to the density strategy
+max_cover_options = 20000
+# Shared process pools, one per number of processes
+_pools = {}
+
+class MonteCarloSetup():
+    '''Everything the samples of one position need, precomputed once
+
+    Attributes:
+        allowed         {length: indices of the placements avoiding every miss, sunk or
+                        discarded square (and not lying entirely on hits)}
+        cover_options   List of the ways to cover the hits: tuples of (length, placement index)
+        cover_lo/hi     Blocks of the ships of every cover option, split into uint64 arrays
+        cover_cells     (cover options x 100) array, 1 where the option has a block
+        groups          {tuple of the lengths left to place after the cover: array of the
+                        indices of the cover options that leave them}
+        group_factor    {lengths left: product of the factorials of the number of ships of each
+                        length}; the same fleet is built that many times in different orders
+        tables          {length: (ship_lo, ship_hi, zone_lo, zone_hi, cells) of the allowed placements}
+    '''
+    def __init__(self, position):
+        blocked = 0
+        hits = 0
+        for row in range(10):
+            for col in range(10):
+                mark = position.guess_state[row][col]
+                if mark in ('M', 'S') or (row, col) in position.discarded_blocks:
+                    blocked |= 1 << (row*10 + col)
+                elif mark == 'X':
+                    hits |= 1 << (row*10 + col)
+        remaining = list(position.remaining_ships)
+        self.allowed = {}
+        self.tables = {}
+        for length in set(remaining):
+            table = placement_tables[length]
+            # A ship whose blocks had all been hit would have been sunk
+            allowed = [indx for indx, ship_mask in enumerate(table.ship_masks)
+                       if not ship_mask & blocked and ship_mask & ~hits]
+            self.allowed[length] = allowed
+            ship_lo, ship_hi = table.ship_lo[allowed], table.ship_hi[allowed]
+            zone_lo, zone_hi = table.zone_lo[allowed], table.zone_hi[allowed]
+            self.tables[length] = (ship_lo, ship_hi, zone_lo, zone_hi, table.cells[allowed].astype(np.float64))
+
+        self.cover_options = []
+        self.cover_occupied = []
+        self.search_covers(hits, remaining, (), 0)
+        self.cover_lo, self.cover_hi = split_masks(self.cover_occupied)
+        bits = np.arange(64, dtype=np.uint64)
+        self.cover_cells = np.concatenate(((self.cover_lo[:, None] >> bits) & 1, (self.cover_hi[:, None] >> bits[:36]) & 1), axis=1).astype(np.float64)
+        self.groups = {}
+        for option_num, option in enumerate(self.cover_options):
+            left = list(remaining)
+            for length, _ in option:
+                left.remove(length)
+            # Largest ships first: they have the fewest legal placements on a crowded board
+            self.groups.setdefault(tuple(sorted(left, reverse=True)), []).append(option_num)
+        self.groups = {left: np.array(options) for left, options in self.groups.items()}
+        self.group_factor = {left: float(np.prod([factorial(left.count(length)) for length in set(left)]))
+                             for left in self.groups}
+    def search_covers(self, uncovered, remaining, option, occupied):
+        ''' List (depth-first) every set of non-touching placements of the remaining ships that
+        covers all the hits. The lowest uncovered hit decides the next ship, so every set is
+        listed exactly once.
+
+        Input: uncovered hits mask, remaining lengths, placements chosen so far, their blocks
+
+        Output: None (fills cover_options and cover_occupied)
+        '''
+        if len(self.cover_options) > max_cover_options:
+            return
+        if not uncovered:
+            self.cover_options.append(option)
+            self.cover_occupied.append(occupied)
+            return
+        lowest = uncovered & -uncovered
+        for length in set(remaining):
+            table = placement_tables[length]
+            left = list(remaining)
+            left.remove(length)
+            for indx in self.allowed[length]:
+                ship_mask = table.ship_masks[indx]
+                if ship_mask & lowest and not table.zone_masks[indx] & occupied:
+                    self.search_covers(uncovered & ~ship_mask, left, option + ((length, indx),), occupied | ship_mask)
+
+class MonteCarloStrategy(Strategy):
+    '''Fires at the square occupied most often among the sampled consistent fleets. Every refine
+    step adds a batch of samples (one per process if processes is set). The samples of every
+    position are kept in the 'monte_carlo' transposition cache, so a position seen before (e.g.
+    the opening of every game) starts from them instead of from scratch.
+
+    Attributes:
+        processes       Number of processes to sample with (None: sample in this process)
+        max_samples     Samples after which the answer is final (None: refine until the deadline)
+        setup           MonteCarloSetup instance of the position
+        occupancy       Weighted number of samples with a ship on each square
+        total_weight    Sum of the weights of the samples
+        samples         Number of samples drawn for the position
+    '''
+    def __init__(self, processes=None, max_samples=None):
+        super().__init__()
+        self.processes = processes
+        self.max_samples = max_samples
+        self.fallback = DensityStrategy()
+    def start(self, position, setup=None):
+        ''' Input: position, its MonteCarloSetup if it has already been built (e.g. by the endgame
+               solver; default: built here) '''
+        super().start(position)
+        self.setup = setup if setup is not None else MonteCarloSetup(position)
+        self.occupancy = np.zeros(100)
+        self.total_weight = 0.0
+        self.samples = 0
+        self.candidates = np.zeros(100, dtype=bool)
+        for row, col in position.candidates():
+            self.candidates[row*10 + col] = True
+        cached = transposition_cache('monte_carlo').get(position.key)
+        if cached is not None:
+            occupancy, self.total_weight, self.samples = cached
+            self.occupancy = occupancy.copy()
+            self.choose_best()
+            if self.max_samples is not None and self.samples >= self.max_samples:
+                self.done = True
+                return
+        # Nothing to sample from (too many ways to cover the hits, or no consistent fleet left)
+        if not self.setup.cover_options or len(self.setup.cover_options) > max_cover_options:
+            self.fallback.start(position)
+            self.fallback.refine()
+            self.best = self.fallback.best
+            self.done = True
+    def refine(self):
+        if self.processes:
+            tasks = [(self.setup, batch_size, self.rng.getrandbits(64)) for _ in range(self.processes)]
+            results = pool(self.processes).map(sample_occupancy, tasks)
+        else:
+            results = [sample_occupancy((self.setup, batch_size, self.rng.getrandbits(64)))]
+        for occupancy, total_weight in results:
+            self.occupancy += occupancy
+            self.total_weight += total_weight
+            self.samples += batch_size
+        transposition_cache('monte_carlo').put(self.position.key, (self.occupancy.copy(), self.total_weight, self.samples))
+        self.choose_best()
+        if self.max_samples is not None and self.samples >= self.max_samples:
+            self.done = True
+    def choose_best(self):
+        ''' Sets best to the candidate square occupied in the most samples '''
+        if self.total_weight > 0:
+            share = np.where(self.candidates, self.occupancy, -1)
+            best = share.max()
+            if best > 0:
+                self.best = divmod(int(self.rng.choice(np.flatnonzero(share == best))), 10)
+    def occupancy_share(self):
+        ''' Output: 10x10 array with the estimated share of consistent fleets with a ship on each square '''
+        return (self.occupancy / max(self.total_weight, 1e-300)).reshape(10, 10)
+
+class MonteCarloCPU(StrategyCPU):
+    '''CPU that plays the Monte Carlo strategy, and the exact endgame solver (endgame_class) once
+    few arrangements of the enemy ships are left
+
+    Attributes:
+        Same as StrategyCPU
+    '''
+    def __init__(self, move_time=None, processes=None, max_samples=None, endgame=True, rng=None):
+        strategy = MonteCarloStrategy(processes, max_samples)
+        if endgame:
+            # Imported here since the endgame solver builds on this module
+            from endgame_class import EndgameStrategy
+            strategy = EndgameStrategy(strategy)
+        super().__init__(strategy, move_time, rng)
+
+# FUNCTIONS
+
+def sample_occupancy(task):
+    ''' Worker function: draws a batch of weighted consistent fleets
+
+    Input: (MonteCarloSetup instance, number of samples, seed)
+
+    Output: (weighted number of samples with a ship on each square, sum of the weights)
+    '''
+    setup, size, seed = task
+    generator = np.random.default_rng(seed)
+    option_nums = generator.integers(0, len(setup.cover_options), size)
+    occupancy = np.zeros(100)
+    total_weight = 0.0
+    # Samples whose cover leaves the same ships to place are placed together
+    for left, options in setup.groups.items():
+        in_group = np.isin(option_nums, options)
+        chosen = option_nums[in_group]
+        if len(chosen) == 0:
+            continue
+        occupied_lo = setup.cover_lo[chosen]
+        occupied_hi = setup.cover_hi[chosen]
+        weights = np.full(len(chosen), 1.0 / setup.group_factor[left])
+        steps = []
+        for length in left:
+            ship_lo, ship_hi, zone_lo, zone_hi, cells = setup.tables[length]
+            if len(cells) == 0:
+                weights[:] = 0
+                break
+            legal = ((zone_lo[None, :] & occupied_lo[:, None]) | (zone_hi[None, :] & occupied_hi[:, None])) == 0
+            # Uniform choice among the legal placements: the largest random key wins
+            keys = generator.random(legal.shape)
+            keys[~legal] = -1
+            choice = keys.argmax(axis=1)
+            weights *= legal.sum(axis=1)
+            occupied_lo = occupied_lo | ship_lo[choice]
+            occupied_hi = occupied_hi | ship_hi[choice]
+            steps.append((length, choice))
+        # Samples that reached a dead end have a weight of 0
+        occupancy += np.bincount(chosen, weights=weights, minlength=len(setup.cover_options)) @ setup.cover_cells
+        for length, choice in steps:
+            cells = setup.tables[length][4]
+            occupancy += np.bincount(choice, weights=weights, minlength=len(cells)) @ cells
+        total_weight += weights.sum()
+    return occupancy, total_weight
+
+def pool(processes):
+    ''' Shared process pool with the given number of processes '''
+    if processes not in _pools:
+        _pools[processes] = Pool(processes)
+    return _pools[processes]
@@ -0,0 +1,213 @@
+'''
+Contains the OnlineMatch class: the client side of a game on the online server (game_server.py).
+It has the same interface as a LAN game (lan_class.LanMatch), so the same gameplay loop renders
+both, and it uses the same background connection, so the window never waits on the network.
+
+The server holds both fleets and runs the rules: the client sends its fleet when it joins, its
+shots when it is its turn, and only shows what the server answers.
+
+SpectatedGame rebuilds a game watched on the server from the keyframes and deltas it broadcasts.
+'''
+
+from time import perf_counter
+
+from engine import GameResult
+from lan_class import ProtocolError, fleet_blocks, CLOSED
+from player_class import Player
+from wire_protocol import protocol_version
+
+class OnlineMatch():
+    '''An online game seen from one of the players; the frame loop calls update every frame
+
+    Attributes:
+        connection      LanConnection instance (connecting or connected to the server)
+        player          Local Player instance, with its ships placed
+        peer            Player instance standing for the opponent (None until the game starts)
+        users           [first player, second player] once the game has started, else None
+        user_1          User whose turn it is
+        user_2          User waiting for their turn
+        num_of_turns    Number of valid shots fired by both players
+        pending_shot    (row, col) of the local player's shot waiting for its result, or None
+        latencies       Seconds from sending each shot to receiving its result
+        result          GameResult instance once the game has finished, None before that
+        reason          Why the game finished, as told by the server
+        error           Why the game ended before finishing (e.g. lost connection), None otherwise
+        verified        Always True: the server runs the rules, so there is nothing to check
+
+    Methods:
+        start           Joins the server's queue of players
+        fire            Sends a shot of the local player
+        update          Handles the messages received since the previous call
+        close           Closes the connection
+    '''
+    def __init__(self, connection, player):
+        self.connection = connection
+        self.player = player
+        self.peer = None
+        self.users = None
+        self.user_1 = None
+        self.user_2 = None
+        self.num_of_turns = 0
+        self.pending_shot = None
+        self.shot_sent = None
+        self.latencies = []
+        self.result = None
+        self.reason = None
+        self.error = None
+        self.verified = True
+    @property
+    def started(self):
+        return self.users is not None
+    @property
+    def finished(self):
+        return self.result is not None
+    @property
+    def my_turn(self):
+        ''' True if the local player can fire now '''
+        return (self.started and not self.finished and self.error is None
+                and self.user_1 is self.player and self.pending_shot is None)
+    def start(self):
+        self.connection.send({'type': 'join', 'version': protocol_version, 'name': self.player.name,
+                              'fleet': fleet_blocks(self.player.board)})
+    def fire(self, row, col):
+        ''' The local player fires at the given square; ignored unless it is their turn
+
+        Input: row, col
+
+        Output: True if the shot was sent
+        '''
+        if not self.my_turn or self.player.board.guess_state[row][col] != ' ':
+            return False
+        self.pending_shot = (row, col)
+        self.shot_sent = perf_counter()
+        self.connection.send({'type': 'shot', 'row': row, 'col': col})
+        return True
+    def update(self, timeout=0):
+        ''' Handle the messages received since the previous call
+
+        Input: seconds to wait for the first message (0: do not wait)
+
+        Output: None
+        '''
+        # Checked before reading, so that every message sent before the connection was closed
+        # (above all the end of the game) is handled first
+        closed = self.connection.state == CLOSED
+        for message in self.connection.receive(timeout):
+            try:
+                self.handle(message)
+            except (ProtocolError, KeyError, TypeError, ValueError) as error:
+                self.error = f"invalid message from the server ({error})"
+                self.connection.close()
+                return
+        if closed and not self.finished and self.error is None:
+            self.error = self.connection.error or "the connection was closed"
+    def handle(self, message):
+        ''' Apply a message of the server '''
+        kind = message['type']
+        if kind in ('result', 'shot', 'end') and not self.started:
+            raise ProtocolError(f"{kind!r} message before the game started")
+        if kind == 'start':
+            self.peer = Player(str(message['opponent']))
+            self.users = [self.player, self.peer] if message['first'] else [self.peer, self.player]
+            self.user_1, self.user_2 = self.users
+        elif kind == 'result':
+            row, col, outcome = int(message['row']), int(message['col']), message['outcome']
+            if self.pending_shot != (row, col):
+                raise ProtocolError(f"result of a shot that was not fired at {row}, {col}")
+            self.latencies.append(perf_counter() - self.shot_sent)
+            self.pending_shot = None
+            self.player.num_of_tries += 1
+            if outcome == 'S':
+                for block_row, block_col in message['ship']:
+                    self.player.board.set_guess(int(block_row), int(block_col), 'S')
+            else:
+                self.player.board.set_guess(row, col, outcome)
+            self.end_turn()
+        elif kind == 'shot':
+            # The opponent's shot at the local fleet (only its count is shown)
+            self.peer.num_of_tries += 1
+            self.end_turn()
+        elif kind == 'end':
+            winner, loser = (self.player, self.peer) if message['won'] else (self.peer, self.player)
+            self.result = GameResult(winner, loser, self.users[0], self.num_of_turns)
+            self.reason = message['reason']
+        elif kind == 'error':
+            raise ProtocolError(message['reason'])
+        else:
+            raise ProtocolError(f"unknown message type {kind!r}")
+    def end_turn(self):
+        ''' Every valid shot passes the turn; the server tells when the game is over '''
+        self.num_of_turns += 1
+        self.user_1, self.user_2 = self.user_2, self.user_1
+    def close(self):
+        self.connection.close()
+
+class SpectatedGame():
+    '''A game watched on the online server, rebuilt from the keyframes and deltas it sends
+
+    Attributes:
+        game_id         Number of the game
+        names           Names of both players (the one who fired first comes first)
+        guesses         Guess states of both players (10x10 grids)
+        sunk            Ships sunk by each player, each a list of (row, col) blocks
+        turn            Number of shots applied
+        next            Index of the player who fires next
+        synced          False until the first keyframe, and after a delta has been missed
+        gaps            Number of times deltas have been missed (the server dropped them)
+        finished        True once the game is over
+        winner          Index of the winner (wire_protocol.NO_WINNER if nobody has won)
+        reason          Why the game is over
+
+    Methods:
+        apply           Applies a keyframe, delta or finished message of the game
+    '''
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.names = None
+        self.guesses = None
+        self.sunk = [[], []]
+        self.turn = 0
+        self.next = 0
+        self.synced = False
+        self.gaps = 0
+        self.finished = False
+        self.winner = None
+        self.reason = None
+    def apply(self, message):
+        ''' Input: keyframe, delta or finished message of the game
+
+        Output: True if the message has been applied (a delta is not while the game is out of
+                sync: the server sends a keyframe once the spectator has caught up)
+        '''
+        kind = message['type']
+        if kind == 'keyframe':
+            self.names = message['names']
+            self.guesses = message['guesses']
+            self.turn = message['turn']
+            self.next = message['next']
+            # The ships sunk so far are not in a keyframe; they can be told from the 'S' squares
+            self.sunk = [[], []]
+            self.synced = True
+        elif kind == 'delta':
+            if not self.synced or message['turn'] <= self.turn:
+                return False
+            if message['turn'] != self.turn + 1:
+                # Deltas were dropped: wait for the next keyframe
+                self.synced = False
+                self.gaps += 1
+                return False
+            player = message['player']
+            guesses = self.guesses[player]
+            for row, col, mark in message['cells']:
+                guesses[row][col] = mark
+            if message['sunk'] is not None:
+                self.sunk[player].append(message['sunk'])
+            self.turn += 1
+            self.next = 1 - player
+        elif kind == 'finished':
+            self.finished = True
+            self.winner = message['winner']
+            self.reason = message['reason']
+        else:
+            raise ProtocolError(f"unknown spectator message type {kind!r}")
+        return True
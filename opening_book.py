@@ -0,0 +1,193 @@
+'''
+Opening book of the CPU. The first shots of a game are fired knowing nothing about the enemy
+fleet but the outcome of the previous ones, so the best of them can be computed once, offline:
+this tool samples many uniform fleets (see fleet_placement), walks the tree of shots and
+outcomes (miss, hit, or hit that sinks a given ship) and keeps, for every position reached by
+enough fleets, the square holding a ship in most of them.
+
+The book is saved as an open-addressing hash table in a binary file, keyed by the Zobrist key of
+the position (transposition_class). The CPUs open it with mmap, so that looking up a position
+reads a couple of slots and nothing is loaded per process; when a position is not in the book
+(or there is no book file), they compute their shot as usual.
+
+Usage:
+    python opening_book.py --fleets 200000 --depth 12 --output opening_book.bin
+'''
+
+import argparse
+import mmap
+import os
+import struct
+from time import perf_counter
+
+import numpy as np
+
+from bitboard_class import NEIGHBOUR_MASKS, mask_to_coords
+from fleet_placement import default_fleet, fleet_ship_at, uniform_fleets
+from transposition_class import zobrist_hash
+
+# Book file used by the CPUs (another book can be used by changing it)
+book_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'opening_book.bin')
+# File layout: header, then the slots of the hash table
+book_magic = b'BSOB'
+book_version = 1
+header_format = struct.Struct('<4sHHII') # magic, version, depth, entries, slots
+slot_format = struct.Struct('<QB')      # Zobrist key (0: empty slot), square (row*10 + col)
+# Positions reached by fewer sampled fleets than this are left to the live computation
+default_min_fleets = 1000
+# Books opened by this process: {path: OpeningBook or None if there is no such file}
+_books = {}
+
+class OpeningBook():
+    '''Read-only opening book, memory-mapped from its file
+
+    Attributes:
+        path            Path of the book file
+        depth           Most shots of the positions in the book
+        entries         Number of positions in the book
+        slots           Number of slots of the hash table (a power of 2)
+        data            mmap of the file
+
+    Methods:
+        lookup          Square to fire at in a position, None if it is not in the book
+        close           Unmaps the file
+    '''
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as book_file:
+            self.data = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.depth, self.entries, self.slots = header_format.unpack_from(self.data, 0)
+        if magic != book_magic or version != book_version:
+            self.data.close()
+            raise ValueError(f"{path} is not an opening book of version {book_version}")
+        self.mask = self.slots - 1
+    def __len__(self):
+        return self.entries
+    def lookup(self, key):
+        ''' Input: Zobrist key of the position
+
+        Output: (row, col), or None if the position is not in the book
+        '''
+        slot = key & self.mask
+        while True:
+            slot_key, square = slot_format.unpack_from(self.data, header_format.size + slot*slot_format.size)
+            if slot_key == key:
+                return divmod(square, 10)
+            if slot_key == 0:
+                return None
+            # Linear probing
+            slot = (slot + 1) & self.mask
+    def close(self):
+        self.data.close()
+
+# FUNCTIONS
+
+def opening_book(path=None):
+    ''' Book shared by every CPU of this process, opened the first time it is needed
+
+    Input: path of the book file (default: book_path)
+
+    Output: OpeningBook instance, or None if there is no book file
+    '''
+    path = book_path if path is None else path
+    if path not in _books:
+        _books[path] = OpeningBook(path) if os.path.exists(path) else None
+    return _books[path]
+
+def build_book(num_fleets, depth, min_fleets=default_min_fleets, ship_lengths=default_fleet, seed=None):
+    ''' Walk the tree of shots and outcomes over sampled uniform fleets; in every position reached
+    by at least min_fleets of them (and fewer than 'depth' shots), fire at the square holding a
+    ship in most of them (the lowest square among ties, so that builds are reproducible)
+
+    Input: number of fleets to sample, most shots of a book position, fewest fleets of a book
+           position, ship lengths, seed of the sampler
+
+    Output: {Zobrist key: row*10 + col}
+    '''
+    # Number of the ship on each square of every fleet (-1 for water)
+    ship_at = fleet_ship_at(uniform_fleets(num_fleets, ship_lengths, seed=seed), ship_lengths)
+    lengths = np.array(ship_lengths)
+
+    book = {}
+    # Positions to expand: (indices of the fleets that reach them, guess_state, discarded squares,
+    # lengths of the ships afloat, squares fired upon)
+    stack = [(np.arange(num_fleets), [[' ']*10 for _ in range(10)], set(), list(ship_lengths), [])]
+    while stack:
+        fleet_nums, guess_state, discarded, remaining, fired = stack.pop()
+        if len(fleet_nums) < min_fleets or len(fired) >= depth or not remaining:
+            continue
+        ships = ship_at[fleet_nums]
+        counts = (ships >= 0).sum(axis=0)
+        for square in fired:
+            counts[square] = -1
+        for row, col in discarded:
+            counts[row*10 + col] = -1
+        square = int(counts.argmax())
+        book[zobrist_hash(guess_state, discarded, remaining)] = square
+        row, col = divmod(square, 10)
+
+        # Miss
+        missed = fleet_nums[ships[:, square] < 0]
+        child_state = [list(guess_row) for guess_row in guess_state]
+        child_state[row][col] = 'M'
+        stack.append((missed, child_state, discarded, remaining, fired + [square]))
+        # Hits: the ship is sunk once every one of its squares has been fired upon
+        hit = ships[:, square] >= 0
+        hit_nums, hit_ships = fleet_nums[hit], ships[hit]
+        ship_nums = hit_ships[:, square]
+        squares = np.array(fired + [square])
+        on_ship = hit_ships[:, squares] == ship_nums[:, None]
+        sunk = on_ship.sum(axis=1) == lengths[ship_nums]
+        child_state = [list(guess_row) for guess_row in guess_state]
+        child_state[row][col] = 'X'
+        stack.append((hit_nums[~sunk], child_state, discarded, remaining, fired + [square]))
+        # A sunk ship is revealed: one position per set of squares it can cover
+        patterns, inverse = np.unique(on_ship[sunk], axis=0, return_inverse=True)
+        for pattern_num, pattern in enumerate(patterns):
+            child_state = [list(guess_row) for guess_row in guess_state]
+            child_discarded = set(discarded)
+            for sunk_square in squares[pattern]:
+                sunk_row, sunk_col = divmod(int(sunk_square), 10)
+                child_state[sunk_row][sunk_col] = 'S'
+                # Same squares as the ones the CPU discards in shot_outcome
+                child_discarded.update(mask_to_coords(NEIGHBOUR_MASKS[sunk_square]))
+            child_remaining = list(remaining)
+            child_remaining.remove(int(pattern.sum()))
+            stack.append((hit_nums[sunk][inverse.ravel() == pattern_num], child_state, child_discarded,
+                          child_remaining, fired + [square]))
+    return book
+
+def write_book(book, path, depth):
+    ''' Save a book as a hash table with at most half of its slots in use
+
+    Input: {Zobrist key: square}, path, most shots of a book position
+
+    Output: size of the file in bytes
+    '''
+    slots = 1
+    while slots < 2*len(book):
+        slots *= 2
+    table = bytearray(header_format.size + slots*slot_format.size)
+    header_format.pack_into(table, 0, book_magic, book_version, depth, len(book), slots)
+    for key, square in book.items():
+        slot = key & (slots - 1)
+        while slot_format.unpack_from(table, header_format.size + slot*slot_format.size)[0] != 0:
+            slot = (slot + 1) & (slots - 1)
+        slot_format.pack_into(table, header_format.size + slot*slot_format.size, key, square)
+    with open(path, 'wb') as book_file:
+        book_file.write(table)
+    return len(table)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the CPU's opening book")
+    parser.add_argument('--fleets', type=int, default=200000, help="number of uniform fleets to sample")
+    parser.add_argument('--depth', type=int, default=12, help="most shots of a book position")
+    parser.add_argument('--min-fleets', type=int, default=default_min_fleets, help="fewest fleets of a book position")
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--output', default=book_path)
+    args = parser.parse_args()
+
+    start = perf_counter()
+    book = build_book(args.fleets, args.depth, args.min_fleets, seed=args.seed)
+    size = write_book(book, args.output, args.depth)
+    print(f"{len(book)} positions, {size} bytes written to {args.output} in {perf_counter() - start:.1f}s")
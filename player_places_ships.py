@@ -16,6 +16,9 @@ from string import ascii_uppercase
 from board_class import Ship, BoardState
 from cpu_class import CPU
 from player_class import Player
+from render_cache import empty_board, render_text
+from display_class import Display
+from scheduler_class import Scheduler
 
 # GLOBAL VARIABLES
 board_width = board_height = 512 # Board's sizes
@@ -30,6 +33,9 @@ number_dict = {index: index+1 for index in range(dimension)}
 
 # Load background picture
 background = game.image.load(os.path.join("img", "background3.jpg"))
+# Font of the ship counts below the board
+game.font.init()
+count_font = game.font.SysFont('Cambria',25)
 
 def ship_placing(name):
 	''' Main function of the module
@@ -49,6 +55,9 @@ def ship_placing(name):
 	screen = game.display.set_mode((width, height))
 	# Limit the number of events to improve efficiency
 	game.event.set_allowed([game.QUIT, game.MOUSEBUTTONDOWN, game.MOUSEBUTTONUP, game.MOUSEMOTION, game.KEYDOWN])
+	# Only the regions of the window that change are sent to the display
+	display = Display(screen, "placement")
+	scheduler = Scheduler(display)
 
 	# Sets up the 'Ready' button, which is displayed only after all ships have been
 	# preliminarly placed on the board.
@@ -78,8 +87,6 @@ def ship_placing(name):
 				# Creates a Ship instance corresponding to a ship on the board
 				ship_dimensions = {ship_rect.width // sq_size, ship_rect.height // sq_size}
 				ship_instance = Ship(max(ship_dimensions))
-				# Store the created Ship instance
-				player.board.placed_ships.append(ship_instance)
 				topleft_x, topleft_y = ship_rect.topleft
 				# Place an 'X' wherever a ship's block is present on the board
 				first_square = mouse_on_square(topleft_x, topleft_y)
@@ -94,6 +101,8 @@ def ship_placing(name):
 						row += 1
 				if (ship_rect.height // sq_size) < (ship_rect.width // sq_size):
 					ship_instance.vertical = False # Ship is horizontal; updates the 'vertical' attribute
+				# Store the created Ship instance and index its blocks
+				player.board.add_ship(ship_instance)
 			
 			# Break the enclosing loop; all the ships have been placed		
 			player.placing_ships = False
@@ -102,26 +111,14 @@ def ship_placing(name):
 		# To be updated every frame
 		player.board.state = [[" "]*10,[" "]*10,[" "]*10,[" "]*10,[" "]*10,
                       			[" "]*10,[" "]*10,[" "]*10,[" "]*10,[" "]*10]
-        # Display background
-		screen.blit(background, (0, 0))
+		events = scheduler.events()
 		# Create a rectangle with the board's dimensions
 		blank_board = game.Rect(0, 0,board_width, board_height)
 
-		# 'Ready?' button - appears only when the 10 ships have been placed on the board
-		if len(placed_ships_surroundings) == 10:
-			if not mouse_on_ready_button:
-				ready_text = button_font.render('Ready!', False, (255, 255, 255))
-				game.draw.rect(screen, (0, 165, 208), ready_button)
-				screen.blit(ready_text, (540+sq_size*0.4, 200+sq_size*0.43))
-			else:
-				ready_text = button_font.render('Ready!', False, (0, 165, 208))
-				game.draw.rect(screen, (255, 255, 255), ready_button)
-				screen.blit(ready_text, (540+sq_size*0.4, 200+sq_size*0.43))
-
 		mouse_x, mouse_y = game.mouse.get_pos()
 		
 		# EVENT HANDLING
-		for e in game.event.get():
+		for e in events:
 			if e.type == game.QUIT:
 				player.placing_ships = False
 			if e.type == game.MOUSEBUTTONDOWN:
@@ -223,10 +220,6 @@ def ship_placing(name):
 		# Place an 'X' on the user's board wherever there is a ship's block on the board
 		detect_ships_on_board(player)
 
-		# Print a grey bar below the board, where the ships are displaced, if not all have been placed
-		if len(placed_ships_surroundings) < 10:
-			game.draw.rect(screen, (64,65,66), game.Rect(0*sq_size, 10*sq_size, width, height-10*sq_size))
-
 		# Execute only once; create every ship's rectangle, place them below the board for display, and
 		# store their data in the relevant lists
 		if len(dragging_states) < 10:
@@ -265,9 +258,6 @@ def ship_placing(name):
 				# of the ships more easily
 				original_list_of_ships = deepcopy(list_of_ships)
 
-		# Display the board
-		draw_board(screen, colors, square_list, letter_dict, number_dict, square_font)
-
 		mouse_x, mouse_y = game.mouse.get_pos()
 		# Create tiny invisible square around the mouse so we can use collidelist instead
 		# of collidepoint inside a 'for' loop
@@ -276,23 +266,64 @@ def ship_placing(name):
 		col = mouse_on_square(mouse_x, mouse_y)[1]
 		# Highlight the square the mouse is on as long as it does not collide with a ship or
 		# a ship is being dragged. Note: further conditions inside the highlight_square func
+		highlighted = None
 		if row < 10 and col < 10:
 			collide_indx = tiny_sq_around_mouse.collidelist(list_of_ships)
-			if collide_indx == -1:
-				highlight_square(screen, colors, mouse_x, mouse_y, placed_ships_surroundings, letter_dict, number_dict, square_font)
-			elif not dragging_states[collide_indx]:
+			if collide_indx == -1 or not dragging_states[collide_indx]:
+				highlighted = (row, col)
+
+		# Find out what changed since the last frame: the ships and their surroundings, the
+		# highlighted square, the 'Ready' button and the grey bar below the board
+		for i in range(10):
+			ship = list_of_ships[i]
+			display.track(("ship", i), tuple(ship), ship.inflate(sq_size*2, sq_size*2))
+			surroundings = surroundings_list[i]
+			if type(surroundings) != str:
+				display.track(("surroundings", i), tuple(surroundings), surroundings)
+			else:
+				display.track(("surroundings", i), None)
+		if highlighted:
+			display.track("highlight", highlighted, game.Rect(col*sq_size, row*sq_size, sq_size+4, sq_size+4))
+		else:
+			display.track("highlight", None)
+		display.track("ready", (len(placed_ships_surroundings) == 10, mouse_on_ready_button), ready_button)
+		display.track("bar", len(placed_ships_surroundings) < 10, game.Rect(0*sq_size, 10*sq_size, width, height-10*sq_size))
+
+		if display.needs_redraw():
+			# Display background
+			screen.blit(background, (0, 0))
+
+			# 'Ready?' button - appears only when the 10 ships have been placed on the board
+			if len(placed_ships_surroundings) == 10:
+				if not mouse_on_ready_button:
+					ready_text = render_text(button_font, 'Ready!', (255, 255, 255))
+					game.draw.rect(screen, (0, 165, 208), ready_button)
+					screen.blit(ready_text, (540+sq_size*0.4, 200+sq_size*0.43))
+				else:
+					ready_text = render_text(button_font, 'Ready!', (0, 165, 208))
+					game.draw.rect(screen, (255, 255, 255), ready_button)
+					screen.blit(ready_text, (540+sq_size*0.4, 200+sq_size*0.43))
+
+			# Print a grey bar below the board, where the ships are displaced, if not all have been placed
+			if len(placed_ships_surroundings) < 10:
+				game.draw.rect(screen, (64,65,66), game.Rect(0*sq_size, 10*sq_size, width, height-10*sq_size))
+
+			# Display the board
+			draw_board(screen, colors, square_list, letter_dict, number_dict, square_font)
+
+			if highlighted:
 				highlight_square(screen, colors, mouse_x, mouse_y, placed_ships_surroundings, letter_dict, number_dict, square_font)
 
-		# Display a count of the ships yet to be placed
-		show_available_ships(screen, list_of_ships, original_list_of_ships, coords_unplaced_ships, index_dict)
-		# Draw all ships and their surroundings -- Note: surroundings on top of background pic, will fix later
-		for surroundings in surroundings_list:
-			if type(surroundings) != str:
-				game.draw.rect(screen, (59, 174, 254), surroundings)
-		for ship in list_of_ships:
-			game.draw.rect(screen, (111,67,42), ship)
+			# Display a count of the ships yet to be placed
+			show_available_ships(screen, list_of_ships, original_list_of_ships, coords_unplaced_ships, index_dict)
+			# Draw all ships and their surroundings -- Note: surroundings on top of background pic, will fix later
+			for surroundings in surroundings_list:
+				if type(surroundings) != str:
+					game.draw.rect(screen, (59, 174, 254), surroundings)
+			for ship in list_of_ships:
+				game.draw.rect(screen, (111,67,42), ship)
 
-		game.display.update()
+		display.flush()
 
 	return player
 
@@ -312,31 +343,14 @@ def collect_squares(square_list):
 	return square_list
 
 def draw_board(screen, colors, square_list, letter_dict, number_dict, square_font):
-	''' Draw all the squares in square_list
+	''' Draw all the squares in square_list. The board and its letters/numbers are drawn only once
+		and then reused every frame.
 
 	Input: screen, colors, square_list, letter_dict, number_dict, square_font
 
 	Output: None
 	'''
-	for square in square_list:
-		c = square.left // sq_size
-		r = square.top // sq_size
-		color = colors[((r+c)%2)]
-		game.draw.rect(screen, color, square)
-
-		# Choose color and letter corresponding to this row/column
-		text_color = colors[((r+c-1)%2)]
-		row_letter = letter_dict[r]
-		col_number = number_dict[c]
-
-		# Display on the board only for the squares in the first row or column
-		row_text = square_font.render(f'{row_letter}', False, text_color)
-		if c == 0:
-			screen.blit(row_text, (square.topleft[0]+2, square.topleft[1]))
-
-		col_text = square_font.render(f'{col_number}', False, text_color)
-		if r== 0:
-			screen.blit(col_text, (square.bottomright[0]-15, square.bottomright[1]-17.5))
+	screen.blit(empty_board(colors, sq_size, dimension, letter_dict, number_dict, square_font), (0, 0))
 
 def highlight_square(screen, colors, mouse_x, mouse_y, placed_ships_surroundings, letter_dict, number_dict, square_font):
 	''' Create a highlighting visual effect on the square of the board the mouse is over
@@ -355,8 +369,8 @@ def highlight_square(screen, colors, mouse_x, mouse_y, placed_ships_surroundings
 	row_letter = letter_dict[row]
 	col_number = number_dict[col]
 
-	row_text = square_font.render(f'{row_letter}', False, text_color)
-	col_text = square_font.render(f'{col_number}', False, text_color)
+	row_text = render_text(square_font, f'{row_letter}', text_color)
+	col_text = render_text(square_font, f'{col_number}', text_color)
 
 	# Draw the square unless a ship or its surrounding has already been drawn there
 	if square.collidelist(placed_ships_surroundings) == -1:
@@ -441,8 +455,7 @@ def show_available_ships(screen, list_of_ships, original_list_of_ships, coords_u
 	# Display the number next to the ship
 	for j in range(0,4):
 		if available_ships[j] > 0:
- 			count_font = game.font.SysFont('Cambria',25)
- 			ship_count = count_font.render(f'{available_ships[j]} x ', False, (0, 0, 0))
+ 			ship_count = render_text(count_font, f'{available_ships[j]} x ', (0, 0, 0))
  			coord_x, coord_y = coords_unplaced_ships[j]
  			screen.blit(ship_count,(coord_x - sq_size, coord_y+0.1*sq_size))
 
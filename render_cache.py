@@ -0,0 +1,119 @@
+'''
+Caches shared by the screens that draw the board: rendered text surfaces, the empty board with its
+coordinate labels, and one pre-drawn board per user that is only repainted where the user's guesses
+have changed since the last frame.
+'''
+
+import pygame as game
+
+# Rendered text surfaces, keyed by (font, text, color, antialias)
+text_cache = {}
+# Bound on the number of cached text surfaces (e.g. one per number of tries)
+max_cached_texts = 2048
+# Empty boards, keyed by their settings
+board_cache = {}
+
+# Colors of the squares that have been fired upon: (square color, text color)
+sunk_colors = (game.Color("black"), (255,255,255))
+hit_colors = (game.Color("green"), (255,255,255))
+discarded_colors = ((59, 174, 254), (59, 174, 254)) # Invisible text
+miss_colors = (game.Color("red"), (255,255,255))
+
+def render_text(font, text, color, antialias=False):
+	''' Same as font.render, but every surface is rendered only once
+
+	Input: font, text, color, antialias
+
+	Output: text surface (must not be modified)
+	'''
+	key = (font, text, tuple(color), antialias)
+	surface = text_cache.get(key)
+	if surface is None:
+		if len(text_cache) >= max_cached_texts:
+			text_cache.clear()
+		surface = text_cache[key] = font.render(text, antialias, color)
+	return surface
+
+def draw_square(surface, row, col, color, text_color, sq_size, letter_dict, number_dict, square_font):
+	''' Paint one square of the board, with its letter/number if it is in the first column/row
+
+	Input: surface, row, col, color, text_color, sq_size, letter_dict, number_dict, square_font
+
+	Output: None
+	'''
+	square = game.Rect(col*sq_size, row*sq_size, sq_size, sq_size)
+	game.draw.rect(surface, color, square)
+	# Display letter/number in first row/column
+	if col == 0:
+		row_text = render_text(square_font, f'{letter_dict[row]}', text_color)
+		surface.blit(row_text, (square.topleft[0]+2, square.topleft[1]))
+	if row == 0:
+		col_text = render_text(square_font, f'{number_dict[col]}', text_color)
+		surface.blit(col_text, (square.bottomright[0]-15, square.bottomright[1]-17.5))
+
+def empty_board(colors, sq_size, dimension, letter_dict, number_dict, square_font):
+	''' The checkerboard with its coordinate labels, drawn only once per set of settings
+
+	Input: colors, sq_size, dimension, letter_dict, number_dict, square_font
+
+	Output: board surface (must not be modified)
+	'''
+	key = (tuple(tuple(color) for color in colors), sq_size, dimension, square_font)
+	surface = board_cache.get(key)
+	if surface is None:
+		surface = board_cache[key] = game.Surface((sq_size*dimension, sq_size*dimension))
+		for row in range(dimension):
+			for col in range(dimension):
+				draw_square(surface, row, col, colors[((row+col)%2)], colors[((row+col-1)%2)], sq_size, letter_dict, number_dict, square_font)
+	return surface
+
+class BoardView():
+	''' A user's guessing board, kept pre-drawn between frames
+
+	Attributes:
+		surface		The drawn board
+		marks		What each square currently shows on the surface
+
+	Methods:
+		draw		Repaints the squares whose guess changed and blits the board
+	'''
+	def __init__(self, colors, sq_size, dimension, letter_dict, number_dict, square_font):
+		self.colors = colors
+		self.sq_size = sq_size
+		self.dimension = dimension
+		self.fonts = (letter_dict, number_dict, square_font)
+		self.surface = empty_board(colors, sq_size, dimension, *self.fonts).copy()
+		self.marks = [[" "]*dimension for _ in range(dimension)]
+
+	def draw(self, screen, guess_state, discarded_blocks):
+		''' Bring the board up to date with the user's guesses and display it
+
+		Input: screen, guess_state, discarded_blocks
+
+		Output: None
+		'''
+		for r in range(self.dimension):
+			guess_row = guess_state[r]
+			mark_row = self.marks[r]
+			for c in range(self.dimension):
+				mark = guess_row[c]
+				# Ship surroundings are shown on top of misses
+				if mark not in ("S", "X") and (r,c) in discarded_blocks:
+					mark = "D"
+				if mark != mark_row[c]:
+					mark_row[c] = mark
+					self.paint(r, c, mark)
+		screen.blit(self.surface, (0, 0))
+
+	def paint(self, r, c, mark):
+		if mark == "S":
+			color, text_color = sunk_colors
+		elif mark == "X":
+			color, text_color = hit_colors
+		elif mark == "D":
+			color, text_color = discarded_colors
+		elif mark == "M":
+			color, text_color = miss_colors
+		else:
+			color, text_color = self.colors[((r+c)%2)], self.colors[((r+c-1)%2)]
+		draw_square(self.surface, r, c, color, text_color, self.sq_size, *self.fonts)
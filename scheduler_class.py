@@ -0,0 +1,91 @@
+'''
+Contains the Scheduler class, the loop pacing shared by every screen: it caps the frame rate and,
+when nothing on the screen is animating, sleeps until input (or a timer event) arrives instead of
+spinning through empty frames.
+'''
+
+from time import perf_counter, process_time
+import pygame as game
+
+# Frame rate cap of every screen
+max_fps = 60
+# Loop statistics of every screen, filled by the Scheduler instances: {screen name: LoopStats}
+loop_stats = {}
+
+class LoopStats():
+	''' CPU use of one screen's loop
+
+	Attributes:
+		iterations		Number of loop iterations
+		wakeups			Iterations that started because of an event (or timeout) after sleeping
+		wall_seconds	Time spent in the loop
+		cpu_seconds		Processor time used by the process during that time
+	'''
+	def __init__(self):
+		self.iterations = 0
+		self.wakeups = 0
+		self.wall_seconds = 0.0
+		self.cpu_seconds = 0.0
+
+	def report(self, name):
+		wall = max(self.wall_seconds, 1e-9)
+		return (f"{name:<12} {self.iterations:>7} iterations ({self.iterations/wall:7.1f}/s), "
+				f"{self.wakeups:>6} wakeups, {self.cpu_seconds/wall:6.1%} CPU")
+
+class Scheduler():
+	''' Paces one screen's loop. A loop whose screen changes without input should say so
+		(animating=True, or Display.invalidate) so that the next frame does not wait for input.
+
+	Attributes:
+		display		Display instance of the screen (its frame starts once the events have arrived)
+		fps			Frame rate cap
+		clock		pygame Clock used for the cap
+		stats		LoopStats instance of the screen
+
+	Methods:
+		events		Waits for the next frame and returns its events
+	'''
+	def __init__(self, display, fps=None):
+		self.display = display
+		self.fps = fps or max_fps
+		self.clock = game.time.Clock()
+		self.stats = loop_stats.setdefault(display.name, LoopStats())
+		self.wall_start = perf_counter()
+		self.cpu_start = process_time()
+
+	def events(self, animating=False, timeout=None):
+		''' Wait for the next frame. The frame rate is capped; if nothing is animating, the loop
+			also sleeps until an event arrives or the timeout expires, whichever comes first.
+
+		Input: animating (True if the screen changes without input, e.g. during a CPU turn),
+			   timeout (seconds until something is due on the screen; None to wait for input only)
+
+		Output: list of events
+		'''
+		# Sleeps (rather than spins) for the rest of the frame
+		self.clock.tick(self.fps)
+		events = []
+		# Nothing to wait for if events are queued or the screen has pending changes
+		idle = not (animating or self.display.full or self.display.dirty)
+		if idle and not game.event.peek():
+			self.stats.wakeups += 1
+			if timeout is None:
+				event = game.event.wait()
+			else:
+				event = game.event.wait(max(int(timeout*1000), 1))
+			if event.type != game.NOEVENT:
+				events.append(event)
+		events.extend(game.event.get())
+
+		# Account for the time since the previous call
+		now, cpu_now = perf_counter(), process_time()
+		self.stats.iterations += 1
+		self.stats.wall_seconds += now - self.wall_start
+		self.stats.cpu_seconds += cpu_now - self.cpu_start
+		self.wall_start, self.cpu_start = now, cpu_now
+		self.display.start_frame()
+		return events
+
+def loop_report():
+	''' CPU use of every screen shown so far, one line per screen '''
+	return '\n'.join(stats.report(name) for name, stats in loop_stats.items())
@@ -0,0 +1,167 @@
+'''
+Anytime search API for CPU strategies. A strategy receives a Position (what the CPU knows: its
+guess_state, discarded_blocks and the enemy ships still afloat), refines its answer one bounded
+step at a time and returns the best shot found when its deadline expires, so the strength of a
+CPU can be fitted to a latency budget. StrategyCPU plays the shots of any strategy.
+'''
+
+import random
+from time import perf_counter
+
+import numpy as np
+
+from cpu_class import CPU, HardCPU, cached_shot_density
+from transposition_class import zobrist_hash
+
+# Seconds a StrategyCPU thinks per shot unless told otherwise
+default_move_time = 0.05
+
+class Position():
+    '''Snapshot of what a CPU knows about the enemy board
+
+    Attributes:
+        guess_state         Tuple of 10 strings, one character per square (' ', 'M', 'X' or 'S')
+        discarded_blocks    Frozenset of the squares where no ship can be
+        remaining_ships     Sorted tuple of the lengths of the enemy ships still afloat
+        key                 Zobrist key of the position (see transposition_class)
+
+    Methods:
+        from_cpu            Builds the position of a CPU
+        hits                Squares hit that belong to ships still afloat
+        candidates          Squares that may still be fired upon
+    '''
+    def __init__(self, guess_state, discarded_blocks, remaining_ships, key=None):
+        self.guess_state = tuple(''.join(row) for row in guess_state)
+        self.discarded_blocks = frozenset(discarded_blocks)
+        self.remaining_ships = tuple(sorted(remaining_ships))
+        if key is None:
+            key = zobrist_hash(self.guess_state, self.discarded_blocks, self.remaining_ships)
+        self.key = key
+    @classmethod
+    def from_cpu(cls, cpu):
+        # The CPU keeps its key up to date shot by shot
+        return cls(cpu.board.guess_state, cpu.discarded_blocks, cpu.remaining_ship_lengths(), cpu.position_key())
+    def __eq__(self, other):
+        return (self.guess_state, self.discarded_blocks, self.remaining_ships) == \
+               (other.guess_state, other.discarded_blocks, other.remaining_ships)
+    def __hash__(self):
+        return self.key
+    def hits(self):
+        return [(row, col) for row in range(10) for col in range(10) if self.guess_state[row][col] == 'X']
+    def candidates(self):
+        return [(row, col) for row in range(10) for col in range(10)
+                if self.guess_state[row][col] == ' ' and (row, col) not in self.discarded_blocks]
+
+class Strategy():
+    '''Base class of the anytime strategies. Subclasses implement refine (and may override start)
+
+    Attributes:
+        position        Position being searched
+        best            Best shot found so far, None before the first step
+        done            True once refining further cannot change the answer
+        steps           Number of steps taken on the current position
+        deadline        Deadline of the current search (long steps may check it to stop early)
+        clock           Clock of the deadline
+        rng             random.Random instance of the current search (the CPU's, see StrategyCPU)
+
+    Methods:
+        start           Starts searching a new position
+        refine          Takes one bounded step of work, updating best (and done)
+        best_shot       Best shot found so far (a random candidate if there is none yet)
+        search          Refines until the deadline expires or the answer is final
+    '''
+    def __init__(self):
+        self.position = None
+        self.best = None
+        self.done = False
+        self.steps = 0
+        self.deadline = float('inf')
+        self.clock = perf_counter
+        self.rng = random.Random()
+    def start(self, position):
+        self.position = position
+        self.best = None
+        self.done = False
+        self.steps = 0
+    def refine(self):
+        raise NotImplementedError
+    def best_shot(self):
+        if self.best is None:
+            return self.rng.choice(self.position.candidates())
+        return self.best
+    def search(self, position, deadline, clock=perf_counter, rng=None):
+        ''' Search the position until the deadline; at least one step is always taken
+
+        Input: position, deadline (in clock's seconds), clock, random number generator (default:
+               the strategy's own)
+
+        Output: (row, col) of the best shot found
+        '''
+        self.deadline = deadline
+        self.clock = clock
+        if rng is not None:
+            self.rng = rng
+        self.start(position)
+        while not self.done:
+            self.refine()
+            self.steps += 1
+            if clock() >= deadline:
+                break
+        return self.best_shot()
+
+class DensityStrategy(Strategy):
+    '''The 'hard' CPU's placement counting as a strategy: a single step gives the final answer
+
+    Attributes:
+        hit_weight      Same as in HardCPU
+    '''
+    hit_weight = HardCPU.hit_weight
+    def refine(self):
+        position = self.position
+        density = cached_shot_density(position.key, position.guess_state, position.discarded_blocks,
+                                      list(position.remaining_ships), self.hit_weight)
+        best = density.max()
+        if best > 0:
+            self.best = divmod(int(self.rng.choice(np.flatnonzero(density == best))), 10)
+        self.done = True
+
+class StrategyCPU(CPU):
+    '''CPU that plays the shots of an anytime strategy within a time budget per shot
+
+    Attributes:
+        strategy        Strategy instance
+        move_time       Seconds the strategy may think per shot
+        use_opening_book    True: the opening book gives the first shots when there is one
+
+    Methods:
+        position        Position instance of the CPU
+        choose_shot     Asks the strategy for a shot before the deadline
+    '''
+    planning_attributes = ('available_squares', 'potential_locations', 'strategy')
+    use_opening_book = True
+    def __init__(self, strategy=None, move_time=None, rng=None):
+        super().__init__(rng)
+        self.strategy = strategy if strategy is not None else DensityStrategy()
+        self.move_time = default_move_time if move_time is None else move_time
+    def position(self):
+        return Position.from_cpu(self)
+    def choose_shot(self, deadline=None):
+        ''' Picks the shot of the opening book, or else of the strategy. The chosen square is
+        removed from available_squares.
+
+        Input: deadline (perf_counter() seconds; default: move_time from now)
+
+        Output: (row, col) of the shot
+        '''
+        shot = self.book_shot()
+        if shot is not None:
+            return shot
+        if deadline is None:
+            deadline = perf_counter() + self.move_time
+        row, col = self.strategy.search(self.position(), deadline, rng=self.rng)
+        if (row, col) in self.available_squares:
+            self.available_squares.remove((row, col))
+        # The strategy found nothing legal (should not happen in a fair game): shoot at random
+        else:
+            row, col = self.random_shot()
+        return (row, col)
@@ -0,0 +1,58 @@
+'''
+Tests of the background worker of the CPUs (ai_worker_class): the shots it hands back, on time
+or not, must leave the CPU able to play the rest of the game.
+'''
+
+import random
+import time
+
+from ai_worker_class import AIWorker
+from cpu_class import CPU, HardCPU
+from engine import Game
+
+class SlowCPU(CPU):
+    ''' CPU whose every other shot takes longer than any time budget '''
+    def choose_shot(self):
+        if self.num_of_tries % 2:
+            time.sleep(0.02)
+        return super().choose_shot()
+
+def play_with_workers(users, time_budget, rng):
+    ''' Play a whole game, every shot going through an AIWorker
+
+    Output: (game, workers)
+    '''
+    match = Game(users, rng=rng)
+    workers = {user: AIWorker(user, time_budget) for user in match.users}
+    while not match.finished:
+        worker = workers[match.user_1]
+        while not worker.ready():
+            time.sleep(0.001)
+        row, col = worker.collect()
+        assert match.fire(row, col), f"square {row}, {col} fired upon twice"
+    return match, workers
+
+def test_fallback_keeps_the_cpu_consistent():
+    # Timed out shots land on squares the CPU's own scan of a hit ship may still want
+    for seed in range(5):
+        users = [SlowCPU(rng=random.Random(seed)), SlowCPU(rng=random.Random(seed + 100))]
+        match, workers = play_with_workers(users, 0.0, random.Random(seed))
+        assert match.finished
+        assert sum(worker.fallbacks for worker in workers.values()) > 0
+
+def test_random_shots_between_planned_ones():
+    # Many games, a third of the shots random (as if the worker had run out of time)
+    for seed in range(300):
+        rng = random.Random(seed)
+        match = Game([CPU(rng=random.Random(seed)), HardCPU(rng=random.Random(seed + 1))], rng=rng)
+        while not match.finished:
+            user = match.user_1
+            row, col = user.random_shot() if rng.random() < 0.3 else user.choose_shot()
+            assert (row, col) not in user.available_squares
+            assert match.fire(row, col), f"square {row}, {col} fired upon twice"
+
+def test_answers_on_time_are_applied():
+    match, workers = play_with_workers([CPU(rng=random.Random(1)), CPU(rng=random.Random(2))], None,
+                                       random.Random(3))
+    assert match.finished
+    assert all(worker.fallbacks == 0 for worker in workers.values())
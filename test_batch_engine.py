@@ -0,0 +1,66 @@
+'''
+Tests of the batched lockstep engine (batch_engine): every game of a batch must play out exactly
+as it would through engine.shot_outcome.
+'''
+
+import numpy as np
+
+from batch_engine import BatchGames, guess_marks, hunt_target_shots, random_shots
+from cpu_class import CPU
+from engine import shot_outcome
+from fleet_placement import fleet_ships
+
+def sloppy_shots(batch, generator):
+    ''' Policy that fires one shot in ten at a random square, fired upon or not '''
+    return np.where(generator.random(batch.games) < 0.1, generator.integers(0, 100, batch.games),
+                    hunt_target_shots(batch, generator))
+
+def replay(batch, history, game):
+    ''' Replay the shots of a game of the batch through shot_outcome with CPU instances
+
+    Output: (users, number of turns, winning side or -1)
+    '''
+    users = []
+    for side in range(2):
+        user = CPU()
+        for ship in fleet_ships(batch.fleets[game, side].tolist()):
+            for row, col in ship.locations:
+                user.board.state[row][col] = 'X'
+            user.board.add_ship(ship)
+        user.init_available_squares()
+        users.append(user)
+    turn, turns, winner = int(batch.first_player[game]), 0, -1
+    for squares in history:
+        if squares[game] < 0:
+            break
+        row, col = divmod(int(squares[game]), 10)
+        if shot_outcome(users[turn], users[1 - turn], row, col):
+            turns += 1
+            if len(users[1 - turn].board.sunk_ships) == len(users[1 - turn].board.placed_ships):
+                winner = turn
+                break
+            turn = 1 - turn
+    return users, turns, winner
+
+def test_batch_matches_shot_outcome():
+    batch = BatchGames.random(300, seed=1)
+    history = batch.play(sloppy_shots, np.random.default_rng(2), record=True)
+    for game in range(batch.games):
+        users, turns, winner = replay(batch, history, game)
+        for side, user in enumerate(users):
+            guess_state = [[guess_marks[code] for code in batch.guess[game, side, row*10:row*10 + 10]] for row in range(10)]
+            discarded = {divmod(int(square), 10) for square in np.flatnonzero(batch.discarded[game, side])}
+            assert guess_state == user.board.guess_state, f"game {game}: guess states differ"
+            assert discarded == user.discarded_blocks, f"game {game}: discarded squares differ"
+            assert batch.tries[game, side] == user.num_of_tries, f"game {game}: tries differ"
+        assert (batch.num_of_turns[game], batch.winner[game]) == (turns, winner), f"game {game}: results differ"
+
+def test_every_game_finishes():
+    for policy in (random_shots, hunt_target_shots):
+        batch = BatchGames.random(200, seed=3)
+        batch.play(policy, np.random.default_rng(4))
+        assert not batch.active().any()
+        assert ((batch.winner == 0) | (batch.winner == 1)).all()
+        # The winner sank all the ships of the loser, and the loser did not sink all of theirs
+        assert (batch.remaining[np.arange(batch.games), 1 - batch.winner] == 0).all()
+        assert (batch.remaining[np.arange(batch.games), batch.winner] > 0).all()
@@ -0,0 +1,48 @@
+'''
+Tests of the bitmask board backend (bitboard_class): the discarded mask of a CPU playing on a
+BitBoardState must match its discarded blocks, and both the squares around the ships it sank.
+'''
+
+import random
+
+from bitboard_class import PLACEMENT_MASKS, BitBoardState, coords_to_mask
+from board_class import BoardState
+from cpu_class import CPU
+from engine import Game
+
+def play(seed):
+    ''' Play a CPU game on bitboards, checking the discarded mask after every shot
+
+    Output: users
+    '''
+    users = [CPU(rng=random.Random(seed)), CPU(rng=random.Random(seed + 1))]
+    match = Game(users, BitBoardState, rng=random.Random(seed))
+    while not match.finished:
+        user = match.user_1
+        row, col = user.choose_shot()
+        assert match.fire(row, col), f"square {row}, {col} fired upon twice"
+        assert user.board.discarded == coords_to_mask(user.discarded_blocks)
+    return users
+
+def test_discarded_mask_surrounds_the_sunk_ships():
+    list_board = BoardState()
+    for seed in range(30):
+        users = play(seed)
+        for user, opponent in (users, users[::-1]):
+            surroundings = set()
+            for ship in opponent.board.sunk_ships:
+                for row, col in ship.locations:
+                    surroundings |= list_board.get_surroundings(row, col)
+            assert user.discarded_blocks == surroundings
+            assert user.board.discarded == coords_to_mask(surroundings)
+
+def test_can_hold_follows_the_guesses():
+    users = play(100)
+    for user in users:
+        board = user.board
+        guess_state = board.guess_state.to_lists()
+        for length, row, col, vertical in PLACEMENT_MASKS:
+            blocks = [(row + block*vertical, col + block*(not vertical)) for block in range(length)]
+            expected = all(guess_state[block_row][block_col] not in ('M', 'S') and (block_row, block_col) not in user.discarded_blocks
+                           for block_row, block_col in blocks)
+            assert board.can_hold(length, row, col, vertical) == expected
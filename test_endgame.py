@@ -0,0 +1,48 @@
+'''
+Tests of the exact endgame solver (endgame_class) and of its hand-off from the Monte Carlo
+strategy.
+'''
+
+from time import perf_counter
+
+import endgame_class
+import monte_carlo_class
+from endgame_class import EndgameStrategy
+from monte_carlo_class import MonteCarloStrategy
+from strategy_class import Position
+
+def open_position(remaining_ships, empty):
+    ''' Output: Position where every square is a miss but the empty ones '''
+    guess_state = [['M']*10 for _ in range(10)]
+    for row, col in empty:
+        guess_state[row][col] = ' '
+    return Position(guess_state, (), remaining_ships)
+
+def test_setup_is_built_once_per_shot(monkeypatch):
+    built = []
+    class CountingSetup(monte_carlo_class.MonteCarloSetup):
+        def __init__(self, position):
+            built.append(position)
+            super().__init__(position)
+    monkeypatch.setattr(endgame_class, 'MonteCarloSetup', CountingSetup)
+    monkeypatch.setattr(monte_carlo_class, 'MonteCarloSetup', CountingSetup)
+    strategy = EndgameStrategy(MonteCarloStrategy(max_samples=512))
+    # Far too many arrangements for the solver: the Monte Carlo strategy plays
+    position = Position([[' ']*10 for _ in range(10)], (), (1, 1, 1, 1, 2, 2, 2, 3, 3, 4))
+    strategy.search(position, perf_counter() + 1.0)
+    assert strategy.layouts is None
+    assert built == [position]
+
+def test_memo_is_dropped_once_a_ship_sinks():
+    strategy = EndgameStrategy()
+    corners = [(0, 0), (0, 9), (9, 0), (9, 9), (5, 5)]
+    strategy.search(open_position((1, 1), corners), perf_counter() + 1.0)
+    assert len(strategy.layouts) == 10
+    solved = len(strategy.solver.memo)
+    assert solved > 0
+    # Same ships afloat, one square less: the states already solved are kept
+    strategy.search(open_position((1, 1), corners[1:]), perf_counter() + 1.0)
+    assert len(strategy.solver.memo) >= solved
+    # A ship has sunk: the memo starts over
+    strategy.start(open_position((1,), corners[2:]))
+    assert strategy.solver.memo == {}
@@ -0,0 +1,165 @@
+'''
+Tests of the online game server (game_server): games between clients connected over loopback to a
+GameServer running in the test's event loop.
+'''
+
+import asyncio
+import gc
+import random
+
+from cpu_class import CPU
+from engine import Game
+from fleet_placement import fleet_ships, uniform_fleets
+from game_server import Broadcast, GameServer, ServerConnection
+from online_class import SpectatedGame
+from wire_protocol import encode_message, protocol_version, split_messages
+
+# Modules of the objects of a game on the server
+game_modules = ('game_server', 'engine', 'player_class', 'board_class', 'timer_wheel_class')
+
+class TestPlayer(asyncio.Protocol):
+    '''A client that joins with a fleet and fires at random squares, leaving after a given number
+    of shots (None: never)
+
+    Attributes:
+        messages        Messages received
+        done            Future set once the connection is closed
+    '''
+    __test__ = False
+    def __init__(self, fleet, rng, leave_after=None):
+        self.fleet = fleet
+        self.squares = [(row, col) for row in range(10) for col in range(10)]
+        rng.shuffle(self.squares)
+        self.leave_after = leave_after
+        self.buffer = bytearray()
+        self.messages = []
+        self.transport = None
+        self.done = asyncio.get_running_loop().create_future()
+    def connection_made(self, transport):
+        self.transport = transport
+        transport.write(encode_message({'type': 'join', 'version': protocol_version, 'name': 'test', 'fleet': self.fleet}))
+    def data_received(self, data):
+        self.buffer += data
+        for message in split_messages(self.buffer):
+            self.messages.append(message)
+            # The turns alternate: a player fires first, or after each shot of the opponent
+            if message['type'] == 'shot' or (message['type'] == 'start' and message['first']):
+                self.fire()
+    def fire(self):
+        if self.leave_after is not None and len(self.squares) <= 100 - self.leave_after:
+            self.transport.close()
+            return
+        row, col = self.squares.pop()
+        self.transport.write(encode_message({'type': 'shot', 'row': row, 'col': col}))
+    def connection_lost(self, exc):
+        self.done.set_result(None)
+
+class RecordingTransport():
+    ''' Transport of a spectator that keeps what is written to it '''
+    def __init__(self):
+        self.data = bytearray()
+    def is_closing(self):
+        return False
+    def write(self, data):
+        self.data += data
+
+async def play_games(server, games, seed, leave_after=None):
+    ''' Play games against a server one after the other
+
+    Output: list of the (first, second) players of every game
+    '''
+    rng = random.Random(seed)
+    fleets = iter(uniform_fleets(2*games, seed=seed))
+    loop = asyncio.get_running_loop()
+    ready = loop.create_future()
+    stop = asyncio.Event()
+    serving = loop.create_task(server.serve('127.0.0.1', 0, ready.set_result, stop))
+    address = await ready
+    played = []
+    try:
+        for _ in range(games):
+            pair = []
+            for leave in (leave_after, None):
+                fleet = [[list(block) for block in ship.locations] for ship in fleet_ships(next(fleets))]
+                player = TestPlayer(fleet, rng, leave)
+                await loop.create_connection(lambda: player, *address)
+                pair.append(player)
+            await asyncio.gather(*(player.done for player in pair))
+            played.append(pair)
+    finally:
+        stop.set()
+        await serving
+    return played
+
+def test_games_are_played_to_the_end():
+    server = GameServer(random.Random(1))
+    for pair in asyncio.run(play_games(server, 20, 1)):
+        ends = [player.messages[-1] for player in pair]
+        assert [end['type'] for end in ends] == ['end', 'end']
+        assert sorted(end['won'] for end in ends) == [False, True]
+        assert ends[0]['reason'] == "the whole fleet has been sunk"
+        # Each player is told of every shot of the other, with the outcome the shooter got
+        for shooter, target in (pair, pair[::-1]):
+            results = [(message['row'], message['col'], message['outcome']) for message in shooter.messages
+                       if message['type'] == 'result']
+            shots = [(message['row'], message['col'], message['outcome']) for message in target.messages
+                     if message['type'] == 'shot']
+            assert results == shots
+    assert (server.games, server.games_finished) == (0, 20)
+
+def test_finished_games_leave_no_garbage():
+    # Games are freed by reference counting alone (see game_server.settle_gc), whether they are
+    # played to the end or a player leaves; asyncio's transports are left to the collector
+    async def play():
+        server = GameServer(random.Random(2))
+        await play_games(server, 1, 2)
+        gc.collect()
+        gc.set_debug(gc.DEBUG_SAVEALL)
+        try:
+            await play_games(server, 10, 3)
+            await play_games(server, 10, 4, leave_after=5)
+            gc.collect()
+            return [type(item).__name__ for item in gc.garbage if type(item).__module__ in game_modules]
+        finally:
+            gc.set_debug(0)
+            gc.garbage.clear()
+    assert asyncio.run(play()) == []
+
+def test_spectators_rebuild_the_game():
+    async def watch(seed):
+        match = Game([CPU(rng=random.Random(seed)), CPU(rng=random.Random(seed + 1))], rng=random.Random(seed))
+        for num, user in enumerate(match.users):
+            user.name = f"CPU {num + 1}"
+        broadcast = Broadcast(seed, match)
+        watchers = []
+        # Spectators from the start, and from the middle of the game
+        for joins_at in (0, 0, 30, 60):
+            watcher = ServerConnection(None)
+            watcher.transport = RecordingTransport()
+            watchers.append((joins_at, watcher))
+        while not match.finished:
+            for joins_at, watcher in watchers:
+                if joins_at == match.num_of_turns:
+                    broadcast.subscribe(watcher)
+            # Keyframes are sent in the next loop iteration
+            await asyncio.sleep(0)
+            shooter, opponent = match.user_1, match.user_2
+            row, col = shooter.choose_shot()
+            match.fire(row, col)
+            sunk = None
+            if shooter.board.guess_state[row][col] == 'S':
+                sunk = opponent.board.placed_ships[opponent.board.ship_at[row][col]].locations
+            broadcast.publish(shooter, row, col, sunk)
+        broadcast.finish(match.users.index(match.result.winner), "the whole fleet has been sunk")
+        await asyncio.sleep(0)
+        return match, [watcher for _, watcher in watchers]
+    for seed in range(20):
+        match, watchers = asyncio.run(watch(seed))
+        for watcher in watchers:
+            game = SpectatedGame(seed)
+            for message in split_messages(watcher.transport.data):
+                game.apply(message)
+            assert game.turn == match.num_of_turns
+            assert game.guesses == [user.board.guess_state for user in match.users]
+            assert game.names == [user.name for user in match.users]
+            assert game.finished and game.winner == match.users.index(match.result.winner)
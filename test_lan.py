@@ -0,0 +1,124 @@
+'''
+Tests of the LAN mode (lan_class): the fleet commitment made before the first shot, its check once
+the fleets are revealed, and whole games between two LanMatch instances on loopback.
+'''
+
+import random
+import secrets
+from threading import Thread
+
+import pytest
+
+from conftest import cpu_player
+from lan_class import LanConnection, LanMatch, check_reveal, fleet_blocks, fleet_commitment, legal_fleet
+from player_class import Player
+
+def random_fleet(seed):
+    ''' Output: legal fleet (see fleet_blocks) of a CPU placement '''
+    return fleet_blocks(cpu_player('', seed).board)
+
+def honest_answers(fleet, seed):
+    ''' Answers to shots at every square of the board, in a random order, as the fleet's owner
+    gives them: (row, col, outcome, sunk ship blocks or None) '''
+    ship_of = {(row, col): tuple(map(tuple, ship)) for ship in fleet for row, col in ship}
+    squares = [(row, col) for row in range(10) for col in range(10)]
+    random.Random(seed).shuffle(squares)
+    fired = set()
+    answers = []
+    for row, col in squares:
+        fired.add((row, col))
+        ship = ship_of.get((row, col))
+        if ship is None:
+            answers.append((row, col, 'M', None))
+        elif set(ship) <= fired:
+            answers.append((row, col, 'S', list(ship)))
+        else:
+            answers.append((row, col, 'X', None))
+    return answers
+
+def test_commitment_binds_fleet_and_nonce():
+    fleet, nonce = random_fleet(1), secrets.token_hex(16)
+    commitment = fleet_commitment(fleet, nonce)
+    assert commitment == fleet_commitment([list(map(list, ship)) for ship in fleet], nonce)
+    assert commitment != fleet_commitment(fleet, secrets.token_hex(16))
+    assert commitment != fleet_commitment(random_fleet(2), nonce)
+
+def test_honest_reveal_is_accepted():
+    for seed in range(20):
+        fleet, nonce = random_fleet(seed), secrets.token_hex(16)
+        # The revealed fleet may list its ships and blocks in any order
+        shuffled = [list(reversed(ship)) for ship in reversed(fleet)]
+        assert check_reveal(shuffled, nonce, fleet_commitment(fleet, nonce), honest_answers(fleet, seed))
+
+def test_dishonest_reveals_are_rejected():
+    fleet, nonce = random_fleet(3), secrets.token_hex(16)
+    commitment = fleet_commitment(fleet, nonce)
+    answers = honest_answers(fleet, 3)
+    # Another fleet, or the same one with another nonce
+    other = random_fleet(4)
+    assert not check_reveal(other, nonce, commitment, answers)
+    assert not check_reveal(fleet, secrets.token_hex(16), commitment, answers)
+    # A hit answered as a miss, and the other way round
+    hit = next(num for num, answer in enumerate(answers) if answer[2] == 'X')
+    lie = list(answers)
+    lie[hit] = (*answers[hit][:2], 'M', None)
+    assert not check_reveal(fleet, nonce, commitment, lie)
+    miss = next(num for num, answer in enumerate(answers) if answer[2] == 'M')
+    lie = list(answers)
+    lie[miss] = (*answers[miss][:2], 'X', None)
+    assert not check_reveal(fleet, nonce, commitment, lie)
+    # A ship sunk before its last block was hit, or never reported sunk
+    lie = list(answers)
+    lie[hit] = (*answers[hit][:2], 'S', [answers[hit][:2]])
+    assert not check_reveal(fleet, nonce, commitment, lie)
+    sunk = next(num for num, answer in enumerate(answers) if answer[2] == 'S')
+    lie = list(answers)
+    lie[sunk] = (*answers[sunk][:2], 'X', None)
+    assert not check_reveal(fleet, nonce, commitment, lie)
+
+def test_illegal_fleets():
+    fleet = random_fleet(5)
+    assert legal_fleet(fleet)
+    # A missing ship, a bent ship, a ship off the board and two ships that touch
+    assert not legal_fleet(fleet[1:])
+    four = next(num for num, ship in enumerate(fleet) if len(ship) == 4)
+    bent = list(fleet)
+    bent[four] = [[0, 0], [0, 1], [1, 1], [1, 2]]
+    assert not legal_fleet(bent)
+    off = [[[row + 10, col] for row, col in ship] if num == four else ship for num, ship in enumerate(fleet)]
+    assert not legal_fleet(off)
+    touching = [[[0, 0], [0, 1], [0, 2], [0, 3]], [[1, 0], [1, 1], [1, 2]], [[3, 0], [3, 1], [3, 2]],
+                [[5, 0], [5, 1]], [[7, 0], [7, 1]], [[9, 0], [9, 1]], [[5, 5]], [[7, 7]], [[9, 9]], [[3, 9]]]
+    assert sorted(map(len, touching)) == sorted(Player.ship_lengths)
+    assert not legal_fleet(touching)
+
+def play_side(match, seed):
+    ''' Fires at random squares until the game is over and the peer's fleet has been checked '''
+    squares = [(row, col) for row in range(10) for col in range(10)]
+    random.Random(seed).shuffle(squares)
+    match.start()
+    while match.error is None and not (match.finished and match.verified is not None):
+        if match.my_turn:
+            match.fire(*squares.pop())
+        match.update(1.0)
+
+@pytest.mark.parametrize('seed', range(3))
+def test_loopback_game_is_verified(seed):
+    host, guest = LanConnection(), LanConnection()
+    try:
+        guest.join(*host.host(0, '127.0.0.1'))
+        matches = [LanMatch(host, cpu_player('host', seed), True), LanMatch(guest, cpu_player('guest', seed + 10), False)]
+        threads = [Thread(target=play_side, args=(match, seed + num)) for num, match in enumerate(matches)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(30)
+        for match in matches:
+            assert match.error is None
+            assert match.verified is True
+        # Both sides agree on the winner and on the number of turns
+        assert matches[0].result.winner.name == matches[1].result.winner.name
+        assert matches[0].num_of_turns == matches[1].num_of_turns
+    finally:
+        host.close()
+        guest.close()
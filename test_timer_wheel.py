@@ -0,0 +1,100 @@
+'''
+Tests of the timer wheel of the game server's deadlines (timer_wheel_class), on a simulated clock:
+every timer must expire in the first tick at or after its time, and a cancelled one never.
+'''
+
+from math import ceil
+from random import Random
+
+from timer_wheel_class import TimerWheel, level_bits, wheel_levels, wheel_slots
+
+tick = 0.05
+
+class Clock():
+    ''' Simulated clock, kept in the middle of a tick so that its tick is never rounded down '''
+    def __init__(self):
+        self.now = 0.5*tick
+    def __call__(self):
+        return self.now
+    def set_tick(self, num):
+        self.now = (num + 0.5)*tick
+
+def run_wheel(delays, new_delays, cancelled, last_tick, step=1):
+    ''' Schedule a timer per delay, replace some by a timer of a new delay ({timer number: delay}),
+    cancel some of them, then advance the clock every step ticks up to the last tick
+
+    Output: (wheel, handles, {timer number: tick of the advance that expired it})
+    '''
+    clock = Clock()
+    wheel = TimerWheel(tick, clock)
+    expired = {}
+    def expire(num):
+        expired[num] = wheel.now
+    handles = [wheel.schedule(delay, expire, num) for num, delay in enumerate(delays)]
+    for num, delay in new_delays.items():
+        assert wheel.cancel(handles[num])
+        handles[num] = wheel.schedule(delay, expire, num)
+    for num in cancelled:
+        assert wheel.cancel(handles[num])
+    assert len(wheel) == len(delays) - len(cancelled)
+    for num in range(step, last_tick + step, step):
+        clock.set_tick(num)
+        wheel.advance()
+    return wheel, handles, expired
+
+def test_timers_expire_in_their_tick():
+    rng = Random(1)
+    # Due within a minute (level 0 and 1), within an hour (level 2) and within a day (level 3)
+    delays = [rng.uniform(0, seconds) for seconds in (60, 3600, 86400) for _ in range(3000)]
+    new_delays = {num: rng.uniform(0, 86400) for num in rng.sample(range(len(delays)), len(delays) // 3)}
+    cancelled = set(rng.sample(range(len(delays)), len(delays) // 3))
+    wheel, handles, expired = run_wheel(delays, new_delays, cancelled, ceil(86400 / tick) + 1)
+    assert wheel.pending == 0
+    assert set(expired) == set(range(len(delays))) - cancelled
+    for num, expired_tick in expired.items():
+        assert expired_tick == ceil(handles[num].when / tick), f"timer {num} due at {handles[num].when:.3f}s"
+        assert not handles[num].pending
+    assert wheel.expired == len(expired)
+
+def test_late_advance_expires_everything_due():
+    rng = Random(2)
+    delays = [rng.uniform(0, 600) for _ in range(5000)]
+    # The clock is only looked at every 7 ticks: nothing expires early, or more than 7 ticks late
+    wheel, handles, expired = run_wheel(delays, {}, set(), ceil(600 / tick) + 7, 7)
+    assert len(expired) == len(delays)
+    for num, expired_tick in expired.items():
+        assert 0 <= expired_tick - ceil(handles[num].when / tick) < 7
+
+def test_timer_beyond_the_wheel():
+    # Due after the last slot of the last level: placed again once that slot is moved down
+    span = wheel_slots << (level_bits*(wheel_levels - 1))
+    clock = Clock()
+    wheel = TimerWheel(tick, clock)
+    expired = []
+    timer = wheel.schedule((span + 1000)*tick, expired.append, 'late')
+    assert timer.expires > span
+    for num in [*range(0, timer.expires, 997), timer.expires - 1]:
+        clock.set_tick(num)
+        wheel.advance()
+        assert not expired
+    clock.set_tick(timer.expires)
+    assert wheel.advance() == 1
+    assert expired == ['late'] and not timer.pending
+
+def test_callbacks_schedule_and_cancel():
+    clock = Clock()
+    wheel = TimerWheel(tick, clock)
+    fired = []
+    later = wheel.schedule(10.0, fired.append, 'cancelled')
+    def first():
+        fired.append('first')
+        # A callback may cancel a pending timer and schedule a new one
+        assert wheel.cancel(later)
+        wheel.schedule(1.0, fired.append, 'second')
+    timer = wheel.schedule(1.0, first)
+    for num in range(1, 400):
+        clock.set_tick(num)
+        wheel.advance()
+    assert fired == ['first', 'second']
+    assert not wheel.cancel(timer) and not wheel.cancel(later)
+    assert len(wheel) == 0
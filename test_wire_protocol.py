@@ -0,0 +1,91 @@
+'''
+Tests of the binary encoding (wire_protocol): boards and messages must come back unchanged from a
+round trip, whole or received a few bytes at a time.
+'''
+
+import random
+
+import pytest
+
+from conftest import cpu_player
+from engine import shot_outcome
+from lan_class import fleet_blocks, fleet_commitment
+from wire_protocol import decode_board, decode_message, encode_board, encode_message, protocol_version, split_messages
+
+def sample_boards(boards, seed):
+    ''' Output: boards of CPU games stopped at a random turn '''
+    rng = random.Random(seed)
+    sample = []
+    for _ in range(boards):
+        player, enemy = cpu_player('player', rng.random()), cpu_player('enemy', rng.random())
+        squares = [(row, col) for row in range(10) for col in range(10)]
+        rng.shuffle(squares)
+        for row, col in squares[:rng.randint(0, 100)]:
+            shot_outcome(player, enemy, row, col)
+        sample.append(player.board)
+    return sample
+
+def sample_messages():
+    ''' Output: a message of every kind players, spectators and the server exchange '''
+    board = sample_boards(1, 0)[0]
+    fleet = [[tuple(block) for block in ship] for ship in fleet_blocks(board)]
+    nonce = '00112233445566778899aabbccddeeff'
+    return [{'type': 'shot', 'row': 9, 'col': 3},
+            {'type': 'shot', 'row': 0, 'col': 0, 'outcome': 'X'},
+            {'type': 'result', 'row': 4, 'col': 7, 'outcome': 'M'},
+            {'type': 'result', 'row': fleet[-1][0][0], 'col': fleet[-1][0][1], 'outcome': 'S', 'ship': fleet[-1]},
+            {'type': 'hello', 'version': protocol_version, 'name': 'Zoë', 'commitment': fleet_commitment(fleet, nonce)},
+            {'type': 'start', 'first': True, 'opponent': 'Grace'},
+            {'type': 'reveal', 'nonce': nonce, 'fleet': fleet},
+            {'type': 'join', 'version': protocol_version, 'name': 'Ada', 'fleet': fleet},
+            {'type': 'end', 'won': False, 'reason': "the whole fleet has been sunk"},
+            {'type': 'error', 'reason': "shot out of turn"},
+            {'type': 'watch', 'game': 70000},
+            {'type': 'keyframe', 'game': 70000, 'turn': 31, 'next': 1, 'names': ['Zoë', 'Ada'],
+             'guesses': [board.guess_state, sample_boards(1, 1)[0].guess_state]},
+            {'type': 'delta', 'game': 3, 'turn': 32, 'player': 1, 'cells': [(4, 7, 'M')], 'sunk': None},
+            {'type': 'delta', 'game': 3, 'turn': 33, 'player': 0, 'cells': [(row, col, 'S') for row, col in fleet[0]],
+             'sunk': fleet[0]},
+            {'type': 'finished', 'game': 3, 'winner': 0, 'reason': "the whole fleet has been sunk"}]
+
+def test_board_round_trip():
+    for board in sample_boards(500, 1):
+        copy = decode_board(memoryview(encode_board(board)))
+        assert copy.state == board.state
+        assert copy.guess_state == board.guess_state
+        assert copy.guess_key == board.guess_key
+        ships = [(sorted(ship.locations), len(ship) > 1 and ship.vertical) for ship in board.placed_ships]
+        assert [(ship.locations, len(ship) > 1 and ship.vertical) for ship in copy.placed_ships] == ships
+
+@pytest.mark.parametrize('message', sample_messages(), ids=lambda message: message['type'])
+def test_message_round_trip(message):
+    data = encode_message(message)
+    assert decode_message(memoryview(data)) == (message, len(data))
+    # A frame that has not been received whole is not decoded yet
+    for end in range(len(data)):
+        assert decode_message(memoryview(data[:end])) == (None, 0)
+
+def test_messages_split_across_reads():
+    messages = sample_messages()
+    stream = b''.join(map(encode_message, messages))
+    for step in (1, 3, 7):
+        received = []
+        buffer = bytearray()
+        for start in range(0, len(stream), step):
+            buffer += stream[start:start + step]
+            received.extend(split_messages(buffer))
+        assert received == messages
+        assert not buffer
+
+def test_invalid_frames():
+    with pytest.raises(ValueError):
+        encode_message({'type': 'shot', 'row': 1})
+    # An unknown tag, a square off the board, a hello cut short
+    for data in (bytes((200, 0)), bytes((100, 120)), bytes((encode_message(sample_messages()[4])[0], 1, protocol_version))):
+        with pytest.raises(ValueError):
+            decode_message(data)
+    # The messages before an invalid frame are returned, and the next call raises
+    buffer = bytearray(encode_message({'type': 'shot', 'row': 1, 'col': 2}) + bytes((200, 0)))
+    assert split_messages(buffer) == [{'type': 'shot', 'row': 1, 'col': 2}]
+    with pytest.raises(ValueError):
+        split_messages(buffer)
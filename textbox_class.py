@@ -27,7 +27,7 @@ class TextBox():
 		height				Textbox's width
 		rect 				Creates a rectangle with the same dimensions
 		background_rect		The rectangle containing the textbox and the two buttons
-		original_text		Default text to be displayed if the textbox is empty
+		original_text		Default text to be displayed if the textbox is empty (or the given prompt)
 		text 				Introduced by the user as their name
 		font 				Text's font
 		active 				Checks if the textbox has been clicked on
@@ -40,7 +40,7 @@ class TextBox():
 		handle_event		Modifies the textbox for a given PyGame event
 		draw				Draw the TextBox, the rectangle that contains it, and display the buttons
 	'''
-	def __init__(self, pos_x, pos_y, width, height, player_num):
+	def __init__(self, pos_x, pos_y, width, height, player_num, prompt=None):
 		self.pos_x = pos_x
 		self.pos_y = pos_y
 		self.width = width
@@ -53,6 +53,8 @@ class TextBox():
 			self.original_text = "Player1" # Player 1 in Local gameplay
 		else:
 			self.original_text = "Player2" # Player 2 in Local gameplay
+		if prompt is not None:
+			self.original_text = prompt # E.g. the host's address in LAN gameplay
 		self.text = self.original_text
 		self.font = default_font
 		self.active = False # Inactive textbox by default
@@ -0,0 +1,171 @@
+'''
+Contains the TimerWheel class: a hierarchical timer wheel holding the move deadlines of every game
+of the online server (game_server.py), so that starting, cancelling and expiring a deadline costs
+the same whether ten or a hundred thousand are pending.
+
+Time is cut into ticks of tick_seconds. The wheel has wheel_levels levels of wheel_slots slots
+each; a slot of level n spans 64**n ticks (level_bits = 6), so level 0 holds the next 128 ticks one
+per slot, level 1 the next 128 blocks of 64 ticks, and so on. A timer sits in the lowest level whose
+slots reach its tick, in the slot of its tick or of its block of ticks. While a block of ticks of
+a level runs, the slot of the next block is moved down to the level below, a share of it per tick,
+so that the level below holds all of its timers once it starts (a level has twice as many slots as
+one of its blocks has blocks below, which leaves room for them). Every timer is moved at most
+wheel_levels - 1 times before it expires, and no tick has to move a whole slot at once. A slot is
+a dictionary used as an ordered set, so a timer is inserted and removed in constant time, and
+expiring a tick only looks at the timers due in it.
+
+With the default 50 ms ticks, the four levels cover 128 * 64**3 ticks (about 19 days); a timer
+due later sits in the last slot it can reach and is placed again when that slot is moved down.
+'''
+
+from time import monotonic
+
+# A slot of each level spans 2**level_bits slots of the level below, and a level has twice that
+# many slots
+wheel_levels = 4
+level_bits = 6
+wheel_slots = 2 << level_bits
+# Seconds per tick: timers expire at most this late (plus however late advance is called)
+default_tick = 0.05
+
+class Timer():
+    '''A callback due at a given time; returned by TimerWheel.schedule to cancel it
+
+    Attributes:
+        when        Time (of the wheel's clock) at which the timer is due
+        expires     Tick at which the timer expires (the first one at or after when)
+        callback    Function called when the timer expires
+        args        Arguments of the callback
+        slot        Slot of the wheel holding the timer (None once it has expired or been cancelled)
+    '''
+    __slots__ = ('when', 'expires', 'callback', 'args', 'slot')
+    def __init__(self, when, expires, callback, args):
+        self.when = when
+        self.expires = expires
+        self.callback = callback
+        self.args = args
+        self.slot = None
+    @property
+    def pending(self):
+        return self.slot is not None
+
+class TimerWheel():
+    '''Pending timers, expired by calling advance regularly
+
+    Attributes:
+        tick_seconds    Seconds per tick
+        clock           Function returning the current time in seconds (default: time.monotonic,
+                        the clock of asyncio's event loop)
+        now             Last tick expired
+        wheels          wheel_levels lists of wheel_slots slots, each a dictionary {Timer: None}
+        pending         Number of pending timers
+        expired         Number of timers that have expired
+        cascaded        Number of times a timer has been moved to a lower level
+
+    Methods:
+        schedule        Adds a timer due after a delay
+        cancel          Removes a pending timer
+        advance         Expires the timers due up to the current time
+    '''
+    def __init__(self, tick_seconds=default_tick, clock=monotonic):
+        self.tick_seconds = tick_seconds
+        self.clock = clock
+        self.now = self.current_tick()
+        self.wheels = [[{} for _ in range(wheel_slots)] for _ in range(wheel_levels)]
+        self.pending = 0
+        self.expired = 0
+        self.cascaded = 0
+    def __len__(self):
+        return self.pending
+    def current_tick(self):
+        return int(self.clock() / self.tick_seconds)
+    def schedule(self, delay, callback, *args):
+        ''' Add a timer that calls callback(*args) once delay seconds have gone by
+
+        Input: delay (seconds), callback, arguments
+
+        Output: Timer instance (for cancel)
+        '''
+        now = self.clock()
+        if not self.pending:
+            # Nothing is pending, so the ticks missed since the last advance can be skipped
+            self.now = max(self.now, int(now / self.tick_seconds))
+        when = now + delay
+        # Never before its time, and never in a tick that has already expired
+        expires = max(-int(-when // self.tick_seconds), self.now + 1)
+        timer = Timer(when, expires, callback, args)
+        self.place(timer)
+        self.pending += 1
+        return timer
+    def place(self, timer):
+        ''' Put a timer in the lowest level whose slots reach its tick '''
+        expires = timer.expires
+        now = self.now
+        for level in range(wheel_levels):
+            shift = level_bits*level
+            if (expires >> shift) - (now >> shift) < wheel_slots:
+                break
+        else:
+            # Too far ahead: the last slot within reach, placed again once it is moved down
+            expires = ((now >> shift) + wheel_slots - 1) << shift
+        slot = self.wheels[level][(expires >> shift) & (wheel_slots - 1)]
+        slot[timer] = None
+        timer.slot = slot
+    def cancel(self, timer):
+        ''' Remove a timer, unless it has already expired or been cancelled
+
+        Input: Timer instance
+
+        Output: True if the timer was pending
+        '''
+        slot = timer.slot
+        if slot is None:
+            return False
+        del slot[timer]
+        timer.slot = None
+        self.pending -= 1
+        return True
+    def advance(self):
+        ''' Expire the timers due up to the current time, calling their callbacks (in no given
+        order within a tick). A callback may schedule or cancel timers.
+
+        Input: -
+
+        Output: number of timers expired
+        '''
+        target = self.current_tick()
+        if not self.pending:
+            self.now = max(self.now, target)
+            return 0
+        expired = 0
+        wheels = self.wheels
+        while self.now < target:
+            self.now += 1
+            now = self.now
+            for level in range(1, wheel_levels):
+                # Move down a share of the next block of the level, so that it has all been moved
+                # by the last tick of the current block
+                shift = level_bits*level
+                slot = wheels[level][((now >> shift) + 1) & (wheel_slots - 1)]
+                if slot:
+                    ticks_left = (1 << shift) - (now & ((1 << shift) - 1))
+                    moves = -(-len(slot) // ticks_left)
+                    for _ in range(moves):
+                        self.place(slot.popitem()[0])
+                    self.cascaded += moves
+            slot = wheels[0][now & (wheel_slots - 1)]
+            while slot:
+                timer = slot.popitem()[0]
+                timer.slot = None
+                self.pending -= 1
+                expired += 1
+                timer.callback(*timer.args)
+            if not self.pending:
+                self.now = target
+            elif (not now & ((1 << level_bits) - 1) and not any(wheels[0])
+                  and not wheels[1][((now >> level_bits) + 1) & (wheel_slots - 1)]):
+                # Nothing is due before the last tick of this block of level 1, which still has to
+                # run (after a long wait, or in tests)
+                self.now = min(target, (now | ((1 << level_bits) - 1)) - 1)
+        self.expired += expired
+        return expired
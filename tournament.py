@@ -0,0 +1,217 @@
+'''
+CPU vs CPU tournament runner: plays a large number of games between two CPU strategies over a
+pool of processes, streams every game's result back to the parent process (which writes it to a
+CSV file as it arrives) and combines them into win rates and shots-to-win histograms.
+
+With a master seed, every game draws its randomness (fleets, shots, who goes first) from streams
+derived from the seed and the game's number only, so results do not depend on how the games were
+spread over the processes and any single game can be replayed on its own, e.g. for profiling.
+
+Usage:
+    python tournament.py normal hard --games 100000 --processes 8 --output results.csv --seed 42
+    python tournament.py normal hard --seed 42 --replay 31337
+'''
+
+import argparse
+import csv
+import os
+from math import sqrt
+from multiprocessing import Pool
+from random import Random
+from time import perf_counter
+
+import numpy as np
+
+from cpu_class import CPU, HardCPU
+from engine import Game
+from monte_carlo_class import MonteCarloCPU
+
+# Strategies that can take part in a tournament
+strategies = {'normal': CPU, 'hard': HardCPU, 'montecarlo': MonteCarloCPU}
+# Columns of the results file; 'a' and 'b' refer to the first and second strategy given
+result_fields = ['game', 'winner', 'first_player', 'num_of_turns', 'tries_a', 'tries_b']
+# Normal quantile used for the 95% confidence intervals
+z_95 = 1.959964
+
+class TournamentStats():
+    '''Running statistics of a tournament, updated one game at a time so that memory does not
+    grow with the number of games
+
+    Attributes:
+        games           Number of games played
+        wins            Games won by each side ('a', 'b')
+        first_wins      Games won by the side that went first
+        shots_to_win    Histogram of the winner's number of tries, per side
+        shots_sum       Sum of the winner's number of tries, per side
+        shots_sq_sum    Sum of their squares (for the confidence interval of the mean)
+
+    Methods:
+        add             Adds a game result
+        win_rate        Win rate of a side with its 95% Wilson confidence interval
+        mean_shots      Mean shots to win of a side with its 95% confidence interval
+        report          Text summary
+    '''
+    def __init__(self, names):
+        self.names = names
+        self.games = 0
+        self.wins = {'a': 0, 'b': 0}
+        self.first_wins = 0
+        self.shots_to_win = {'a': {}, 'b': {}}
+        self.shots_sum = {'a': 0, 'b': 0}
+        self.shots_sq_sum = {'a': 0, 'b': 0}
+    def add(self, result):
+        ''' Input: result row (same order as result_fields) '''
+        _, winner, first_player, _, tries_a, tries_b = result
+        shots = tries_a if winner == 'a' else tries_b
+        self.games += 1
+        self.wins[winner] += 1
+        self.first_wins += winner == first_player
+        self.shots_to_win[winner][shots] = self.shots_to_win[winner].get(shots, 0) + 1
+        self.shots_sum[winner] += shots
+        self.shots_sq_sum[winner] += shots*shots
+    def win_rate(self, side):
+        ''' Output: (rate, low, high) '''
+        return wilson_interval(self.wins[side], self.games)
+    def mean_shots(self, side):
+        ''' Output: (mean, low, high), or None if the side has not won any game '''
+        wins = self.wins[side]
+        if wins == 0:
+            return None
+        mean = self.shots_sum[side] / wins
+        variance = max(self.shots_sq_sum[side] / wins - mean*mean, 0) * wins / max(wins - 1, 1)
+        margin = z_95 * sqrt(variance / wins)
+        return (mean, mean - margin, mean + margin)
+    def report(self):
+        ''' Output: multi-line summary string '''
+        lines = [f"{self.games} games"]
+        for side in ('a', 'b'):
+            rate, low, high = self.win_rate(side)
+            line = f"{side}: {self.names[side]:<8} win rate {rate:.2%} [{low:.2%}, {high:.2%}]"
+            shots = self.mean_shots(side)
+            if shots:
+                line += f"  shots to win {shots[0]:.2f} [{shots[1]:.2f}, {shots[2]:.2f}]"
+            lines.append(line)
+        rate, low, high = wilson_interval(self.first_wins, self.games)
+        lines.append(f"first player win rate {rate:.2%} [{low:.2%}, {high:.2%}]")
+        return '\n'.join(lines)
+    def write_histograms(self, path):
+        ''' Writes the shots-to-win histograms as CSV (shots, wins of a, wins of b) '''
+        all_shots = sorted(set(self.shots_to_win['a']) | set(self.shots_to_win['b']))
+        with open(path, 'w', newline='') as histogram_file:
+            writer = csv.writer(histogram_file)
+            writer.writerow(['shots', self.names['a'], self.names['b']])
+            for shots in all_shots:
+                writer.writerow([shots, self.shots_to_win['a'].get(shots, 0), self.shots_to_win['b'].get(shots, 0)])
+
+# FUNCTIONS
+
+def wilson_interval(successes, trials):
+    ''' 95% Wilson score interval of a binomial proportion
+
+    Input: successes, trials
+
+    Output: (rate, low, high)
+    '''
+    if trials == 0:
+        return (0.0, 0.0, 1.0)
+    rate = successes / trials
+    denominator = 1 + z_95**2 / trials
+    centre = (rate + z_95**2 / (2*trials)) / denominator
+    margin = z_95 * sqrt(rate*(1 - rate)/trials + z_95**2/(4*trials**2)) / denominator
+    return (rate, centre - margin, centre + margin)
+
+def game_streams(master_seed, game_num):
+    ''' Independent random streams of a game of a seeded tournament, derived from the master seed
+    and the game's number with NumPy's SeedSequence
+
+    Input: master seed, game number
+
+    Output: (random.Random of the game, of CPU a, of CPU b)
+    '''
+    sequence = np.random.SeedSequence(master_seed, spawn_key=(game_num,))
+    return tuple(Random(int(child.generate_state(1, np.uint64)[0])) for child in sequence.spawn(3))
+
+def play_game(name_a, name_b, game_num, master_seed=None):
+    ''' Play one game of a tournament (the same game every time if master_seed is given)
+
+    Input: strategy names, game number, master seed of the tournament (None: unseeded)
+
+    Output: result row (same order as result_fields)
+    '''
+    if master_seed is None:
+        game_rng = None
+        cpu_a, cpu_b = strategies[name_a](), strategies[name_b]()
+    else:
+        game_rng, rng_a, rng_b = game_streams(master_seed, game_num)
+        cpu_a, cpu_b = strategies[name_a](rng=rng_a), strategies[name_b](rng=rng_b)
+    result = Game([cpu_a, cpu_b], rng=game_rng).play()
+    return (game_num,
+            'a' if result.winner is cpu_a else 'b',
+            'a' if result.first_player is cpu_a else 'b',
+            result.num_of_turns, cpu_a.num_of_tries, cpu_b.num_of_tries)
+
+def play_games(task):
+    ''' Worker function: plays a chunk of games
+
+    Input: (first game number, number of games, strategy name a, strategy name b, master seed)
+
+    Output: list of result rows (same order as result_fields)
+    '''
+    first_game, num_games, name_a, name_b, master_seed = task
+    return [play_game(name_a, name_b, game_num, master_seed) for game_num in range(first_game, first_game + num_games)]
+
+def run_tournament(name_a, name_b, games, processes=None, output=None, chunk_size=None, seed=None):
+    ''' Spread the games over a pool of processes and combine the results as they arrive
+
+    Input: strategy names, number of games, number of processes (default: all cores), path of
+           the results CSV file (None to skip it), games per task, master seed (None: unseeded)
+
+    Output: TournamentStats instance
+    '''
+    processes = processes or os.cpu_count()
+    # Enough tasks to keep every process busy, but large enough to amortise the messaging
+    chunk_size = chunk_size or max(1, min(1000, games // (processes*8)))
+    tasks = [(first, min(chunk_size, games - first), name_a, name_b, seed) for first in range(0, games, chunk_size)]
+    stats = TournamentStats({'a': name_a, 'b': name_b})
+
+    results_file = open(output, 'w', newline='') if output else None
+    try:
+        if results_file:
+            writer = csv.writer(results_file)
+            writer.writerow(result_fields)
+        with Pool(processes) as pool:
+            for results in pool.imap_unordered(play_games, tasks):
+                for result in results:
+                    stats.add(result)
+                if results_file:
+                    writer.writerows(results)
+    finally:
+        if results_file:
+            results_file.close()
+    return stats
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a CPU vs CPU tournament")
+    parser.add_argument('strategy_a', choices=list(strategies))
+    parser.add_argument('strategy_b', choices=list(strategies))
+    parser.add_argument('--games', type=int, default=10000)
+    parser.add_argument('--processes', type=int, default=None, help="default: number of cores")
+    parser.add_argument('--output', default=None, help="CSV file for the per-game results")
+    parser.add_argument('--histograms', default=None, help="CSV file for the shots-to-win histograms")
+    parser.add_argument('--seed', type=int, default=None, help="master seed, to make every game reproducible")
+    parser.add_argument('--replay', type=int, default=None, metavar='GAME', help="replay a single game of a seeded tournament")
+    args = parser.parse_args()
+
+    if args.replay is not None:
+        if args.seed is None:
+            parser.error("--replay needs the --seed of the tournament")
+        print(dict(zip(result_fields, play_game(args.strategy_a, args.strategy_b, args.replay, args.seed))))
+        raise SystemExit
+
+    start = perf_counter()
+    stats = run_tournament(args.strategy_a, args.strategy_b, args.games, args.processes, args.output, seed=args.seed)
+    elapsed = perf_counter() - start
+    print(stats.report())
+    print(f"{stats.games/elapsed:.0f} games/sec")
+    if args.histograms:
+        stats.write_histograms(args.histograms)
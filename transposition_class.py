@@ -0,0 +1,126 @@
+'''
+Zobrist hashing of what a CPU knows about the enemy board, and a bounded LRU cache of evaluation
+results keyed by it (a transposition cache: the same position is reached through different orders
+of shots, and every game starts from the same one).
+
+The Zobrist key of a position is the XOR of one random 64-bit number per fact: the mark of every
+square of guess_state that has been fired upon, every discarded square and the number of enemy
+ships of each length still afloat. A shot changes a few facts, so the key is updated with a few
+XORs instead of being recomputed (see BoardState.set_guess and CPU.discard_squares). The random
+numbers come from a fixed seed, so every process computes the same keys.
+'''
+
+from collections import OrderedDict
+from random import Random
+from threading import Lock
+
+# Seed of the random numbers of the keys
+zobrist_seed = 0x5EA_B477
+# Entries kept by each shared cache (every entry holds a 10x10 array; the Monte Carlo ones also hold their sample counts)
+cache_sizes = {'density': 100000, 'monte_carlo': 10000}
+default_cache_size = 100000
+# Shared caches of this process: {name: TranspositionCache}
+_caches = {}
+
+_random = Random(zobrist_seed)
+# {mark: number} of every square (index row*10 + col); an empty square adds nothing
+guess_keys = [{' ': 0, 'M': _random.getrandbits(64), 'X': _random.getrandbits(64), 'S': _random.getrandbits(64)}
+              for _ in range(100)]
+# Number of every discarded square
+discard_keys = [_random.getrandbits(64) for _ in range(100)]
+# {length: number of each count of ships of that length afloat}; no ship adds nothing
+fleet_keys = {length: [0] + [_random.getrandbits(64) for _ in range(10)] for length in range(1, 11)}
+
+class TranspositionCache():
+    '''Least recently used cache of evaluation results, keyed by Zobrist keys (or tuples of them
+    and the evaluation's parameters). Results are shared, so they must not be modified.
+
+    Attributes:
+        max_entries     Entries kept; the least recently used one is dropped beyond that
+        entries         OrderedDict {key: result}, least recently used first
+        hits            Lookups that found a result
+        misses          Lookups that did not
+        evictions       Results dropped to make room
+
+    Methods:
+        get             Result of a key (None if there is none)
+        put             Stores the result of a key
+        clear           Drops every entry and resets the counts
+        hit_rate        Share of the lookups that found a result
+        report          Text summary of the counts
+    '''
+    def __init__(self, max_entries=default_cache_size):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        # The CPUs of a game may plan in background threads (see ai_worker_class)
+        self.lock = Lock()
+    def __len__(self):
+        return len(self.entries)
+    def get(self, key):
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return result
+    def put(self, key, result):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = self.evictions = 0
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    def report(self):
+        return (f"{len(self.entries)}/{self.max_entries} entries, {self.hits} hits, {self.misses} misses "
+                f"({self.hit_rate():.1%} hit rate), {self.evictions} evictions")
+
+# FUNCTIONS
+
+def zobrist_hash(guess_state, discarded_blocks, remaining_ships):
+    ''' Zobrist key of a position, computed from scratch
+
+    Input: guess_state (10 rows of marks), discarded squares, lengths of the enemy ships afloat
+
+    Output: 64-bit integer
+    '''
+    key = 0
+    for row in range(10):
+        for col in range(10):
+            key ^= guess_keys[row*10 + col][guess_state[row][col]]
+    for row, col in discarded_blocks:
+        key ^= discard_keys[row*10 + col]
+    return key ^ fleet_key(remaining_ships)
+
+def fleet_key(remaining_ships):
+    ''' Part of the Zobrist key given by the lengths of the enemy ships afloat '''
+    key = 0
+    for length in set(remaining_ships):
+        key ^= fleet_keys[length][remaining_ships.count(length)]
+    return key
+
+def transposition_cache(name):
+    ''' Cache shared by every CPU of this process (e.g. of a tournament worker, across its games)
+
+    Input: name of the evaluation (its size is taken from cache_sizes)
+
+    Output: TranspositionCache instance
+    '''
+    if name not in _caches:
+        _caches[name] = TranspositionCache(cache_sizes.get(name, default_cache_size))
+    return _caches[name]
+
+def cache_report():
+    ''' Output: text summary of every shared cache of this process '''
+    return '\n'.join(f"transposition cache '{name}': {cache.report()}" for name, cache in _caches.items())
@@ -0,0 +1,131 @@
+'''
+Contains the TurnStateMachine class: the timing of a game's turns (the CPU's aiming pause, the
+pause that shows a shot's outcome, the end-of-game pause) as timed states advanced by the frame
+loop, so that the window keeps rendering and handling input during the pauses. It does not
+depend on PyGame; with zero_delays it plays out headless games without waiting at all.
+'''
+
+from time import monotonic
+
+from cpu_class import CPU
+
+# States
+AIMING = 'aiming'           # A player chooses their shot (waits for input)
+CPU_AIMING = 'cpu_aiming'   # The CPU's board is shown before it fires
+SHOT = 'shot'               # The outcome of the last shot is shown
+GAME_OVER = 'game_over'     # The final board is shown before the game closes
+FINISHED = 'finished'
+
+# Seconds spent in each timed state
+default_delays = {CPU_AIMING: 0.5, SHOT: 1.0, GAME_OVER: 2.0}
+# A player's shot is shown for less time than the CPU's
+player_shot_delay = 0.5
+zero_delays = {CPU_AIMING: 0, SHOT: 0, GAME_OVER: 0}
+# Seconds between two checks of a background worker that has not answered yet
+worker_poll_interval = 0.01
+
+class TurnStateMachine():
+    '''Drives a Game instance (engine module) through timed states
+
+    Attributes:
+        match           Game instance
+        delays          Seconds spent in each timed state
+        clock           Function returning the current time in seconds
+        state           Current state
+        deadline        Time at which the current timed state ends (None while aiming or finished)
+        shown_user      User whose guessing board is on screen
+        workers         AIWorker instance of each CPU whose shots are computed in the background
+                        ({cpu: worker}; the other CPUs choose their shot when their pause ends)
+
+    Methods:
+        fire            Handles a player's shot while aiming
+        update          Moves through the timed states that have expired
+        time_left       Seconds until the next timed transition
+        run             Plays a CPU vs CPU game until the end
+    '''
+    def __init__(self, match, delays=None, clock=monotonic, workers=None):
+        self.match = match
+        self.workers = workers or {}
+        self.delays = default_delays if delays is None else delays
+        self.clock = clock
+        self.state = None
+        self.deadline = None
+        self.shown_user = match.user_1
+        self.start_turn(self.clock())
+    def start_turn(self, now):
+        ''' Enter the state of the current user's turn (or of the end of the game) '''
+        if self.match.finished:
+            self.enter(GAME_OVER, now, self.delays[GAME_OVER])
+        else:
+            self.shown_user = self.match.user_1
+            if isinstance(self.match.user_1, CPU):
+                self.enter(CPU_AIMING, now, self.delays[CPU_AIMING])
+            else:
+                self.enter(AIMING, now, None)
+            # The CPUs' next shots only depend on their own shots: start computing them right away
+            for worker in self.workers.values():
+                worker.start()
+    def enter(self, state, now, delay):
+        self.state = state
+        self.deadline = None if delay is None else now + delay
+    def fire(self, row, col):
+        ''' A player fires at the given square; ignored unless a player is aiming
+
+        Input: row, col
+
+        Output: True if the shot was valid
+        '''
+        if self.state != AIMING:
+            return False
+        shooter = self.match.user_1
+        if not self.match.fire(row, col):
+            return False
+        # Keep the shooter's board on screen while the outcome is shown
+        self.shown_user = shooter
+        delay = min(player_shot_delay, self.delays[SHOT])
+        self.enter(SHOT, self.clock(), delay)
+        return True
+    def update(self, now=None):
+        ''' Advance through every timed state that has expired; the CPU fires when its aiming
+        pause ends
+
+        Input: current time (default: clock())
+
+        Output: current state
+        '''
+        now = self.clock() if now is None else now
+        while self.deadline is not None and now >= self.deadline:
+            # The next state starts now, so that every state is on screen for its whole delay even
+            # after a slow frame
+            if self.state == CPU_AIMING:
+                worker = self.workers.get(self.match.user_1)
+                if worker is None:
+                    self.match.cpu_turn()
+                elif worker.ready():
+                    self.match.fire(*worker.collect())
+                else:
+                    # Keep aiming (and rendering) until the worker answers
+                    self.deadline = now + worker_poll_interval
+                    break
+                self.enter(SHOT, now, self.delays[SHOT])
+            elif self.state == SHOT:
+                self.start_turn(now)
+            elif self.state == GAME_OVER:
+                self.enter(FINISHED, now, None)
+        return self.state
+    def time_left(self, now=None):
+        ''' Output: seconds until the next timed transition, None if waiting for a player or finished '''
+        if self.deadline is None:
+            return None
+        now = self.clock() if now is None else now
+        return max(self.deadline - now, 0)
+    def run(self):
+        ''' Play until the game has finished; only CPU users can be simulated
+
+        Output: GameResult instance
+        '''
+        while self.state != FINISHED:
+            if self.state == AIMING:
+                raise ValueError("a player has to choose their shot")
+            self.update(max(self.clock(), self.deadline))
+        return self.match.result
@@ -0,0 +1,387 @@
+'''
+Compact binary encoding of boards, fleets and network messages (LAN games, the online server).
+
+Boards:
+    ship            2 bytes: square of its first block (row*10 + col, the block closest to the top
+                    left corner), then length << 1 | vertical
+    fleet           1 byte with the number of ships, then every ship
+    guess state     25 bytes: 2 bits per square (' ' 0, 'M' 1, 'X' 2, 'S' 3), four squares per
+                    byte from the lowest bits up, squares in row*10 + col order
+    board           fleet, then guess state (encode_board / decode_board)
+
+Messages are the dictionaries handled by lan_class, online_class and game_server; each one is a
+frame whose first byte (its tag) tells how long it is:
+    0-99            shot at that square (row*10 + col): {'type': 'shot', 'row', 'col'}; 1 byte
+    100-102         result of a shot, 'M', 'X' or 'S' (then the square, and for 'S' the sunk ship):
+                    {'type': 'result', 'row', 'col', 'outcome', 'ship'}; 2 or 4 bytes
+    103-105         the opponent's shot and its outcome, as sent by the server (then the square):
+                    {'type': 'shot', 'row', 'col', 'outcome'}; 2 bytes
+    240-249         hello, start, reveal, join, end, error, and the spectator messages watch,
+                    keyframe, delta and finished: a byte with the length of the rest (at most 255
+                    bytes), see the encoders below
+
+A spectator of the online server watches games by their number: it receives a keyframe (both
+guess states) of each, then a delta per shot (the squares of the shooter's guess state that
+changed, and the ship sunk if any), about a dozen bytes, and finished once the game is over.
+
+The version of the protocol is the first byte after the length in hello and join, so that a peer
+speaking another version is told so instead of failing on a message it cannot read. Decoding
+reads a memoryview of the bytes received, so no intermediate bytes object is built.
+'''
+
+from board_class import BoardState, Ship
+
+# Version of the messages; both players (or a player and the server) must speak the same one
+protocol_version = 2
+# Outcomes of a shot, by their code in the result tags
+outcomes = ('M', 'X', 'S')
+# Marks of guess_state, by their 2-bit code
+guess_marks = (' ', 'M', 'X', 'S')
+# Longest frame: tag, length byte and 255 bytes
+max_frame_size = 257
+# Longest name or reason sent, in UTF-8 bytes (longer ones are cut)
+max_text_size = 200
+
+# Tags of the frames
+RESULT_TAG = 100
+OUTCOME_SHOT_TAG = 103
+HELLO_TAG = 240
+START_TAG = 241
+REVEAL_TAG = 242
+JOIN_TAG = 243
+END_TAG = 244
+ERROR_TAG = 245
+WATCH_TAG = 246
+KEYFRAME_TAG = 247
+DELTA_TAG = 248
+FINISHED_TAG = 249
+# Winner of a finished message when nobody has won (the game does not exist, or was abandoned
+# before its first shot)
+NO_WINNER = 255
+
+# The four marks of every byte of a packed guess state, and the byte of every four marks
+_byte_marks = [''.join(guess_marks[(byte >> shift) & 3] for shift in (0, 2, 4, 6)) for byte in range(256)]
+_marks_byte = {marks: byte for byte, marks in enumerate(_byte_marks)}
+# (row, col) of every square number
+_squares = [divmod(square, 10) for square in range(100)]
+# Encoding of every straight ship on the board, keyed by its sorted blocks
+_ship_codes = {}
+for _length in range(1, 11):
+    for _vertical in (False, True) if _length > 1 else (False,):
+        for _row in range(11 - _length if _vertical else 10):
+            for _col in range(10 if _vertical else 11 - _length):
+                _blocks = tuple((_row + _block*_vertical, _col + _block*(not _vertical)) for _block in range(_length))
+                _ship_codes[_blocks] = bytes((_row*10 + _col, _length << 1 | _vertical))
+# ... and the other way round: blocks of every ship, keyed by its two bytes read as an integer
+_ship_blocks = {int.from_bytes(code, 'big'): blocks for blocks, code in _ship_codes.items()}
+
+# BOARDS
+
+def encode_ship(blocks):
+    ''' Input: blocks of a straight ship, as (row, col) pairs in any order
+
+    Output: 2 bytes; raises ValueError if the blocks do not form a straight ship
+    '''
+    key = tuple(sorted((row, col) for row, col in blocks))
+    try:
+        return _ship_codes[key]
+    except KeyError:
+        raise ValueError(f"not a straight ship on the board: {list(key)}") from None
+
+def decode_ship(view, offset=0):
+    ''' Input: memoryview (or bytes), offset of an encoded ship
+
+    Output: list of (row, col) blocks from the top left one; raises ValueError if the ship does
+            not fit on the board
+    '''
+    code = view[offset] << 8 | view[offset + 1]
+    try:
+        return list(_ship_blocks[code])
+    except KeyError:
+        raise ValueError(f"invalid ship ({code >> 8}, {code & 255})") from None
+
+def encode_fleet(fleet):
+    ''' Input: list of ships, each a list of (row, col) blocks (e.g. lan_class.fleet_blocks), or
+           list of placed Ship instances
+
+    Output: bytes (1 + 2 per ship)
+    '''
+    return bytes((len(fleet),)) + b''.join(encode_ship(getattr(ship, 'locations', ship)) for ship in fleet)
+
+def decode_fleet(view, offset=0):
+    ''' Input: memoryview (or bytes), offset of an encoded fleet
+
+    Output: (list of ships, each a list of (row, col) blocks, offset after the fleet)
+    '''
+    num_ships = view[offset]
+    end = offset + 1 + 2*num_ships
+    if end > len(view):
+        raise ValueError("fleet cut short")
+    return [decode_ship(view, start) for start in range(offset + 1, end, 2)], end
+
+def encode_guess_state(guess_state):
+    ''' Input: 10x10 grid of ' ', 'M', 'X' and 'S'
+
+    Output: 25 bytes
+    '''
+    marks = ''.join(map(''.join, guess_state))
+    return bytes(_marks_byte[marks[i:i+4]] for i in range(0, 100, 4))
+
+def decode_guess_state(view, offset=0):
+    ''' Input: memoryview (or bytes), offset of an encoded guess state
+
+    Output: 10x10 grid (list of lists)
+    '''
+    if offset + 25 > len(view):
+        raise ValueError("guess state cut short")
+    marks = ''.join([_byte_marks[byte] for byte in view[offset:offset + 25]])
+    return [list(marks[row:row + 10]) for row in range(0, 100, 10)]
+
+def encode_board(board):
+    ''' Input: BoardState instance whose ships are placed
+
+    Output: bytes of its fleet and its guess state (the hits on its ships are not stored: they
+            belong to the other player's guess state)
+    '''
+    return encode_fleet(board.placed_ships) + encode_guess_state(board.guess_state)
+
+def fleet_board(fleet, board_class=None):
+    ''' Board of a fleet (e.g. decoded, or received from a player)
+
+    Input: list of ships, each a list of (row, col) blocks of a straight ship, board class
+           (default: BoardState)
+
+    Output: board with the ships placed (state, placed_ships, ship_at)
+    '''
+    board = (board_class or BoardState)()
+    for blocks in fleet:
+        ship = Ship(len(blocks))
+        ship.locations = sorted((row, col) for row, col in blocks)
+        ship.vertical = len(blocks) > 1 and ship.locations[0][1] == ship.locations[1][1]
+        ship.placed = True
+        for row, col in ship.locations:
+            board.state[row][col] = 'X'
+        board.add_ship(ship)
+    return board
+
+def decode_board(view, board_class=None):
+    ''' Input: memoryview (or bytes) of an encoded board, board class (default: BoardState)
+
+    Output: board with the ships placed and the guesses set (so its guess_key is up to date)
+    '''
+    fleet, offset = decode_fleet(view)
+    board = fleet_board(fleet, board_class)
+    for row, marks in enumerate(decode_guess_state(view, offset)):
+        for col, mark in enumerate(marks):
+            if mark != ' ':
+                board.set_guess(row, col, mark)
+    return board
+
+# MESSAGES
+
+def encode_text(text, size=max_text_size):
+    ''' Output: UTF-8 bytes of a text, cut to the given number of bytes without splitting a character '''
+    data = str(text).encode()
+    if len(data) > size:
+        data = data[:size].decode('utf-8', 'ignore').encode()
+    return data
+
+def frame(tag, payload):
+    ''' Output: bytes of a variable-length message '''
+    return bytes((tag, len(payload))) + payload
+
+def encode_shot(message):
+    square = message['row']*10 + message['col']
+    if 'outcome' in message:
+        return bytes((OUTCOME_SHOT_TAG + outcomes.index(message['outcome']), square))
+    return bytes((square,))
+
+def encode_result(message):
+    outcome = outcomes.index(message['outcome'])
+    data = bytes((RESULT_TAG + outcome, message['row']*10 + message['col']))
+    if message['outcome'] == 'S':
+        data += encode_ship(message['ship'])
+    return data
+
+def encode_hello(message):
+    return frame(HELLO_TAG, bytes((message['version'],)) + bytes.fromhex(message['commitment'])
+                 + encode_text(message['name']))
+
+def encode_start(message):
+    return frame(START_TAG, bytes((bool(message['first']),)) + encode_text(message.get('opponent', '')))
+
+def encode_reveal(message):
+    return frame(REVEAL_TAG, bytes.fromhex(message['nonce']) + encode_fleet(message['fleet']))
+
+def encode_join(message):
+    return frame(JOIN_TAG, bytes((message['version'],)) + encode_fleet(message['fleet'])
+                 + encode_text(message['name']))
+
+def encode_end(message):
+    return frame(END_TAG, bytes((bool(message['won']),)) + encode_text(message['reason']))
+
+def encode_error(message):
+    return frame(ERROR_TAG, encode_text(message['reason']))
+
+def encode_watch(message):
+    return frame(WATCH_TAG, message['game'].to_bytes(4, 'big'))
+
+def encode_keyframe(message):
+    # Names are cut to 64 bytes, so that the frame always fits in 255
+    names = b''.join(bytes((len(name),)) + name for name in (encode_text(name, 64) for name in message['names']))
+    return frame(KEYFRAME_TAG, message['game'].to_bytes(4, 'big') + message['turn'].to_bytes(2, 'big')
+                 + bytes((message['next'],)) + b''.join(map(encode_guess_state, message['guesses'])) + names)
+
+def encode_delta(message):
+    sunk = message['sunk']
+    cells = bytes(byte for row, col, mark in message['cells'] for byte in (row*10 + col, guess_marks.index(mark)))
+    return frame(DELTA_TAG, message['game'].to_bytes(4, 'big') + message['turn'].to_bytes(2, 'big')
+                 + bytes((message['player'] | (sunk is not None) << 1, len(message['cells']))) + cells
+                 + (encode_ship(sunk) if sunk is not None else b''))
+
+def encode_finished(message):
+    return frame(FINISHED_TAG, message['game'].to_bytes(4, 'big') + bytes((message['winner'],))
+                 + encode_text(message['reason']))
+
+encoders = {'shot': encode_shot, 'result': encode_result, 'hello': encode_hello, 'start': encode_start,
+            'reveal': encode_reveal, 'join': encode_join, 'end': encode_end, 'error': encode_error,
+            'watch': encode_watch, 'keyframe': encode_keyframe, 'delta': encode_delta, 'finished': encode_finished}
+
+def encode_message(message):
+    ''' Input: message (dictionary with a 'type')
+
+    Output: bytes of its frame; raises ValueError if it cannot be encoded
+    '''
+    try:
+        return encoders[message['type']](message)
+    except KeyError as error:
+        raise ValueError(f"cannot encode {message!r} (missing {error})") from None
+
+def decode_message(view, offset=0):
+    ''' Decode the frame at an offset of the bytes received
+
+    Input: memoryview (or bytes), offset
+
+    Output: (message, offset after it), or (None, offset) if the frame is not complete yet;
+            raises ValueError if it is not a valid frame
+    '''
+    size = len(view)
+    if offset >= size:
+        return None, offset
+    tag = view[offset]
+    if tag < 100:
+        return {'type': 'shot', 'row': tag // 10, 'col': tag % 10}, offset + 1
+    if tag < HELLO_TAG:
+        if tag >= OUTCOME_SHOT_TAG + len(outcomes):
+            raise ValueError(f"unknown message tag {tag}")
+        end = offset + (4 if tag == RESULT_TAG + 2 else 2)
+        if end > size:
+            return None, offset
+        square = view[offset + 1]
+        if square >= 100:
+            raise ValueError(f"square {square} off the board")
+        row, col = _squares[square]
+        if tag >= OUTCOME_SHOT_TAG:
+            return {'type': 'shot', 'row': row, 'col': col, 'outcome': outcomes[tag - OUTCOME_SHOT_TAG]}, end
+        message = {'type': 'result', 'row': row, 'col': col, 'outcome': outcomes[tag - RESULT_TAG]}
+        if tag == RESULT_TAG + 2:
+            message['ship'] = decode_ship(view, offset + 2)
+        return message, end
+
+    if offset + 2 > size:
+        return None, offset
+    start = offset + 2
+    end = start + view[offset + 1]
+    if end > size:
+        return None, offset
+    try:
+        return _decode_payload(tag, view[start:end]), end
+    except IndexError:
+        raise ValueError(f"message of tag {tag} cut short") from None
+
+def _decode_payload(tag, payload):
+    ''' Output: message of a variable-length frame (payload: memoryview of the bytes after its length) '''
+    if tag == HELLO_TAG:
+        # The version is read first: the rest may be laid out differently in another version
+        message = {'type': 'hello', 'version': payload[0]}
+        if message['version'] == protocol_version:
+            if len(payload) < 33:
+                raise IndexError
+            message['commitment'] = payload[1:33].hex()
+            message['name'] = str(payload[33:], 'utf-8')
+    elif tag == JOIN_TAG:
+        message = {'type': 'join', 'version': payload[0]}
+        if message['version'] == protocol_version:
+            message['fleet'], name_start = decode_fleet(payload, 1)
+            message['name'] = str(payload[name_start:], 'utf-8')
+    elif tag == START_TAG:
+        message = {'type': 'start', 'first': bool(payload[0]), 'opponent': str(payload[1:], 'utf-8')}
+    elif tag == REVEAL_TAG:
+        if len(payload) < 16:
+            raise IndexError
+        message = {'type': 'reveal', 'nonce': payload[:16].hex(), 'fleet': decode_fleet(payload, 16)[0]}
+    elif tag == END_TAG:
+        message = {'type': 'end', 'won': bool(payload[0]), 'reason': str(payload[1:], 'utf-8')}
+    elif tag == ERROR_TAG:
+        message = {'type': 'error', 'reason': str(payload, 'utf-8')}
+    elif tag == WATCH_TAG:
+        if len(payload) != 4:
+            raise IndexError
+        message = {'type': 'watch', 'game': int.from_bytes(payload, 'big')}
+    elif tag == KEYFRAME_TAG:
+        if len(payload) < 57:
+            raise IndexError
+        names = []
+        offset = 57
+        for _ in range(2):
+            end = offset + 1 + payload[offset]
+            if end > len(payload):
+                raise IndexError
+            names.append(str(payload[offset + 1:end], 'utf-8'))
+            offset = end
+        message = {'type': 'keyframe', 'game': int.from_bytes(payload[:4], 'big'), 'turn': int.from_bytes(payload[4:6], 'big'),
+                   'next': payload[6], 'guesses': [decode_guess_state(payload, 7), decode_guess_state(payload, 32)],
+                   'names': names}
+    elif tag == DELTA_TAG:
+        flags, num_cells = payload[6], payload[7]
+        end = 8 + 2*num_cells
+        if end + 2*(flags >> 1 & 1) != len(payload):
+            raise IndexError
+        cells = []
+        for offset in range(8, end, 2):
+            square, mark = payload[offset], payload[offset + 1]
+            if square >= 100 or mark >= len(guess_marks):
+                raise ValueError(f"invalid square {square} or mark {mark} in a delta")
+            cells.append((square // 10, square % 10, guess_marks[mark]))
+        message = {'type': 'delta', 'game': int.from_bytes(payload[:4], 'big'), 'turn': int.from_bytes(payload[4:6], 'big'),
+                   'player': flags & 1, 'cells': cells, 'sunk': decode_ship(payload, end) if flags & 2 else None}
+    elif tag == FINISHED_TAG:
+        message = {'type': 'finished', 'game': int.from_bytes(payload[:4], 'big'), 'winner': payload[4],
+                   'reason': str(payload[5:], 'utf-8')}
+    else:
+        raise ValueError(f"unknown message tag {tag}")
+    return message
+
+def split_messages(buffer):
+    ''' Complete messages at the start of a buffer of received bytes, which are removed from it
+
+    Input: bytearray
+
+    Output: list of messages; raises ValueError at an invalid frame, unless messages come before
+            it (they are returned, and the next call raises)
+    '''
+    messages = []
+    offset = 0
+    with memoryview(buffer) as view:
+        try:
+            while True:
+                message, end = decode_message(view, offset)
+                if message is None:
+                    break
+                messages.append(message)
+                offset = end
+        except ValueError:
+            if not messages:
+                raise
+    del buffer[:offset]
+    return messages